@@ -653,6 +653,49 @@ def generate_ollama_embeddings(
         raise Exception(error_detail)
 
 
+async def agenerate_ollama_embeddings(
+    form_data: GenerateEmbeddingsForm,
+    url_idx: Optional[int] = None,
+):
+    if url_idx is None:
+        model = form_data.model
+
+        if ":" not in model:
+            model = f"{model}:latest"
+
+        if model in app.state.MODELS:
+            url_idx = random.choice(app.state.MODELS[model]["urls"])
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail=ERROR_MESSAGES.MODEL_NOT_FOUND(form_data.model),
+            )
+
+    url = app.state.config.OLLAMA_BASE_URLS[url_idx]
+
+    try:
+        async with aiohttp.ClientSession(
+            trust_env=True, timeout=aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT)
+        ) as session:
+            async with session.post(
+                f"{url}/api/embeddings",
+                data=form_data.model_dump_json(exclude_none=True).encode(),
+                headers={"Content-Type": "application/json"},
+            ) as r:
+                data = await r.json()
+                if "error" in data:
+                    raise Exception(f"Ollama: {data['error']}")
+                r.raise_for_status()
+
+                if "embedding" in data:
+                    return data["embedding"]
+                else:
+                    raise Exception("Something went wrong :/")
+    except Exception as e:
+        log.exception(e)
+        raise Exception(f"Ollama: {e}")
+
+
 class GenerateCompletionForm(BaseModel):
     model: str
     prompt: str
@@ -0,0 +1,218 @@
+import os
+import math
+import pickle
+import logging
+import threading
+
+from typing import Optional
+
+from config import SRC_LOG_LEVELS, RAG_BM25_INDEX_DIR
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+def tokenize(text: str) -> list[str]:
+    # Same tokenization as langchain's BM25Retriever default_preprocessing_func
+    return text.split()
+
+
+class BM25Index:
+    """Incrementally maintained Okapi BM25 inverted index for a single collection.
+
+    Only the postings of the query terms are visited at search time, so the cost
+    of a lookup is proportional to the number of query terms (and their posting
+    lengths) instead of the size of the collection.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, dict[str, int]] = {}
+        self.doc_terms: dict[str, dict[str, int]] = {}
+        self.doc_len: dict[str, int] = {}
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def add(self, ids: list[str], texts: list[str]):
+        for id, text in zip(ids, texts):
+            if id in self.doc_len:
+                self.remove([id])
+
+            terms: dict[str, int] = {}
+            tokens = tokenize(text or "")
+            for token in tokens:
+                terms[token] = terms.get(token, 0) + 1
+
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[id] = tf
+
+            self.doc_terms[id] = terms
+            self.doc_len[id] = len(tokens)
+            self.total_len += len(tokens)
+
+    def remove(self, ids: list[str]):
+        for id in ids:
+            terms = self.doc_terms.pop(id, None)
+            if terms is None:
+                continue
+
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(id, None)
+                    if not posting:
+                        del self.postings[term]
+
+            self.total_len -= self.doc_len.pop(id)
+
+    def search(
+        self, query: str, k: int, ids: Optional[set[str]] = None
+    ) -> list[tuple[str, float]]:
+        """Top k (id, score) pairs, only among ids when given. Term statistics
+        are those of the whole collection."""
+        n = len(self.doc_len)
+        if n == 0 or k <= 0 or (ids is not None and not ids):
+            return []
+
+        avgdl = self.total_len / n if self.total_len else 1.0
+        scores: dict[str, float] = {}
+
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+
+            # Non-negative (Lucene style) idf so that very common terms never
+            # push a document's score below zero.
+            df = len(posting)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+            for id, tf in posting.items():
+                if ids is not None and id not in ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[id] / avgdl)
+                scores[id] = scores.get(id, 0.0) + idf * tf * (self.k1 + 1) / (
+                    tf + norm
+                )
+
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+class BM25IndexStore:
+    """Per-collection BM25 indexes, kept in memory and persisted to disk.
+
+    add() and remove() only change the in-memory index, call save() once the
+    collection is written. Every collection has its own lock, so building the index
+    of one collection does not block searches of the others.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.indexes: dict[str, BM25Index] = {}
+        self.locks: dict[str, threading.RLock] = {}
+        # Guards indexes and locks only
+        self.lock = threading.Lock()
+
+    def _get_path(self, collection_name: str) -> str:
+        return os.path.join(self.directory, f"{collection_name}.pkl")
+
+    def _get_lock(self, collection_name: str) -> threading.RLock:
+        with self.lock:
+            lock = self.locks.get(collection_name)
+            if lock is None:
+                lock = threading.RLock()
+                self.locks[collection_name] = lock
+            return lock
+
+    def _load(self, collection_name: str) -> Optional[BM25Index]:
+        path = self._get_path(collection_name)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            log.warning(f"Failed to load bm25 index {path}: {e}")
+            return None
+
+    def _save(self, collection_name: str, index: BM25Index):
+        path = self._get_path(collection_name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def _set(self, collection_name: str, index: BM25Index):
+        with self.lock:
+            self.indexes[collection_name] = index
+
+    def get(self, collection_name: str) -> Optional[BM25Index]:
+        with self._get_lock(collection_name):
+            with self.lock:
+                index = self.indexes.get(collection_name)
+            if index is None:
+                index = self._load(collection_name)
+                if index is not None:
+                    self._set(collection_name, index)
+            return index
+
+    def add(self, collection_name: str, ids: list[str], texts: list[str]):
+        with self._get_lock(collection_name):
+            index = self.get(collection_name)
+            if index is None:
+                index = BM25Index()
+                self._set(collection_name, index)
+            index.add(ids, texts)
+
+    def save(self, collection_name: str):
+        with self._get_lock(collection_name):
+            with self.lock:
+                index = self.indexes.get(collection_name)
+            if index is not None:
+                self._save(collection_name, index)
+
+    def remove(self, collection_name: str, ids: list[str]):
+        with self._get_lock(collection_name):
+            index = self.get(collection_name)
+            if index is not None:
+                index.remove(ids)
+
+    def get_or_build(self, collection) -> BM25Index:
+        """Return the index for a Chroma collection, (re)building it from the stored
+        documents when it is missing or out of sync with the collection."""
+        with self._get_lock(collection.name):
+            index = self.get(collection.name)
+            if index is not None and len(index) == collection.count():
+                return index
+
+            log.info(f"building bm25 index for collection {collection.name}")
+            documents = collection.get(include=["documents"])
+
+            index = BM25Index()
+            index.add(documents["ids"], documents["documents"])
+
+            self._set(collection.name, index)
+            self._save(collection.name, index)
+            return index
+
+    def delete(self, collection_name: str):
+        with self._get_lock(collection_name):
+            with self.lock:
+                self.indexes.pop(collection_name, None)
+            path = self._get_path(collection_name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def reset(self):
+        with self.lock:
+            self.indexes = {}
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".pkl"):
+                os.remove(os.path.join(self.directory, filename))
+
+
+BM25_INDEXES = BM25IndexStore(RAG_BM25_INDEX_DIR)
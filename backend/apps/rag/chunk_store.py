@@ -0,0 +1,191 @@
+import os
+import array
+import logging
+import sqlite3
+import threading
+
+from collections import Counter
+from typing import Callable, Optional
+
+from apps.rag.embedding_cache import get_embedding_cache_key
+from config import SRC_LOG_LEVELS, ENABLE_RAG_CHUNK_STORE, RAG_CHUNK_STORE_DIR
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+class ChunkStore:
+    """Content-addressed chunk embeddings, keyed by (engine, model, normalized text).
+
+    Every collection that stores a chunk takes a reference on its vector, so the
+    same chunk ingested into many collections is embedded once. Releasing a
+    collection drops its references and vectors nobody references any more are
+    garbage collected.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+        self.chunks = 0
+        self.reused = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS chunk (
+                key TEXT PRIMARY KEY,
+                engine TEXT,
+                model TEXT,
+                vector BLOB,
+                refcount INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS chunk_ref (
+                collection_name TEXT,
+                key TEXT,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (collection_name, key)
+            )"""
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS chunk_refcount ON chunk (refcount)"
+        )
+        self.conn.commit()
+
+    def _get_vectors(self, keys: list[str]) -> dict[str, list[float]]:
+        result = {}
+        for i in range(0, len(keys), 500):
+            batch = keys[i : i + 500]
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM chunk WHERE key IN ({','.join('?' * len(batch))})",
+                batch,
+            ).fetchall()
+            for key, vector in rows:
+                result[key] = array.array("f", vector).tolist()
+        return result
+
+    def embed(
+        self,
+        engine: str,
+        model: str,
+        texts: list[str],
+        embedding_function: Callable[[list[str]], list[list[float]]],
+        collection_name: str,
+    ) -> list[list[float]]:
+        """Return the embeddings of texts, calling embedding_function only for the
+        chunks that are not stored yet, and reference them from collection_name."""
+        keys = [get_embedding_cache_key(engine, model, text) for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+
+        with self.lock:
+            vectors = self._get_vectors(unique_keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        if missing:
+            embeddings = embedding_function(list(missing.values()))
+            if embeddings is None or len(embeddings) != len(missing):
+                raise ValueError("Embedding backend returned no embeddings")
+            vectors.update(zip(missing.keys(), embeddings))
+
+        counts = Counter(keys)
+        with self.lock:
+            # Hits are written back too, in case a concurrent gc() removed them
+            # since the lookup
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO chunk (key, engine, model, vector, refcount) VALUES (?, ?, ?, ?, 0)",
+                [
+                    (key, engine, model, array.array("f", vectors[key]).tobytes())
+                    for key in unique_keys
+                ],
+            )
+            self.conn.executemany(
+                "UPDATE chunk SET refcount = refcount + ? WHERE key = ?",
+                [(count, key) for key, count in counts.items()],
+            )
+            self.conn.executemany(
+                """INSERT INTO chunk_ref (collection_name, key, count) VALUES (?, ?, ?)
+                ON CONFLICT (collection_name, key) DO UPDATE SET count = count + excluded.count""",
+                [(collection_name, key, count) for key, count in counts.items()],
+            )
+            self.conn.commit()
+
+            self.chunks += len(keys)
+            self.reused += len(keys) - len(missing)
+
+        return [vectors[key] for key in keys]
+
+    def get_embedding_function(
+        self, engine: str, model: str, embedding_function, collection_name: str
+    ) -> Callable[[list[str]], list[list[float]]]:
+        return lambda texts: self.embed(
+            engine, model, texts, embedding_function, collection_name
+        )
+
+    def release(self, collection_name: str, gc: bool = True):
+        """Drop the references of a deleted collection."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, count FROM chunk_ref WHERE collection_name = ?",
+                (collection_name,),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE chunk SET refcount = refcount - ? WHERE key = ?",
+                [(count, key) for key, count in rows],
+            )
+            self.conn.execute(
+                "DELETE FROM chunk_ref WHERE collection_name = ?", (collection_name,)
+            )
+            self.conn.commit()
+
+        if rows and gc:
+            self.gc()
+
+    def gc(self) -> int:
+        """Delete vectors that are no longer referenced, returns how many."""
+        with self.lock:
+            deleted = self.conn.execute(
+                "DELETE FROM chunk WHERE refcount <= 0"
+            ).rowcount
+            self.conn.commit()
+
+        if deleted:
+            log.info(f"chunk store: collected {deleted} unreferenced vectors")
+        return deleted
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM chunk_ref")
+            self.conn.execute("DELETE FROM chunk")
+            self.conn.commit()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            (vectors, references) = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(refcount), 0) FROM chunk"
+            ).fetchone()
+            (collections,) = self.conn.execute(
+                "SELECT COUNT(DISTINCT collection_name) FROM chunk_ref"
+            ).fetchone()
+
+            return {
+                "vectors": vectors,
+                "references": references,
+                "collections": collections,
+                # Share of stored chunks served by an already stored vector
+                "dedup_ratio": 1 - vectors / references if references else 0.0,
+                "ingested_chunks": self.chunks,
+                "reused_chunks": self.reused,
+                "reuse_ratio": self.reused / self.chunks if self.chunks else 0.0,
+            }
+
+
+CHUNK_STORE: Optional[ChunkStore] = (
+    ChunkStore(f"{RAG_CHUNK_STORE_DIR}/chunks.db") if ENABLE_RAG_CHUNK_STORE else None
+)
@@ -0,0 +1,96 @@
+import time
+import logging
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config import (
+    SRC_LOG_LEVELS,
+    RAG_COLLECTION_QUERY_CONCURRENCY,
+    RAG_COLLECTION_QUERY_TIMEOUT,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+COLLECTION_QUERY_EXECUTOR = ThreadPoolExecutor(
+    max_workers=RAG_COLLECTION_QUERY_CONCURRENCY,
+    thread_name_prefix="rag-collection-query",
+)
+
+
+def query_collections_concurrently(
+    collection_names,
+    query_fn,
+    executor: ThreadPoolExecutor = COLLECTION_QUERY_EXECUTOR,
+    timeout: float = RAG_COLLECTION_QUERY_TIMEOUT,
+) -> list[dict]:
+    """Run query_fn(collection_name) for every collection on the shared executor.
+
+    Results are returned in the order of collection_names. Every collection gets
+    timeout seconds from the moment its query starts running, and a query still
+    waiting for a free worker after timeout seconds is cancelled. A collection that
+    fails or times out is logged and left out; if no collection succeeds the first
+    error is raised.
+
+    Running queries cannot be interrupted: a query that timed out is abandoned but
+    keeps its worker until it returns.
+    """
+    collection_names = list(collection_names)
+    submitted_at = time.monotonic()
+    started = {}
+
+    def run(i):
+        started[i] = time.monotonic()
+        return query_fn(collection_names[i])
+
+    futures = [executor.submit(run, i) for i in range(len(collection_names))]
+
+    pending = set(range(len(futures)))
+    timed_out = set()
+    while pending:
+        now = time.monotonic()
+        for i in list(pending):
+            if futures[i].done():
+                pending.discard(i)
+            elif started.get(i, submitted_at) + timeout <= now:
+                if i in started or futures[i].cancel():
+                    timed_out.add(i)
+                    pending.discard(i)
+                else:
+                    # Started running while it was being cancelled
+                    started.setdefault(i, now)
+
+        if pending:
+            deadline = min(started.get(i, submitted_at) for i in pending) + timeout
+            wait(
+                [futures[i] for i in pending],
+                timeout=max(deadline - now, 0),
+                return_when=FIRST_COMPLETED,
+            )
+
+    results = []
+    errors = []
+    for i, (collection_name, future) in enumerate(zip(collection_names, futures)):
+        if i in timed_out:
+            if i in started:
+                log.error(
+                    f"query for collection {collection_name} timed out after {timeout}s"
+                )
+            else:
+                log.error(
+                    f"query for collection {collection_name} did not start within {timeout}s"
+                )
+            errors.append(
+                TimeoutError(f"query for collection {collection_name} timed out")
+            )
+        elif future.exception() is not None:
+            log.error(
+                f"query for collection {collection_name} failed: {future.exception()}"
+            )
+            errors.append(future.exception())
+        else:
+            results.append(future.result())
+
+    if errors and not results:
+        raise errors[0]
+    return results
@@ -0,0 +1,148 @@
+import logging
+
+from functools import lru_cache
+from typing import Optional
+
+from config import (
+    SRC_LOG_LEVELS,
+    RAG_CONTEXT_TOKEN_BUDGET,
+    RAG_CONTEXT_MODEL_TOKEN_BUDGETS,
+    RAG_CONTEXT_TOKENIZER_ENCODING,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(encoding_name: str):
+    """Load a tiktoken encoding once per process, None if it is unavailable (e.g.
+    no network access to fetch the BPE file)."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        log.warning(f"tokenizer {encoding_name} unavailable, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(text: str, encoding_name: str = RAG_CONTEXT_TOKENIZER_ENCODING) -> int:
+    tokenizer = get_tokenizer(encoding_name)
+    if tokenizer is None:
+        # Roughly four characters per token for English text
+        return (len(text) + 3) // 4
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(
+    text: str, max_tokens: int, encoding_name: str = RAG_CONTEXT_TOKENIZER_ENCODING
+) -> str:
+    tokenizer = get_tokenizer(encoding_name)
+    if tokenizer is None:
+        return text[: max_tokens * 4]
+    return tokenizer.decode(tokenizer.encode(text, disallowed_special=())[:max_tokens])
+
+
+def get_token_budget(model_id: Optional[str]) -> int:
+    return RAG_CONTEXT_MODEL_TOKEN_BUDGETS.get(model_id, RAG_CONTEXT_TOKEN_BUDGET)
+
+
+def merge_chunks(chunks: list[dict]) -> list[dict]:
+    """Merge adjacent or overlapping chunks of the same source and drop duplicates.
+
+    Each chunk is a dict with "text", "score" (higher is better) and "metadata". Chunks
+    sharing a source (and page) are stitched together using their start_index
+    metadata; a merged chunk keeps the best score of its parts. Chunks without a
+    start_index are only deduplicated.
+    """
+    merged = []
+    groups: dict[tuple, list[dict]] = {}
+    for chunk in chunks:
+        metadata = chunk["metadata"] or {}
+        if isinstance(metadata.get("start_index"), int):
+            key = (metadata.get("source"), metadata.get("page"))
+            groups.setdefault(key, []).append(chunk)
+        else:
+            merged.append(chunk)
+
+    for group in groups.values():
+        group.sort(key=lambda chunk: chunk["metadata"]["start_index"])
+
+        current = dict(group[0])
+        start = current["metadata"]["start_index"]
+        end = start + len(current["text"])
+        for chunk in group[1:]:
+            chunk_start = chunk["metadata"]["start_index"]
+            chunk_end = chunk_start + len(chunk["text"])
+            if chunk_start > end:
+                merged.append(current)
+                current = dict(chunk)
+                start, end = chunk_start, chunk_end
+                continue
+
+            # Touching or overlapping: append only the part not already covered
+            if chunk_end > end:
+                current["text"] += chunk["text"][end - chunk_start :]
+                end = chunk_end
+            current["score"] = max(current["score"], chunk["score"])
+        merged.append(current)
+
+    seen = set()
+    result = []
+    for chunk in sorted(merged, key=lambda chunk: chunk["score"], reverse=True):
+        text = chunk["text"].strip()
+        if not text or text in seen:
+            continue
+        seen.add(text)
+        result.append(chunk)
+    return result
+
+
+def pack_chunks(chunks: list[dict], budget: int) -> list[dict]:
+    """Greedily pick the best scored chunks that fit in the token budget.
+
+    A budget of 0 or less means no limit. If not even the best chunk fits, it is
+    truncated so that the prompt still carries some context.
+    """
+    chunks = sorted(chunks, key=lambda chunk: chunk["score"], reverse=True)
+    if budget <= 0:
+        return chunks
+
+    packed = []
+    used = 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk["text"])
+        if used + tokens <= budget:
+            packed.append(chunk)
+            used += tokens
+
+    if not packed and chunks:
+        packed.append(
+            {**chunks[0], "text": truncate_to_tokens(chunks[0]["text"], budget)}
+        )
+
+    log.debug(f"packed {len(packed)} of {len(chunks)} chunks into {budget} tokens")
+    return packed
+
+
+def build_context(chunks: list[dict], budget: int) -> str:
+    return "\n\n".join(
+        chunk["text"] for chunk in pack_chunks(merge_chunks(chunks), budget)
+    )
+
+
+def build_contexts(file_chunks: list[list[dict]], budget: int) -> list[str]:
+    """Contexts of the chunks retrieved for each file of a chat.
+
+    Without a budget (0 or less) every file keeps its own context with its chunks in
+    retrieval order. With a budget the chunks of all files are merged and packed
+    into a single context, so the best chunks win whichever file they come from.
+    """
+    if budget <= 0:
+        return [
+            "\n\n".join(chunk["text"] for chunk in chunks) for chunks in file_chunks
+        ]
+
+    chunks = [chunk for chunks in file_chunks for chunk in chunks]
+    return [build_context(chunks, budget)] if chunks else []
@@ -0,0 +1,140 @@
+import os
+import json
+import zlib
+import logging
+import threading
+
+from typing import Any, Optional
+
+from config import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+class DiskCache:
+    """Size bounded cache of JSON values on disk, stored zlib compressed.
+
+    Entries are plain files written atomically, so the cache can be shared by
+    several processes. When the directory grows beyond max_bytes, the least recently
+    used entries are evicted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.size: Optional[int] = None
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json.z")
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._get_path(key)
+        try:
+            with open(path, "rb") as f:
+                value = json.loads(zlib.decompress(f.read()))
+            # Mark as recently used for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            log.warning(f"dropping unreadable cache entry {path}: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        data = zlib.compress(
+            json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+        )
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            if self.size is None:
+                self.size = self._get_entries_size()
+            else:
+                self.size += len(data)
+
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._get_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _list_entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith(".json.z"):
+                    path = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _get_entries_size(self) -> int:
+        return sum(size for _, size, _ in self._list_entries())
+
+    def _evict(self):
+        entries = sorted(self._list_entries())
+        size = sum(size for _, size, _ in entries)
+
+        # Evict down to 90% so that eviction does not run on every write
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            evicted += 1
+
+        self.size = size
+        log.info(f"{self.directory}: evicted {evicted} cache entries")
+
+    def clear(self):
+        with self.lock:
+            for _, _, path in self._list_entries():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.size = 0
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            if self.size is None:
+                self.size = self._get_entries_size()
+            lookups = self.hits + self.misses
+            return {
+                "size": self.size,
+                "max_size": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,318 @@
+import os
+import time
+import asyncio
+import array
+import hashlib
+import logging
+import sqlite3
+import threading
+
+from collections import OrderedDict
+from typing import Optional
+
+from config import (
+    SRC_LOG_LEVELS,
+    RAG_EMBEDDING_CACHE_SIZE,
+    ENABLE_RAG_EMBEDDING_DISK_CACHE,
+    RAG_EMBEDDING_DISK_CACHE_MAX_ENTRIES,
+    RAG_EMBEDDING_CACHE_DIR,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def get_embedding_cache_key(engine: str, model: str, text: str) -> str:
+    return hashlib.sha256(
+        f"{engine}\x00{model}\x00{normalize_text(text)}".encode("utf-8")
+    ).hexdigest()
+
+
+class EmbeddingDiskCache:
+    """sqlite-backed embedding store, vectors are kept as float32 blobs."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS embedding (
+                key TEXT PRIMARY KEY,
+                engine TEXT,
+                model TEXT,
+                vector BLOB,
+                accessed_at REAL
+            )"""
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS embedding_accessed_at ON embedding (accessed_at)"
+        )
+        self.conn.commit()
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[str, str, array.array]]:
+        result = {}
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, engine, model, vector FROM embedding WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, engine, model, vector in rows:
+                    result[key] = (engine, model, array.array("f", vector))
+
+            if result:
+                self.conn.executemany(
+                    "UPDATE embedding SET accessed_at = ? WHERE key = ?",
+                    [(time.time(), key) for key in result],
+                )
+                self.conn.commit()
+        return result
+
+    def set_many(self, engine: str, model: str, items: dict[str, list[float]]):
+        with self.lock:
+            now = time.time()
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embedding (key, engine, model, vector, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (key, engine, model, array.array("f", vector).tobytes(), now)
+                    for key, vector in items.items()
+                ],
+            )
+
+            (count,) = self.conn.execute("SELECT COUNT(*) FROM embedding").fetchone()
+            if count > self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM embedding WHERE key IN (SELECT key FROM embedding ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self.conn.commit()
+
+    def invalidate(self, engine: str, model: str):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM embedding WHERE engine = ? AND model = ?", (engine, model)
+            )
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM embedding")
+            self.conn.commit()
+
+
+class EmbeddingCache:
+    """Two tier (in-memory LRU, optional on-disk) cache of embedding vectors keyed by
+    (engine, model, normalized text).
+
+    Vectors are kept as float32 arrays (4 bytes per dimension, instead of about 32
+    for a list of floats) and only converted to lists when returned."""
+
+    def __init__(self, max_size: int, disk_cache: Optional[EmbeddingDiskCache] = None):
+        self.max_size = max_size
+        self.disk_cache = disk_cache
+        self.entries: OrderedDict[str, tuple[str, str, array.array]] = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _evict(self):
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get_many(self, keys: list[str], memory: bool = True) -> dict[str, list[float]]:
+        """memory=False only looks up (and never fills) the on-disk tier."""
+        result = {}
+        with self.lock:
+            for key in keys if memory else []:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries.move_to_end(key)
+                    result[key] = entry[2].tolist()
+            self.hits += len(result)
+
+        missing = [key for key in keys if key not in result]
+        if missing and self.disk_cache is not None:
+            try:
+                disk_result = self.disk_cache.get_many(missing)
+            except Exception as e:
+                log.warning(f"embedding disk cache lookup failed: {e}")
+                disk_result = {}
+
+            with self.lock:
+                self.disk_hits += len(disk_result)
+                # Promote disk hits to the in-memory tier
+                for key, entry in disk_result.items():
+                    if memory:
+                        self.entries[key] = entry
+                    result[key] = entry[2].tolist()
+                self._evict()
+            missing = [key for key in missing if key not in disk_result]
+
+        with self.lock:
+            self.misses += len(missing)
+        return result
+
+    def set_many(
+        self,
+        engine: str,
+        model: str,
+        items: dict[str, list[float]],
+        memory: bool = True,
+    ):
+        with self.lock:
+            for key, vector in items.items() if memory else []:
+                self.entries[key] = (engine, model, array.array("f", vector))
+                self.entries.move_to_end(key)
+            self._evict()
+
+        if self.disk_cache is not None:
+            try:
+                self.disk_cache.set_many(engine, model, items)
+            except Exception as e:
+                log.warning(f"embedding disk cache update failed: {e}")
+
+    def invalidate(self, engine: str, model: str):
+        log.info(f"invalidating embedding cache for {engine or 'local'}:{model}")
+        with self.lock:
+            for key in [
+                key
+                for key, (e, m, _) in self.entries.items()
+                if e == engine and m == model
+            ]:
+                del self.entries[key]
+
+        if self.disk_cache is not None:
+            self.disk_cache.invalidate(engine, model)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.disk_cache is not None:
+            self.disk_cache.clear()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "disk": self.disk_cache is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (
+                    (self.hits + self.disk_hits) / lookups if lookups else 0.0
+                ),
+            }
+
+
+class CachedEmbeddingFunction:
+    """Wraps an embedding callable (str -> vector, list[str] -> list[vector]) so that
+    only texts missing from the cache are sent to the embedding backend.
+
+    async_func is an optional coroutine counterpart of func used by acall(); when it
+    is not given, acall() runs func in the default executor.
+    """
+
+    def __init__(
+        self, engine: str, model: str, func, cache: EmbeddingCache, async_func=None
+    ):
+        self.engine = engine
+        self.model = model
+        self.func = func
+        self.async_func = async_func
+        self.cache = cache
+
+    def __call__(self, query):
+        if not self.cache.enabled:
+            return self.func(query)
+
+        if isinstance(query, list):
+            return self.embed_many(query)
+        return self.embed_many([query])[0]
+
+    async def acall(self, query):
+        if not self.cache.enabled:
+            return await self._aembed(query)
+
+        if isinstance(query, list):
+            return await self.aembed_many(query)
+        return (await self.aembed_many([query]))[0]
+
+    async def _aembed(self, query):
+        if self.async_func is not None:
+            return await self.async_func(query)
+        return await asyncio.get_running_loop().run_in_executor(None, self.func, query)
+
+    def _lookup(
+        self, texts: list[str], memory: bool = True
+    ) -> tuple[list[str], dict, dict]:
+        keys = [get_embedding_cache_key(self.engine, self.model, t) for t in texts]
+        cached = self.cache.get_many(list(dict.fromkeys(keys)), memory)
+
+        # Only the first occurrence of each missing text goes to the backend
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        return keys, cached, missing
+
+    def _store(self, cached: dict, missing: dict, embeddings, memory: bool = True):
+        if embeddings is None:
+            raise ValueError("Embedding backend returned no embeddings")
+
+        computed = dict(zip(missing.keys(), embeddings))
+        self.cache.set_many(self.engine, self.model, computed, memory)
+        cached.update(computed)
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        keys, cached, missing = self._lookup(texts)
+        if missing:
+            self._store(cached, missing, self.func(list(missing.values())))
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed a batch of document chunks through the on-disk tier only, so bulk
+        ingestion does not evict query embeddings from the in-memory LRU."""
+        if not self.cache.enabled or self.cache.disk_cache is None:
+            return self.func(texts)
+
+        keys, cached, missing = self._lookup(texts, memory=False)
+        if missing:
+            self._store(
+                cached, missing, self.func(list(missing.values())), memory=False
+            )
+        return [cached[key] for key in keys]
+
+    async def aembed_many(self, texts: list[str]) -> list[list[float]]:
+        keys, cached, missing = self._lookup(texts)
+        if missing:
+            self._store(cached, missing, await self._aembed(list(missing.values())))
+        return [cached[key] for key in keys]
+
+
+EMBEDDING_CACHE = EmbeddingCache(
+    RAG_EMBEDDING_CACHE_SIZE,
+    (
+        EmbeddingDiskCache(
+            f"{RAG_EMBEDDING_CACHE_DIR}/cache.db", RAG_EMBEDDING_DISK_CACHE_MAX_ENTRIES
+        )
+        if ENABLE_RAG_EMBEDDING_DISK_CACHE and RAG_EMBEDDING_CACHE_SIZE > 0
+        else None
+    ),
+)
@@ -0,0 +1,105 @@
+import json
+import hashlib
+import logging
+
+from typing import Iterator, Optional
+
+from langchain_core.documents import Document
+
+from apps.rag.disk_cache import DiskCache
+from apps.rag.ingest import lazy_load
+from config import (
+    SRC_LOG_LEVELS,
+    ENABLE_RAG_EXTRACTION_CACHE,
+    RAG_EXTRACTION_CACHE_MAX_SIZE,
+    RAG_EXTRACTION_CACHE_DIR,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+class ExtractionCache(DiskCache):
+    """Extracted documents of a file on disk, keyed by (file sha256, loader type,
+    loader options). Shared by the worker processes of /scan."""
+
+    def get_key(self, file_hash: str, loader, options: Optional[dict] = None) -> str:
+        loader_options = json.dumps(options or {}, sort_keys=True, default=str)
+        return hashlib.sha256(
+            f"{file_hash}\x00{type(loader).__name__}\x00{loader_options}".encode(
+                "utf-8"
+            )
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[list[Document]]:
+        data = super().get(key)
+        if data is None:
+            return None
+        return [
+            Document(page_content=page_content, metadata=metadata)
+            for page_content, metadata in data
+        ]
+
+    def set(self, key: str, documents: list[Document]):
+        super().set(key, [[doc.page_content, doc.metadata] for doc in documents])
+
+
+# Stands for the path of the file in cached "source" metadata, identical content
+# may be stored under another path
+_FILE_PATH = "\x00file_path"
+
+
+def _replace_source(documents, old: str, new: str) -> list[Document]:
+    return [
+        (
+            Document(
+                page_content=doc.page_content, metadata={**doc.metadata, "source": new}
+            )
+            if doc.metadata.get("source") == old
+            else doc
+        )
+        for doc in documents
+    ]
+
+
+def load_documents(
+    loader,
+    file_path: str,
+    file_hash: Optional[str] = None,
+    options: Optional[dict] = None,
+) -> Iterator[Document]:
+    """lazy_load() the loader through the extraction cache.
+
+    Without a file hash (or with the cache disabled) this is plain lazy_load. On a
+    miss the documents are streamed as they are extracted and cached once the
+    loader is exhausted.
+    """
+    if EXTRACTION_CACHE is None or file_hash is None:
+        yield from lazy_load(loader)
+        return
+
+    key = EXTRACTION_CACHE.get_key(file_hash, loader, options)
+    documents = EXTRACTION_CACHE.get(key)
+    if documents is not None:
+        log.debug(f"extraction cache hit for {file_hash}")
+        yield from _replace_source(documents, _FILE_PATH, file_path)
+        return
+
+    documents = []
+    for document in lazy_load(loader):
+        documents.append(document)
+        yield document
+
+    try:
+        EXTRACTION_CACHE.set(key, _replace_source(documents, file_path, _FILE_PATH))
+    except Exception as e:
+        log.warning(f"extraction cache update failed: {e}")
+
+
+EXTRACTION_CACHE: Optional[ExtractionCache] = (
+    ExtractionCache(
+        RAG_EXTRACTION_CACHE_DIR, RAG_EXTRACTION_CACHE_MAX_SIZE * 1024 * 1024
+    )
+    if ENABLE_RAG_EXTRACTION_CACHE
+    else None
+)
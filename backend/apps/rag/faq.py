@@ -0,0 +1,207 @@
+import os
+import glob
+import json
+import hashlib
+import logging
+import threading
+
+from typing import Optional
+
+import numpy as np
+
+from apps.webui.models.qa import QAPairs, QAPairModel
+from config import (
+    SRC_LOG_LEVELS,
+    RAG_FAQ_SIMILARITY_THRESHOLD,
+    RAG_FAQ_DIR,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+class FAQIndex:
+    """Dense index of the questions parsed from the QA files of each collection.
+
+    The normalized question embeddings of a collection are stored as a float32
+    matrix in {directory}/{key}.{version}.npy and memory-mapped, next to a JSON file
+    with the QA pair id of each row. The key depends on the collection and the
+    embedding model, the version on the pairs (QAPairs.get_collection_versions), so
+    an index is rebuilt on first use after either changed; this also holds across
+    processes sharing the directory.
+    """
+
+    def __init__(
+        self,
+        directory: str = RAG_FAQ_DIR,
+        threshold: float = RAG_FAQ_SIMILARITY_THRESHOLD,
+    ):
+        self.directory = directory
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        # key -> (version, pair ids, embeddings)
+        self.indexes: dict[str, tuple[str, list[int], np.ndarray]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.errors = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_key(self, collection_name: str, embedding_function) -> str:
+        key = (
+            f"{embedding_function.engine}:{embedding_function.model}:{collection_name}"
+        )
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+    def _get_path(self, key: str, version: str) -> str:
+        return os.path.join(self.directory, f"{key}.{version}")
+
+    def _load(self, key: str, version: str) -> Optional[tuple[list[int], np.ndarray]]:
+        with self.lock:
+            index = self.indexes.get(key)
+        if index is not None and index[0] == version:
+            return index[1], index[2]
+
+        path = self._get_path(key, version)
+        try:
+            with open(f"{path}.json", "r") as f:
+                ids = json.load(f)
+            embeddings = np.load(f"{path}.npy", mmap_mode="r")
+        except FileNotFoundError:
+            return None
+
+        with self.lock:
+            self.indexes[key] = (version, ids, embeddings)
+        return ids, embeddings
+
+    def _build(
+        self, collection_name: str, key: str, version: str, embedding_function
+    ) -> tuple[list[int], np.ndarray]:
+        pairs = QAPairs.get_pairs_by_collection_names([collection_name])
+        ids = [pair.id for pair in pairs]
+        embeddings = np.asarray(
+            embedding_function([pair.question for pair in pairs]), dtype=np.float32
+        )
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.where(norms > 0, norms, 1)
+
+        # The matrix is written before the ids, which readers look for first
+        path = self._get_path(key, version)
+        tmp_suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(f"{path}.npy.{tmp_suffix}", "wb") as f:
+            np.save(f, embeddings)
+        os.replace(f"{path}.npy.{tmp_suffix}", f"{path}.npy")
+        with open(f"{path}.json.{tmp_suffix}", "w") as f:
+            json.dump(ids, f)
+        os.replace(f"{path}.json.{tmp_suffix}", f"{path}.json")
+
+        self._remove_files(key, keep=version)
+        with self.lock:
+            self.builds += 1
+        log.info(f"built the FAQ index of {collection_name}: {len(ids)} questions")
+        return self._load(key, version)
+
+    def _remove_files(self, key: str, keep: Optional[str] = None):
+        for path in glob.glob(os.path.join(self.directory, f"{key}.*")):
+            # Leave the files other builds are writing alone
+            if path.endswith(".tmp") or (
+                keep is not None and os.path.basename(path).startswith(f"{key}.{keep}.")
+            ):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def match(
+        self,
+        collection_names: list[str],
+        query_embedding: list[float],
+        embedding_function,
+    ) -> Optional[tuple[QAPairModel, float]]:
+        """Return the QA pair of the collections whose question is the most
+        similar to the query, with its cosine similarity, if it reaches the
+        threshold."""
+        best_id, best_score = None, -1.0
+        try:
+            query = np.asarray(query_embedding, dtype=np.float32)
+            query /= np.linalg.norm(query) or 1
+
+            versions = QAPairs.get_collection_versions(collection_names)
+            for collection_name, version in versions.items():
+                key = self._get_key(collection_name, embedding_function)
+                index = self._load(key, version) or self._build(
+                    collection_name, key, version, embedding_function
+                )
+                ids, embeddings = index
+                if not ids or embeddings.shape[1] != query.shape[0]:
+                    continue
+
+                scores = embeddings @ query
+                row = int(np.argmax(scores))
+                if scores[row] > best_score:
+                    best_id, best_score = ids[row], float(scores[row])
+        except Exception as e:
+            log.exception(f"FAQ lookup failed: {e}")
+            with self.lock:
+                self.errors += 1
+            return None
+
+        pair = None
+        if best_id is not None and best_score >= self.threshold:
+            pair = QAPairs.get_pair_by_id(best_id)
+
+        with self.lock:
+            if pair is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if pair is None:
+            log.debug(f"FAQ miss, best similarity {best_score:.3f}")
+            return None
+        log.info(f"FAQ hit: question {pair.id} with similarity {best_score:.3f}")
+        return pair, best_score
+
+    def prune(self):
+        """Remove the index files whose QA pairs are gone, i.e. of deleted
+        collections or files. Outdated versions of a live index are removed when it
+        is rebuilt."""
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path, "r") as f:
+                    ids = json.load(f)
+            except Exception:
+                continue
+            if ids and QAPairs.get_pair_by_id(ids[0]) is None:
+                key = os.path.basename(path).split(".")[0]
+                with self.lock:
+                    self.indexes.pop(key, None)
+                self._remove_files(key)
+
+    def clear(self):
+        with self.lock:
+            self.indexes.clear()
+        for path in glob.glob(os.path.join(self.directory, "*")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0,
+                "errors": self.errors,
+                "builds": self.builds,
+                "indexes": len(self.indexes),
+            }
+
+
+FAQ_INDEX = FAQIndex()
@@ -0,0 +1,205 @@
+import logging
+import numpy as np
+
+from typing import Optional
+
+from config import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+def fuse_rankings(
+    rankings: list[tuple[list[str], np.ndarray]],
+    weights: list[float],
+    method: str = "rrf",
+    c: int = 60,
+) -> tuple[list[str], np.ndarray]:
+    """Fuse several ranked id lists into one, deduplicating by chunk id.
+
+    Each ranking is an (ids, scores) pair ordered best first, with higher scores
+    being better. "rrf" uses weighted reciprocal rank fusion (the same formula as
+    langchain's EnsembleRetriever), "weighted" a weighted sum of min-max normalized
+    scores. Returns the fused ids, best first, and their fused scores.
+    """
+    ids: list[str] = []
+    positions: dict[str, int] = {}
+    for ranking_ids, _ in rankings:
+        for id in ranking_ids:
+            if id not in positions:
+                positions[id] = len(ids)
+                ids.append(id)
+
+    fused = np.zeros(len(ids), dtype=np.float32)
+    for (ranking_ids, scores), weight in zip(rankings, weights):
+        if not ranking_ids:
+            continue
+
+        idx = np.fromiter(
+            (positions[id] for id in ranking_ids),
+            dtype=np.int64,
+            count=len(ranking_ids),
+        )
+        if method == "weighted":
+            scores = np.asarray(scores, dtype=np.float32)
+            spread = scores.max() - scores.min()
+            normalized = (
+                (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+            )
+            np.add.at(fused, idx, weight * normalized)
+        else:
+            ranks = np.arange(1, len(ranking_ids) + 1, dtype=np.float32)
+            np.add.at(fused, idx, weight / (ranks + c))
+
+    order = np.argsort(-fused, kind="stable")
+    return [ids[i] for i in order], fused[order]
+
+
+def cosine_similarity(query_embedding, document_embeddings: np.ndarray) -> np.ndarray:
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    document_norms = np.linalg.norm(document_embeddings, axis=1)
+    denominator = np.maximum(document_norms * query_norm, 1e-12)
+    return document_embeddings @ query / denominator
+
+
+def hybrid_search(
+    collection,
+    index,
+    query: str,
+    query_embedding,
+    k: int,
+    reranking_function,
+    r: float,
+    method: str = "rrf",
+    weights: Optional[list[float]] = None,
+    where: Optional[dict] = None,
+    embedding_function=None,
+) -> dict:
+    """Lexical (BM25) + dense retrieval on a single collection, fused and reranked.
+
+    Candidates are handled as id/score arrays; documents and metadatas are only
+    fetched for what the reranker needs and for the final top k. With a where
+    filter both sides only consider the matching chunks. Candidates that are no
+    longer in the collection (a stale BM25 index) are skipped; without a reranker,
+    chunks without a stored vector are embedded with embedding_function. The result
+    has the same shape as a Chroma query result.
+    """
+    weights = weights if weights is not None else [0.5, 0.5]
+
+    ids = None
+    if where:
+        ids = set(collection.get(where=where, include=[])["ids"])
+        if not ids:
+            return {"distances": [[]], "documents": [[]], "metadatas": [[]]}
+
+    lexical = index.search(query, k, ids)
+    lexical_ids = [id for id, _ in lexical]
+    lexical_scores = np.fromiter(
+        (score for _, score in lexical), dtype=np.float32, count=len(lexical)
+    )
+
+    dense = collection.query(
+        query_embeddings=[query_embedding],
+        n_results=k,
+        where=where,
+        include=["distances"],
+    )
+    dense_ids = dense["ids"][0]
+    # Chroma returns distances (lower is better), fusion expects higher is better
+    dense_scores = -np.asarray(dense["distances"][0], dtype=np.float32)
+
+    candidate_ids, _ = fuse_rankings(
+        [(lexical_ids, lexical_scores), (dense_ids, dense_scores)], weights, method
+    )
+    if not candidate_ids:
+        return {"distances": [[]], "documents": [[]], "metadatas": [[]]}
+
+    documents = None
+    if reranking_function is not None:
+        documents = get_by_ids(collection, candidate_ids, ["documents", "metadatas"])
+        candidate_ids = [id for id in candidate_ids if id in documents]
+        if not candidate_ids:
+            return {"distances": [[]], "documents": [[]], "metadatas": [[]]}
+
+        scores = np.asarray(
+            reranking_function.predict(
+                [(query, documents[id][0]) for id in candidate_ids]
+            ),
+            dtype=np.float32,
+        )
+    else:
+        embeddings = get_embeddings(collection, candidate_ids, embedding_function)
+        candidate_ids = [id for id in candidate_ids if id in embeddings]
+        if not candidate_ids:
+            return {"distances": [[]], "documents": [[]], "metadatas": [[]]}
+
+        scores = cosine_similarity(
+            query_embedding,
+            np.asarray([embeddings[id] for id in candidate_ids], dtype=np.float32),
+        )
+
+    order = np.argsort(-scores, kind="stable")
+    if r:
+        order = order[scores[order] >= r]
+    order = order[:k]
+
+    top_ids = [candidate_ids[i] for i in order]
+    top_scores = scores[order].tolist()
+
+    if documents is None:
+        documents = get_by_ids(collection, top_ids, ["documents", "metadatas"])
+        # Deleted since the embeddings were fetched
+        kept = [idx for idx, id in enumerate(top_ids) if id in documents]
+        top_ids = [top_ids[idx] for idx in kept]
+        top_scores = [top_scores[idx] for idx in kept]
+
+    return {
+        "distances": [top_scores],
+        "documents": [[documents[id][0] for id in top_ids]],
+        "metadatas": [
+            [
+                {**(documents[id][1] or {}), "score": score}
+                for id, score in zip(top_ids, top_scores)
+            ]
+        ],
+    }
+
+
+def get_by_ids(collection, ids: list[str], include: list[str]) -> dict[str, tuple]:
+    """Fetch the given fields for a set of ids, keyed by id (Chroma does not
+    guarantee the order of get() results)."""
+    if not ids:
+        return {}
+
+    result = collection.get(ids=ids, include=include)
+    return {
+        id: tuple(result[field][idx] for field in include)
+        for idx, id in enumerate(result["ids"])
+    }
+
+
+def get_embeddings(collection, ids: list[str], embedding_function=None) -> dict:
+    """Stored vectors of the given ids, keyed by id. Ids that are not in the
+    collection are left out; chunks stored without a vector are embedded from
+    their document when an embedding function is given, and left out otherwise."""
+    embeddings = {
+        id: embedding
+        for id, (embedding,) in get_by_ids(collection, ids, ["embeddings"]).items()
+    }
+
+    missing = [id for id, embedding in embeddings.items() if embedding is None]
+    if missing:
+        for id in missing:
+            del embeddings[id]
+        if embedding_function is not None:
+            documents = get_by_ids(collection, missing, ["documents"])
+            missing = [id for id in missing if documents.get(id, (None,))[0]]
+            if missing:
+                embeddings.update(
+                    zip(
+                        missing,
+                        embedding_function([documents[id][0] for id in missing]),
+                    )
+                )
+    return embeddings
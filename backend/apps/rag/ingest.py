@@ -0,0 +1,226 @@
+import time
+import uuid
+import queue
+import logging
+import threading
+
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, Optional
+
+from langchain_core.documents import Document
+
+from config import SRC_LOG_LEVELS, RAG_INGEST_BATCH_SIZE, RAG_INGEST_QUEUE_SIZE
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+_DONE = object()
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+class IngestLoadError(Exception):
+    """Raised by IngestPipeline.run() when reading or splitting the documents
+    failed; the original exception is the __cause__."""
+
+
+def lazy_load(loader) -> Iterator[Document]:
+    """Yield the documents of a loader one by one, using lazy_load() when the
+    loader implements it."""
+    if hasattr(loader, "lazy_load"):
+        try:
+            documents = loader.lazy_load()
+            yield next(documents)
+        except StopIteration:
+            return
+        except NotImplementedError:
+            yield from loader.load()
+            return
+        yield from documents
+    else:
+        yield from loader.load()
+
+
+def sanitize_metadata(metadata: dict) -> dict:
+    # ChromaDB does not like datetime formats for meta-data so convert them to string.
+    return {
+        key: str(value) if isinstance(value, datetime) else value
+        for key, value in metadata.items()
+    }
+
+
+class IngestPipeline:
+    """Streams documents through split -> embed -> write in bounded batches.
+
+    The calling thread pulls documents from the (lazy) iterable and splits them, one
+    thread embeds batches and another hands them to write_batch, so loading, the
+    embedding backend and the vector store work at the same time. The queues between
+    the stages hold at most queue_size batches, which bounds memory and makes a slow
+    stage throttle the ones before it.
+
+    write_batch is called with (ids, texts, metadatas, embeddings); on_progress, if
+    given, with a dict of counters after every written batch.
+    """
+
+    def __init__(
+        self,
+        embedding_function: Callable[[list[str]], list[list[float]]],
+        write_batch: Callable[[list[str], list[str], list[dict], list], None],
+        text_splitter=None,
+        metadata: Optional[dict] = None,
+        batch_size: int = RAG_INGEST_BATCH_SIZE,
+        queue_size: int = RAG_INGEST_QUEUE_SIZE,
+        id_function: Optional[Callable[[str, dict], str]] = None,
+        on_progress: Optional[Callable[[dict], None]] = None,
+    ):
+        self.embedding_function = embedding_function
+        self.write_batch = write_batch
+        self.text_splitter = text_splitter
+        self.metadata = metadata or {}
+        self.batch_size = max(batch_size, 1)
+        self.queue_size = max(queue_size, 1)
+        self.id_function = id_function or (lambda text, metadata: str(uuid.uuid4()))
+        self.on_progress = on_progress
+
+        self.stop_event = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.progress = {
+            "documents": 0,
+            "chunks": 0,
+            "embedded": 0,
+            "stored": 0,
+            "elapsed": 0.0,
+        }
+
+    def cancel(self):
+        self.stop_event.set()
+
+    def _fail(self, e: BaseException):
+        if self.error is None:
+            self.error = e
+        self.stop_event.set()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _split(self, document: Document) -> list[Document]:
+        if self.text_splitter is None:
+            return [document]
+        return self.text_splitter.split_documents([document])
+
+    def _produce(self, documents: Iterable[Document], embed_queue: queue.Queue):
+        batch: list[Document] = []
+        for document in documents:
+            if self.stop_event.is_set():
+                return
+
+            self.progress["documents"] += 1
+            for chunk in self._split(document):
+                self.progress["chunks"] += 1
+                batch.append(chunk)
+                if len(batch) >= self.batch_size:
+                    if not self._put(embed_queue, batch):
+                        return
+                    batch = []
+
+        if batch:
+            self._put(embed_queue, batch)
+
+    def _embed(self, embed_queue: queue.Queue, write_queue: queue.Queue):
+        try:
+            while (batch := self._get(embed_queue)) is not _DONE:
+                texts = [doc.page_content for doc in batch]
+                metadatas = [
+                    sanitize_metadata({**doc.metadata, **self.metadata})
+                    for doc in batch
+                ]
+                embeddings = self.embedding_function(
+                    [text.replace("\n", " ") for text in texts]
+                )
+                if embeddings is None or len(embeddings) != len(texts):
+                    raise ValueError("Embedding backend returned no embeddings")
+
+                self.progress["embedded"] += len(texts)
+                if not self._put(write_queue, (texts, metadatas, embeddings)):
+                    return
+            self._put(write_queue, _DONE)
+        except BaseException as e:
+            self._fail(e)
+
+    def _write(self, write_queue: queue.Queue, ids: list[str], start: float):
+        try:
+            while (item := self._get(write_queue)) is not _DONE:
+                texts, metadatas, embeddings = item
+                batch_ids = [
+                    self.id_function(text, metadata)
+                    for text, metadata in zip(texts, metadatas)
+                ]
+                self.write_batch(batch_ids, texts, metadatas, embeddings)
+                ids.extend(batch_ids)
+
+                self.progress["stored"] += len(texts)
+                self.progress["elapsed"] = time.monotonic() - start
+                log.debug(f"ingest progress: {self.progress}")
+                if self.on_progress is not None:
+                    self.on_progress(dict(self.progress))
+        except BaseException as e:
+            self._fail(e)
+
+    def run(self, documents: Iterable[Document]) -> list[str]:
+        """Ingest all documents and return the ids of the written chunks, raising
+        the first error of any stage."""
+        start = time.monotonic()
+        ids: list[str] = []
+        embed_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        write_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        embedder = threading.Thread(
+            target=self._embed, args=(embed_queue, write_queue), name="rag-ingest-embed"
+        )
+        writer = threading.Thread(
+            target=self._write, args=(write_queue, ids, start), name="rag-ingest-write"
+        )
+        embedder.start()
+        writer.start()
+
+        try:
+            self._produce(documents, embed_queue)
+            self._put(embed_queue, _DONE)
+        except Exception as e:
+            error = IngestLoadError(str(e))
+            error.__cause__ = e
+            self._fail(error)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            embedder.join()
+            writer.join()
+
+        if self.error is not None:
+            raise self.error
+        if self.stop_event.is_set():
+            raise IngestCancelled()
+
+        self.progress["elapsed"] = time.monotonic() - start
+        log.info(
+            f"ingested {self.progress['documents']} documents, "
+            f"{self.progress['stored']} chunks in {self.progress['elapsed']:.2f}s"
+        )
+        return ids
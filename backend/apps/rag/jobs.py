@@ -0,0 +1,290 @@
+import os
+import time
+import uuid
+import heapq
+import socket
+import logging
+import threading
+
+from collections import Counter
+from typing import Callable, Optional
+
+from apps.webui.models.jobs import Jobs, JobModel, JobStatus
+from config import (
+    SRC_LOG_LEVELS,
+    RAG_JOB_WORKERS,
+    RAG_JOB_MAX_PER_USER,
+    RAG_JOB_LEASE,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+# Lower runs first
+JOB_PRIORITY_INTERACTIVE = 0
+JOB_PRIORITY_DEFAULT = 5
+JOB_PRIORITY_BULK = 10
+
+# Minimum seconds between two progress writes of the same job
+PROGRESS_UPDATE_INTERVAL = 1.0
+
+# Seconds stop() waits for running jobs, the lease covers the ones left behind
+STOP_TIMEOUT = 30.0
+
+
+class JobQueue:
+    """In-process document processing queue backed by the job table.
+
+    Jobs are persisted before they are queued, so pending jobs are picked up again
+    by start() after a restart. A bounded pool of worker threads runs them by
+    priority, then submission order, skipping users that already have max_per_user
+    jobs running.
+
+    Several processes (e.g. uvicorn workers) may queue the same job: a worker claims
+    it with a conditional UPDATE before running it, so only one of them does. While
+    a job runs its worker renews a lease every lease / 3 seconds; running jobs whose
+    lease expired, because their process died, are put back to pending and queued
+    again by any live process.
+
+    Handlers are registered per job type and called as handler(payload, on_progress)
+    where on_progress takes a dict; the dict they return is stored as the result.
+    """
+
+    def __init__(self, workers: int, max_per_user: int, lease: int = RAG_JOB_LEASE):
+        self.workers = max(workers, 1)
+        self.max_per_user = max(max_per_user, 1)
+        self.lease = max(lease, 3)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.handlers: dict[str, Callable[[dict, Callable[[dict], None]], dict]] = {}
+
+        self.heap: list[tuple[int, int, str, str]] = []
+        self.sequence = 0
+        self.running: Counter = Counter()
+        # Ids of the jobs this process is running
+        self.active: set[str] = set()
+        self.condition = threading.Condition()
+        self.threads: list[threading.Thread] = []
+        self.stopping = False
+        self.stopped = threading.Event()
+
+    def register(self, type: str, handler: Callable[[dict, Callable], dict]):
+        self.handlers[type] = handler
+
+    def _push(self, job: JobModel):
+        self.sequence += 1
+        heapq.heappush(self.heap, (job.priority, self.sequence, job.id, job.user_id))
+        self.condition.notify()
+
+    def _recover(self):
+        """Release the jobs of dead workers and queue every pending job that is not
+        queued yet; called with the condition held."""
+        expired = Jobs.reset_expired_jobs(int(time.time()) - self.lease)
+        if expired:
+            log.warning(f"{expired} jobs lost their worker and are pending again")
+
+        queued = {item[2] for item in self.heap}
+        for job in Jobs.get_jobs_by_status([JobStatus.PENDING]):
+            if job.id not in queued:
+                self._push(job)
+
+    def start(self):
+        with self.condition:
+            if self.threads:
+                return
+            self.stopping = False
+            self.stopped.clear()
+            self._recover()
+
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f"rag-job-worker-{i}", daemon=True
+                )
+                thread.start()
+                self.threads.append(thread)
+
+            thread = threading.Thread(
+                target=self._heartbeat, name="rag-job-heartbeat", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+            log.info(
+                f"job queue {self.worker_id} started with {self.workers} workers, "
+                f"{len(self.heap)} pending jobs"
+            )
+
+    def stop(self, timeout: Optional[float] = STOP_TIMEOUT):
+        """Stop the workers and wait up to timeout seconds for the running jobs."""
+        with self.condition:
+            self.stopping = True
+            self.stopped.set()
+            self.condition.notify_all()
+            threads, self.threads = self.threads, []
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in threads:
+            thread.join(
+                None if deadline is None else max(deadline - time.monotonic(), 0)
+            )
+            if thread.is_alive():
+                log.warning(f"{thread.name} is still running a job")
+
+    def _heartbeat(self):
+        interval = self.lease / 3
+        last_recover = time.monotonic()
+        while not self.stopped.wait(interval):
+            try:
+                with self.condition:
+                    active = list(self.active)
+                if active:
+                    Jobs.touch_jobs(active, self.worker_id)
+
+                if time.monotonic() - last_recover >= self.lease:
+                    last_recover = time.monotonic()
+                    with self.condition:
+                        self._recover()
+            except Exception as e:
+                log.exception(f"job heartbeat failed: {e}")
+
+    def submit(
+        self,
+        user_id: str,
+        type: str,
+        payload: dict,
+        priority: int = JOB_PRIORITY_DEFAULT,
+        key: Optional[str] = None,
+    ) -> Optional[JobModel]:
+        """Queue a job, or return the existing one when a job with the same key is
+        still pending or running.
+
+        Finished jobs never match, so resubmitting after the collection was reset
+        or deleted processes the document again."""
+        if type not in self.handlers:
+            raise ValueError(f"Unknown job type: {type}")
+
+        with self.condition:
+            if key is not None:
+                job = Jobs.get_job_by_key(key)
+                if job is not None:
+                    log.debug(f"job {key} already submitted as {job.id}")
+                    return job
+
+            job = Jobs.insert_new_job(user_id, type, payload, priority, key)
+            if job is not None:
+                self._push(job)
+        return job
+
+    def cancel(self, id: str) -> Optional[JobModel]:
+        """Cancel a pending job; running jobs are left to finish."""
+        with self.condition:
+            if Jobs.update_job_if(
+                id,
+                {"status": JobStatus.CANCELLED, "finished_at": int(time.time())},
+                status=JobStatus.PENDING,
+            ):
+                self.heap = [item for item in self.heap if item[2] != id]
+                heapq.heapify(self.heap)
+            return Jobs.get_job_by_id(id)
+
+    def get_stats(self) -> dict:
+        with self.condition:
+            return {
+                "workers": self.workers,
+                "max_per_user": self.max_per_user,
+                "pending": len(self.heap),
+                "running": sum(self.running.values()),
+            }
+
+    def _next(self) -> Optional[tuple[str, str]]:
+        """Pop the best job whose user is below the concurrency limit."""
+        skipped = []
+        found = None
+        while self.heap:
+            item = heapq.heappop(self.heap)
+            if self.running[item[3]] < self.max_per_user:
+                found = item
+                break
+            skipped.append(item)
+
+        for item in skipped:
+            heapq.heappush(self.heap, item)
+        return (found[2], found[3]) if found else None
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.stopping and (next_job := self._next()) is None:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+
+                id, user_id = next_job
+                self.running[user_id] += 1
+
+            try:
+                self._run(id)
+            finally:
+                with self.condition:
+                    self.running[user_id] -= 1
+                    if self.running[user_id] <= 0:
+                        del self.running[user_id]
+                    # A job of this user may have been waiting for the slot
+                    self.condition.notify_all()
+
+    def _run(self, id: str):
+        job = Jobs.get_job_by_id(id)
+        if job is None or job.status != JobStatus.PENDING:
+            return
+
+        now = int(time.time())
+        if not Jobs.update_job_if(
+            id,
+            {
+                "status": JobStatus.RUNNING,
+                "worker_id": self.worker_id,
+                "started_at": now,
+                "heartbeat_at": now,
+            },
+            status=JobStatus.PENDING,
+        ):
+            log.debug(f"job {id} was claimed by another worker")
+            return
+
+        with self.condition:
+            self.active.add(id)
+
+        last_update = 0.0
+
+        def on_progress(progress: dict):
+            nonlocal last_update
+            now = time.monotonic()
+            if now - last_update >= PROGRESS_UPDATE_INTERVAL:
+                last_update = now
+                Jobs.update_job_if(id, {"progress": progress}, worker_id=self.worker_id)
+
+        try:
+            result = self.handlers[job.type](job.payload, on_progress)
+            updated = {
+                "status": JobStatus.COMPLETED,
+                "result": result,
+                "finished_at": int(time.time()),
+            }
+            log.info(f"job {id} ({job.type}) completed")
+        except Exception as e:
+            log.exception(e)
+            updated = {
+                "status": JobStatus.FAILED,
+                "error": str(e),
+                "finished_at": int(time.time()),
+            }
+        finally:
+            with self.condition:
+                self.active.discard(id)
+
+        # A job whose lease expired may be running elsewhere by now
+        if not Jobs.update_job_if(id, updated, worker_id=self.worker_id):
+            log.warning(f"job {id} was taken over by another worker")
+
+
+JOB_QUEUE = JobQueue(RAG_JOB_WORKERS, RAG_JOB_MAX_PER_USER)
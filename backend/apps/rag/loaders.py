@@ -0,0 +1,442 @@
+import time
+import logging
+import itertools
+import threading
+import multiprocessing
+import requests
+
+from multiprocessing.pool import AsyncResult, Pool
+from typing import Iterator, Optional
+
+from langchain_core.documents import Document
+from langchain_community.document_loaders import (
+    TextLoader,
+    CSVLoader,
+    BSHTMLLoader,
+    Docx2txtLoader,
+    UnstructuredEPubLoader,
+    UnstructuredMarkdownLoader,
+    UnstructuredXMLLoader,
+    UnstructuredRSTLoader,
+    UnstructuredExcelLoader,
+    UnstructuredPowerPointLoader,
+    OutlookMessageLoader,
+)
+
+from apps.rag.extraction_cache import EXTRACTION_CACHE
+from config import (
+    SRC_LOG_LEVELS,
+    RAG_PDF_WORKERS,
+    RAG_PDF_PAGES_PER_TASK,
+    RAG_PDF_PAGE_TIMEOUT,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+class TikaLoader:
+    def __init__(self, file_path, mime_type=None, url=""):
+        self.file_path = file_path
+        self.mime_type = mime_type
+        self.url = url
+
+    def load(self) -> list[Document]:
+        with open(self.file_path, "rb") as f:
+            data = f.read()
+
+        if self.mime_type is not None:
+            headers = {"Content-Type": self.mime_type}
+        else:
+            headers = {}
+
+        endpoint = self.url
+        if not endpoint.endswith("/"):
+            endpoint += "/"
+        endpoint += "tika/text"
+
+        r = requests.put(endpoint, data=data, headers=headers)
+
+        if r.ok:
+            raw_metadata = r.json()
+            text = raw_metadata.get("X-TIKA:content", "<No text content found>")
+
+            if "Content-Type" in raw_metadata:
+                headers["Content-Type"] = raw_metadata["Content-Type"]
+
+            log.info("Tika extracted text: %s", text)
+
+            return [Document(page_content=text, metadata=headers)]
+        else:
+            raise Exception(f"Error calling Tika: {r.reason}")
+
+
+def _extract_pdf_pages(
+    file_path: str, pages: list[int], extract_images: bool
+) -> list[str]:
+    """Text (plus OCR of the embedded images) of some pages of a PDF; runs in a
+    worker process."""
+    import pypdf
+    from langchain_community.document_loaders.parsers.pdf import (
+        extract_from_images_with_rapidocr,
+    )
+
+    reader = pypdf.PdfReader(file_path)
+    texts = []
+    for page in pages:
+        text = reader.pages[page].extract_text()
+        if extract_images:
+            images = [image.data for image in reader.pages[page].images]
+            if images:
+                text += extract_from_images_with_rapidocr(images)
+        texts.append(text)
+    return texts
+
+
+# Set in every PDF worker process, see PDFWorkerPool
+_started_tasks = None
+
+
+def _init_pdf_worker(started_tasks):
+    global _started_tasks
+    _started_tasks = started_tasks
+
+
+def _run_pdf_task(task_id: int, func, *args):
+    _started_tasks.put((task_id, time.time()))
+    return func(*args)
+
+
+class PDFWorkerPool:
+    """Long-lived process pool shared by all PDF extractions.
+
+    Spawning the worker processes (and their imports) takes more than a second, so
+    the pool is created with the first task and kept until close(). Workers report
+    when a task starts, so its timeout does not include the time it was queued
+    behind other extractions. As soon as a task runs past its timeout the pool is
+    terminated, which also aborts the tasks of other extractions, and a new pool
+    is created with the next task.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.pool = None
+        self.started_tasks = None
+        # task id -> (timeout, start time or None while queued)
+        self.tasks: dict[int, tuple[float, Optional[float]]] = {}
+        self.task_ids = itertools.count()
+        self.lock = threading.Lock()
+
+    def submit(self, func, args: tuple, timeout: float) -> tuple[Pool, AsyncResult]:
+        """Run func(*args) on the pool, returns the pool and the AsyncResult."""
+        with self.lock:
+            if self.pool is None:
+                if multiprocessing.parent_process() is not None:
+                    # Already one of several worker processes (e.g. /scan)
+                    workers = 1
+                else:
+                    workers = self.workers
+                # Forking a process that runs the server threads can deadlock the
+                # children
+                context = multiprocessing.get_context("spawn")
+                self.started_tasks = context.SimpleQueue()
+                self.pool = context.Pool(
+                    workers,
+                    initializer=_init_pdf_worker,
+                    initargs=(self.started_tasks,),
+                )
+            pool = self.pool
+            task_id = next(self.task_ids)
+            self.tasks[task_id] = (timeout, None)
+
+        def done(_):
+            with self.lock:
+                if self.pool is pool:
+                    self.tasks.pop(task_id, None)
+
+        result = pool.apply_async(
+            _run_pdf_task, (task_id, func, *args), callback=done, error_callback=done
+        )
+        return pool, result
+
+    def check(self, pool: Pool) -> bool:
+        """False once pool was terminated. Terminates it when a task ran past its
+        timeout (e.g. a hung OCR), as the task would keep its worker forever."""
+        with self.lock:
+            if self.pool is not pool:
+                return False
+            while not self.started_tasks.empty():
+                task_id, started_at = self.started_tasks.get()
+                if task_id in self.tasks:
+                    self.tasks[task_id] = (self.tasks[task_id][0], started_at)
+
+            now = time.time()
+            if not any(
+                started_at is not None and now - started_at > timeout
+                for timeout, started_at in self.tasks.values()
+            ):
+                return True
+            self.pool = None
+            self.tasks = {}
+
+        log.warning("a PDF page timed out, terminating the PDF worker pool")
+        pool.terminate()
+        return False
+
+    def close(self):
+        with self.lock:
+            pool, self.pool = self.pool, None
+            self.tasks = {}
+        if pool is not None:
+            pool.terminate()
+
+
+PDF_WORKER_POOL = PDFWorkerPool(RAG_PDF_WORKERS) if RAG_PDF_WORKERS > 0 else None
+
+
+class ParallelPDFLoader:
+    """PDF loader that extracts (and OCRs) page ranges on a PDFWorkerPool.
+
+    Yields one Document per page in page order, with the same metadata as
+    PyPDFLoader. Every task has page_timeout seconds per page from when it starts
+    running, after which the pool is terminated and the extraction fails. With the
+    file hash given, every finished page is cached in the extraction cache, so a
+    retry after a failure or timeout only extracts the missing pages. Without a
+    pool, or in a daemonic process, the pages are extracted in-process without a
+    timeout.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        extract_images: bool = False,
+        pool: Optional[PDFWorkerPool] = PDF_WORKER_POOL,
+        pages_per_task: int = RAG_PDF_PAGES_PER_TASK,
+        page_timeout: float = RAG_PDF_PAGE_TIMEOUT,
+        file_hash: Optional[str] = None,
+    ):
+        self.file_path = file_path
+        self.extract_images = extract_images
+        self.pool = pool
+        self.pages_per_task = max(pages_per_task, 1)
+        self.page_timeout = page_timeout
+        self.file_hash = file_hash
+
+    def _get_page_key(self, page: int) -> str:
+        return EXTRACTION_CACHE.get_key(
+            self.file_hash, self, {"page": page, "extract_images": self.extract_images}
+        )
+
+    def _get_cached_pages(self, page_count: int) -> dict[int, str]:
+        if EXTRACTION_CACHE is None or self.file_hash is None:
+            return {}
+
+        pages = {}
+        for page in range(page_count):
+            documents = EXTRACTION_CACHE.get(self._get_page_key(page))
+            if documents is not None:
+                pages[page] = documents[0].page_content
+        return pages
+
+    def _cache_pages(self, pages: list[int], texts: list[str]):
+        if EXTRACTION_CACHE is None or self.file_hash is None:
+            return
+        for page, text in zip(pages, texts):
+            try:
+                EXTRACTION_CACHE.set(
+                    self._get_page_key(page), [Document(page_content=text)]
+                )
+            except Exception as e:
+                log.warning(f"caching page {page} of {self.file_path} failed: {e}")
+
+    def _get_document(self, page: int, text: str) -> Document:
+        return Document(
+            page_content=text, metadata={"source": self.file_path, "page": page}
+        )
+
+    def lazy_load(self) -> Iterator[Document]:
+        import pypdf
+
+        page_count = len(pypdf.PdfReader(self.file_path).pages)
+        cached = self._get_cached_pages(page_count)
+        missing = [page for page in range(page_count) if page not in cached]
+        tasks = [
+            missing[i : i + self.pages_per_task]
+            for i in range(0, len(missing), self.pages_per_task)
+        ]
+
+        # Daemonic processes (e.g. multiprocessing.Pool workers) cannot have
+        # children, their pages are extracted without a timeout
+        if not tasks or self.pool is None or multiprocessing.current_process().daemon:
+            for page in range(page_count):
+                if page not in cached:
+                    text = _extract_pdf_pages(
+                        self.file_path, [page], self.extract_images
+                    )[0]
+                    self._cache_pages([page], [text])
+                    cached[page] = text
+                yield self._get_document(page, cached.pop(page))
+            return
+
+        log.info(
+            f"extracting {len(missing)}/{page_count} pages of {self.file_path} "
+            f"in {len(tasks)} tasks"
+        )
+        # Keyed by the first page of each task
+        task_pages = {pages[0]: pages for pages in tasks}
+        results: dict[int, tuple[Pool, AsyncResult]] = {}
+        try:
+            for pages in tasks:
+                results[pages[0]] = self.pool.submit(
+                    _extract_pdf_pages,
+                    (self.file_path, pages, self.extract_images),
+                    self.page_timeout * len(pages),
+                )
+
+            for page in range(page_count):
+                if page not in cached:
+                    # Earlier tasks are consumed, so this page starts the next one
+                    pages = task_pages[page]
+                    texts = self._wait(*results.pop(page), pages)
+                    self._cache_pages(pages, texts)
+                    cached.update(zip(pages, texts))
+                yield self._get_document(page, cached.pop(page))
+        finally:
+            # Keep what the other workers finished for the next attempt. Tasks that
+            # are still running finish in the background.
+            for page, (_, result) in results.items():
+                if result.ready() and result.successful():
+                    self._cache_pages(task_pages[page], result.get())
+
+    def _wait(self, pool: Pool, result: AsyncResult, pages: list[int]) -> list[str]:
+        while not result.ready():
+            if not self.pool.check(pool):
+                raise TimeoutError(
+                    f"Extracting pages {pages[0]}-{pages[-1]} of {self.file_path} "
+                    f"was aborted after a PDF page timed out"
+                )
+            result.wait(1)
+        return result.get()
+
+    def load(self) -> list[Document]:
+        return list(self.lazy_load())
+
+
+def get_loader(
+    filename: str,
+    file_content_type: str,
+    file_path: str,
+    extraction_engine: str = "",
+    tika_server_url: str = "",
+    pdf_extract_images: bool = False,
+    file_hash: Optional[str] = None,
+):
+    """Pick the document loader for a file. Only depends on its arguments so that it
+    can run in worker processes. The file hash lets PDF pages be cached."""
+    file_ext = filename.split(".")[-1].lower()
+    known_type = True
+
+    known_source_ext = [
+        "go",
+        "py",
+        "java",
+        "sh",
+        "bat",
+        "ps1",
+        "cmd",
+        "js",
+        "ts",
+        "css",
+        "cpp",
+        "hpp",
+        "h",
+        "c",
+        "cs",
+        "sql",
+        "log",
+        "ini",
+        "pl",
+        "pm",
+        "r",
+        "dart",
+        "dockerfile",
+        "env",
+        "php",
+        "hs",
+        "hsc",
+        "lua",
+        "nginxconf",
+        "conf",
+        "m",
+        "mm",
+        "plsql",
+        "perl",
+        "rb",
+        "rs",
+        "db2",
+        "scala",
+        "bash",
+        "swift",
+        "vue",
+        "svelte",
+        "msg",
+        "ex",
+        "exs",
+        "erl",
+        "tsx",
+        "jsx",
+        "hs",
+        "lhs",
+    ]
+
+    if extraction_engine == "tika" and tika_server_url:
+        if file_ext in known_source_ext or (
+            file_content_type and file_content_type.find("text/") >= 0
+        ):
+            loader = TextLoader(file_path, autodetect_encoding=True)
+        else:
+            loader = TikaLoader(file_path, file_content_type, tika_server_url)
+    else:
+        if file_ext == "pdf":
+            loader = ParallelPDFLoader(
+                file_path, extract_images=pdf_extract_images, file_hash=file_hash
+            )
+        elif file_ext == "csv":
+            loader = CSVLoader(file_path)
+        elif file_ext == "rst":
+            loader = UnstructuredRSTLoader(file_path, mode="elements")
+        elif file_ext == "xml":
+            loader = UnstructuredXMLLoader(file_path)
+        elif file_ext in ["htm", "html"]:
+            loader = BSHTMLLoader(file_path, open_encoding="unicode_escape")
+        elif file_ext == "md":
+            loader = UnstructuredMarkdownLoader(file_path)
+        elif file_content_type == "application/epub+zip":
+            loader = UnstructuredEPubLoader(file_path)
+        elif (
+            file_content_type
+            == "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            or file_ext in ["doc", "docx"]
+        ):
+            loader = Docx2txtLoader(file_path)
+        elif file_content_type in [
+            "application/vnd.ms-excel",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        ] or file_ext in ["xls", "xlsx"]:
+            loader = UnstructuredExcelLoader(file_path)
+        elif file_content_type in [
+            "application/vnd.ms-powerpoint",
+            "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+        ] or file_ext in ["ppt", "pptx"]:
+            loader = UnstructuredPowerPointLoader(file_path)
+        elif file_ext == "msg":
+            loader = OutlookMessageLoader(file_path)
+        elif file_ext in known_source_ext or (
+            file_content_type and file_content_type.find("text/") >= 0
+        ):
+            loader = TextLoader(file_path, autodetect_encoding=True)
+        else:
+            loader = TextLoader(file_path, autodetect_encoding=True)
+            known_type = False
+
+    return loader, known_type
@@ -11,30 +11,16 @@ from fastapi import (
 from fastapi.middleware.cors import CORSMiddleware
 import requests
 import os, shutil, logging, re
+from collections import Counter
 from datetime import datetime
 
 from pathlib import Path
 from typing import Union, Sequence, Iterator, Any
 
-from chromadb.utils.batch_utils import create_batches
 from langchain_core.documents import Document
 
 from langchain_community.document_loaders import (
-    WebBaseLoader,
-    TextLoader,
-    PyPDFLoader,
-    CSVLoader,
-    BSHTMLLoader,
-    Docx2txtLoader,
-    UnstructuredEPubLoader,
-    UnstructuredWordDocumentLoader,
-    UnstructuredMarkdownLoader,
-    UnstructuredXMLLoader,
-    UnstructuredRSTLoader,
-    UnstructuredExcelLoader,
-    UnstructuredPowerPointLoader,
     YoutubeLoader,
-    OutlookMessageLoader,
 )
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
@@ -48,12 +34,16 @@ from typing import Optional
 import mimetypes
 import uuid
 import json
+import time
 
 from apps.webui.models.documents import (
     Documents,
     DocumentForm,
     DocumentResponse,
 )
+from apps.webui.models.jobs import Jobs, JobModel
+from apps.webui.models.scans import ScanManifest
+from apps.webui.models.qa import QAPairs
 from apps.webui.models.files import (
     Files,
 )
@@ -65,7 +55,39 @@ from apps.rag.utils import (
     query_doc_with_hybrid_search,
     query_collection,
     query_collection_with_hybrid_search,
+    get_metadata_filter,
 )
+from apps.rag.bm25 import BM25_INDEXES
+from apps.rag.chunk_store import CHUNK_STORE
+from apps.rag.extraction_cache import EXTRACTION_CACHE, load_documents
+from apps.rag.search.cache import SEARCH_CACHE
+from apps.rag.search.orchestrator import SEARCH_ORCHESTRATOR
+from apps.rag.web import WEB_PAGE_CACHE, WebPageLoader
+from apps.rag.embedding_cache import EMBEDDING_CACHE
+from apps.rag.ingest import IngestLoadError, IngestPipeline, lazy_load
+from apps.rag.qa import is_qa_file_name, parse_qa_documents
+from apps.rag.faq import FAQ_INDEX
+from apps.rag.vector.connector import VECTOR_DB_CLIENT
+from apps.rag.vector.main import CollectionExistsError
+from apps.rag.memories import reindex_all_memories
+from apps.rag.loaders import get_loader as _get_loader
+from apps.rag.scan import (
+    SCAN_COLLECTION_PREFIX,
+    extract_file,
+    get_scan_collection_name,
+    get_scan_executor,
+    hash_file,
+    list_files,
+    map_files,
+    plan_scan,
+)
+from apps.rag.jobs import (
+    JOB_QUEUE,
+    JOB_PRIORITY_BULK,
+    JOB_PRIORITY_INTERACTIVE,
+)
+from apps.rag.rerank_batcher import RerankBatcher
+from apps.rag.retrieval_cache import RETRIEVAL_CACHE
 
 from apps.rag.search.brave import search_brave
 from apps.rag.search.google_pse import search_google_pse
@@ -81,6 +103,7 @@ from apps.rag.search.jina_search import search_jina
 from utils.misc import (
     calculate_sha256,
     calculate_sha256_string,
+    save_file_with_sha256,
     sanitize_filename,
     extract_folders_after_data_docs,
 )
@@ -106,10 +129,12 @@ from config import (
     PDF_EXTRACT_IMAGES,
     RAG_RERANKING_MODEL_AUTO_UPDATE,
     RAG_RERANKING_MODEL_TRUST_REMOTE_CODE,
+    RAG_RERANKING_BATCH_MAX_WAIT_MS,
+    RAG_RERANKING_BATCH_SIZE,
+    RAG_RERANKING_TIMEOUT,
     RAG_OPENAI_API_BASE_URL,
     RAG_OPENAI_API_KEY,
     DEVICE_TYPE,
-    CHROMA_CLIENT,
     CHUNK_SIZE,
     CHUNK_OVERLAP,
     RAG_TEMPLATE,
@@ -129,6 +154,7 @@ from config import (
     TAVILY_API_KEY,
     RAG_WEB_SEARCH_RESULT_COUNT,
     RAG_WEB_SEARCH_CONCURRENT_REQUESTS,
+    RAG_WEB_SEARCH_ENGINES,
     RAG_EMBEDDING_OPENAI_BATCH_SIZE,
     CORS_ALLOW_ORIGIN,
 )
@@ -210,17 +236,28 @@ def update_reranking_model(
     reranking_model: str,
     update_model: bool = False,
 ):
+    previous = getattr(app.state, "sentence_transformer_rf", None)
+
     if reranking_model:
         import sentence_transformers
 
-        app.state.sentence_transformer_rf = sentence_transformers.CrossEncoder(
-            get_model_path(reranking_model, update_model),
-            device=DEVICE_TYPE,
-            trust_remote_code=RAG_RERANKING_MODEL_TRUST_REMOTE_CODE,
+        app.state.sentence_transformer_rf = RerankBatcher(
+            sentence_transformers.CrossEncoder(
+                get_model_path(reranking_model, update_model),
+                device=DEVICE_TYPE,
+                trust_remote_code=RAG_RERANKING_MODEL_TRUST_REMOTE_CODE,
+            ),
+            reranking_model,
+            RAG_RERANKING_BATCH_MAX_WAIT_MS,
+            RAG_RERANKING_BATCH_SIZE,
+            RAG_RERANKING_TIMEOUT,
         )
     else:
         app.state.sentence_transformer_rf = None
 
+    if previous is not None:
+        previous.close()
+
 
 update_embedding_model(
     app.state.config.RAG_EMBEDDING_MODEL,
@@ -257,6 +294,7 @@ class CollectionNameForm(BaseModel):
 
 class UrlForm(CollectionNameForm):
     url: str
+    background: bool = False
 
 
 class SearchForm(CollectionNameForm):
@@ -319,6 +357,15 @@ async def update_embedding_config(
         f"Updating embedding model: {app.state.config.RAG_EMBEDDING_MODEL} to {form_data.embedding_model}"
     )
     try:
+        if (
+            app.state.config.RAG_EMBEDDING_ENGINE != form_data.embedding_engine
+            or app.state.config.RAG_EMBEDDING_MODEL != form_data.embedding_model
+        ):
+            EMBEDDING_CACHE.invalidate(
+                app.state.config.RAG_EMBEDDING_ENGINE,
+                app.state.config.RAG_EMBEDDING_MODEL,
+            )
+
         app.state.config.RAG_EMBEDDING_ENGINE = form_data.embedding_engine
         app.state.config.RAG_EMBEDDING_MODEL = form_data.embedding_model
 
@@ -361,6 +408,11 @@ async def update_embedding_config(
         )
 
 
+@app.get("/embedding/cache")
+async def get_embedding_cache_stats(user=Depends(get_admin_user)):
+    return {"status": True, **EMBEDDING_CACHE.get_stats()}
+
+
 class RerankingModelUpdateForm(BaseModel):
     reranking_model: str
 
@@ -600,12 +652,67 @@ async def update_query_settings(
     }
 
 
+@app.get("/chunks/stats")
+async def get_chunk_store_stats(user=Depends(get_admin_user)):
+    if CHUNK_STORE is None:
+        return {"status": False}
+    return {"status": True, **CHUNK_STORE.get_stats()}
+
+
+@app.post("/chunks/gc")
+def collect_chunk_store(user=Depends(get_admin_user)):
+    if CHUNK_STORE is None:
+        return {"status": False}
+    return {"status": True, "deleted": CHUNK_STORE.gc()}
+
+
+@app.get("/web/cache")
+async def get_web_cache_stats(user=Depends(get_admin_user)):
+    return {
+        "search": SEARCH_CACHE.get_stats(),
+        "pages": WEB_PAGE_CACHE.get_stats() if WEB_PAGE_CACHE is not None else None,
+    }
+
+
+@app.get("/web/search/engines")
+async def get_web_search_engine_stats(user=Depends(get_admin_user)):
+    return SEARCH_ORCHESTRATOR.get_stats()
+
+
+@app.get("/faq/stats")
+async def get_faq_stats(user=Depends(get_admin_user)):
+    return FAQ_INDEX.get_stats()
+
+
+@app.get("/extraction/cache")
+async def get_extraction_cache_stats(user=Depends(get_admin_user)):
+    if EXTRACTION_CACHE is None:
+        return {"status": False}
+    return {"status": True, **EXTRACTION_CACHE.get_stats()}
+
+
+@app.get("/query/cache")
+async def get_retrieval_cache_stats(user=Depends(get_admin_user)):
+    return {
+        "status": True,
+        **RETRIEVAL_CACHE.get_stats(),
+        "collections": VECTOR_DB_CLIENT.get_stats(),
+    }
+
+
+class MetadataFilterForm(BaseModel):
+    file_id: Optional[Union[str, list[str]]] = None
+    name: Optional[Union[str, list[str]]] = None
+    created_by: Optional[Union[str, list[str]]] = None
+
+
 class QueryDocForm(BaseModel):
     collection_name: str
     query: str
     k: Optional[int] = None
     r: Optional[float] = None
     hybrid: Optional[bool] = None
+    filter: Optional[MetadataFilterForm] = None
 
 
 @app.post("/query/doc")
@@ -614,6 +721,10 @@ def query_doc_handler(
     user=Depends(get_verified_user),
 ):
     try:
+        # Pushed down into the vector store instead of filtering the top k
+        where = get_metadata_filter(
+            form_data.filter.model_dump(exclude_none=True) if form_data.filter else None
+        )
         if app.state.config.ENABLE_RAG_HYBRID_SEARCH:
             return query_doc_with_hybrid_search(
                 collection_name=form_data.collection_name,
@@ -624,6 +735,7 @@ def query_doc_handler(
                 r=(
                     form_data.r if form_data.r else app.state.config.RELEVANCE_THRESHOLD
                 ),
+                where=where,
             )
         else:
             return query_doc(
@@ -631,6 +743,7 @@ def query_doc_handler(
                 query=form_data.query,
                 embedding_function=app.state.EMBEDDING_FUNCTION,
                 k=form_data.k if form_data.k else app.state.config.TOP_K,
+                where=where,
             )
     except Exception as e:
         log.exception(e)
@@ -646,6 +759,7 @@ class QueryCollectionsForm(BaseModel):
     k: Optional[int] = None
     r: Optional[float] = None
     hybrid: Optional[bool] = None
+    filter: Optional[MetadataFilterForm] = None
 
 
 @app.post("/query/collection")
@@ -654,6 +768,10 @@ def query_collection_handler(
     user=Depends(get_verified_user),
 ):
     try:
+        # Pushed down into the vector store instead of filtering the top k
+        where = get_metadata_filter(
+            form_data.filter.model_dump(exclude_none=True) if form_data.filter else None
+        )
         if app.state.config.ENABLE_RAG_HYBRID_SEARCH:
             return query_collection_with_hybrid_search(
                 collection_names=form_data.collection_names,
@@ -664,6 +782,7 @@ def query_collection_handler(
                 r=(
                     form_data.r if form_data.r else app.state.config.RELEVANCE_THRESHOLD
                 ),
+                where=where,
             )
         else:
             return query_collection(
@@ -671,6 +790,7 @@ def query_collection_handler(
                 query=form_data.query,
                 embedding_function=app.state.EMBEDDING_FUNCTION,
                 k=form_data.k if form_data.k else app.state.config.TOP_K,
+                where=where,
             )
 
     except Exception as e:
@@ -681,27 +801,39 @@ def query_collection_handler(
         )
 
 
+def process_youtube_video(url: str, collection_name: str, on_progress=None) -> dict:
+    loader = YoutubeLoader.from_youtube_url(
+        url,
+        add_video_info=True,
+        language=app.state.config.YOUTUBE_LOADER_LANGUAGE,
+        translation=app.state.YOUTUBE_LOADER_TRANSLATION,
+    )
+
+    if collection_name == "":
+        collection_name = calculate_sha256_string(url)[:63]
+
+    store_data_in_vector_db(
+        lazy_load(loader), collection_name, overwrite=True, on_progress=on_progress
+    )
+    return {
+        "status": True,
+        "collection_name": collection_name,
+        "filename": url,
+    }
+
+
 @app.post("/youtube")
 def store_youtube_video(form_data: UrlForm, user=Depends(get_verified_user)):
     try:
-        loader = YoutubeLoader.from_youtube_url(
-            form_data.url,
-            add_video_info=True,
-            language=app.state.config.YOUTUBE_LOADER_LANGUAGE,
-            translation=app.state.YOUTUBE_LOADER_TRANSLATION,
-        )
-        data = loader.load()
-
-        collection_name = form_data.collection_name
-        if collection_name == "":
-            collection_name = calculate_sha256_string(form_data.url)[:63]
+        if form_data.background:
+            return submit_job(
+                user,
+                "youtube",
+                {"url": form_data.url, "collection_name": form_data.collection_name},
+                JOB_PRIORITY_INTERACTIVE,
+            )
 
-        store_data_in_vector_db(data, collection_name, overwrite=True)
-        return {
-            "status": True,
-            "collection_name": collection_name,
-            "filename": form_data.url,
-        }
+        return process_youtube_video(form_data.url, form_data.collection_name)
     except Exception as e:
         log.exception(e)
         raise HTTPException(
@@ -710,26 +842,38 @@ def store_youtube_video(form_data: UrlForm, user=Depends(get_verified_user)):
         )
 
 
+def process_web_page(url: str, collection_name: str, on_progress=None) -> dict:
+    loader = get_web_loader(
+        url,
+        verify_ssl=app.state.config.ENABLE_RAG_WEB_LOADER_SSL_VERIFICATION,
+    )
+
+    if collection_name == "":
+        collection_name = calculate_sha256_string(url)[:63]
+
+    store_data_in_vector_db(
+        lazy_load(loader), collection_name, overwrite=True, on_progress=on_progress
+    )
+    return {
+        "status": True,
+        "collection_name": collection_name,
+        "filename": url,
+    }
+
+
 @app.post("/web")
 def store_web(form_data: UrlForm, user=Depends(get_verified_user)):
     # "https://www.gutenberg.org/files/1727/1727-h/1727-h.htm"
     try:
-        loader = get_web_loader(
-            form_data.url,
-            verify_ssl=app.state.config.ENABLE_RAG_WEB_LOADER_SSL_VERIFICATION,
-        )
-        data = loader.load()
-
-        collection_name = form_data.collection_name
-        if collection_name == "":
-            collection_name = calculate_sha256_string(form_data.url)[:63]
+        if form_data.background:
+            return submit_job(
+                user,
+                "web",
+                {"url": form_data.url, "collection_name": form_data.collection_name},
+                JOB_PRIORITY_INTERACTIVE,
+            )
 
-        store_data_in_vector_db(data, collection_name, overwrite=True)
-        return {
-            "status": True,
-            "collection_name": collection_name,
-            "filename": form_data.url,
-        }
+        return process_web_page(form_data.url, form_data.collection_name)
     except Exception as e:
         log.exception(e)
         raise HTTPException(
@@ -742,11 +886,10 @@ def get_web_loader(url: Union[str, Sequence[str]], verify_ssl: bool = True):
     # Check if the URL is valid
     if not validate_url(url):
         raise ValueError(ERROR_MESSAGES.INVALID_URL)
-    return SafeWebBaseLoader(
+    return WebPageLoader(
         url,
         verify_ssl=verify_ssl,
-        requests_per_second=RAG_WEB_SEARCH_CONCURRENT_REQUESTS,
-        continue_on_failure=True,
+        concurrent_requests=app.state.config.RAG_WEB_SEARCH_CONCURRENT_REQUESTS,
     )
 
 
@@ -786,6 +929,33 @@ def resolve_hostname(hostname):
 
 
 def search_web(engine: str, query: str) -> list[SearchResult]:
+    """Search with the given engine and the additional RAG_WEB_SEARCH_ENGINES
+    (see apps.rag.search.orchestrator), through the search result cache."""
+    engines = [engine] + [e for e in RAG_WEB_SEARCH_ENGINES if e != engine]
+    key = SEARCH_CACHE.get_key(
+        f"{SEARCH_ORCHESTRATOR.mode}:{','.join(engines)}",
+        query,
+        app.state.config.RAG_WEB_SEARCH_RESULT_COUNT,
+        app.state.config.RAG_WEB_SEARCH_DOMAIN_FILTER_LIST,
+    )
+    if SEARCH_CACHE.enabled:
+        results = SEARCH_CACHE.get(key)
+        if results is not None:
+            log.debug(f"search cache hit for {query}")
+            return results
+
+    results = SEARCH_ORCHESTRATOR.search(
+        engines,
+        query,
+        search_web_engine,
+        app.state.config.RAG_WEB_SEARCH_RESULT_COUNT,
+    )
+    if SEARCH_CACHE.enabled:
+        SEARCH_CACHE.set(key, results)
+    return results
+
+
+def search_web_engine(engine: str, query: str) -> list[SearchResult]:
     """Search the web using a search engine and return the results as a list of SearchResult objects.
     Will look for a search engine API key in environment variables in the following order:
     - SEARXNG_QUERY_URL
@@ -917,7 +1087,18 @@ def store_web_search(form_data: SearchForm, user=Depends(get_verified_user)):
         if collection_name == "":
             collection_name = calculate_sha256_string(form_data.query)[:63]
 
+            # Only web search writes to the collection of a query, so it can be
+            # reused as long as it is fresh and its pages did not change
+            if is_web_search_collection_fresh(collection_name, data):
+                log.info(f"reusing web search collection {collection_name}")
+                return {
+                    "status": True,
+                    "collection_name": collection_name,
+                    "filenames": urls,
+                }
+
         store_data_in_vector_db(data, collection_name, overwrite=True)
+        save_web_search_collection(collection_name, data)
         return {
             "status": True,
             "collection_name": collection_name,
@@ -931,9 +1112,59 @@ def store_web_search(form_data: SearchForm, user=Depends(get_verified_user)):
         )
 
 
+def get_web_search_collection_key(collection_name: str) -> str:
+    return calculate_sha256_string(f"collection\x00{collection_name}")
+
+
+def get_web_documents_hash(documents: list[Document]) -> str:
+    return calculate_sha256_string(
+        json.dumps(
+            [[doc.metadata.get("source"), doc.page_content] for doc in documents]
+        )
+    )
+
+
+def save_web_search_collection(collection_name: str, documents: list[Document]):
+    if WEB_PAGE_CACHE is None:
+        return
+    WEB_PAGE_CACHE.set(
+        get_web_search_collection_key(collection_name),
+        {
+            "collection_name": collection_name,
+            "hash": get_web_documents_hash(documents),
+            "created_at": time.time(),
+        },
+    )
+
+
+def is_web_search_collection_fresh(
+    collection_name: str, documents: list[Document]
+) -> bool:
+    if WEB_PAGE_CACHE is None or not documents:
+        return False
+
+    entry = WEB_PAGE_CACHE.get(get_web_search_collection_key(collection_name))
+    if (
+        entry is None
+        or entry.get("collection_name") != collection_name
+        or time.time() - entry["created_at"] > SEARCH_CACHE.ttl
+        or entry["hash"] != get_web_documents_hash(documents)
+    ):
+        return False
+
+    # Deleted since, e.g. by a vector DB reset
+    return has_vector_collection(collection_name)
+
+
 def store_data_in_vector_db(
-    data, collection_name, metadata: Optional[dict] = None, overwrite: bool = False
+    data,
+    collection_name,
+    metadata: Optional[dict] = None,
+    overwrite: bool = False,
+    on_progress=None,
 ) -> bool:
+    """Split, embed and store documents; data may be a lazy iterator (see
+    apps.rag.ingest.lazy_load) and is streamed through the ingestion pipeline."""
 
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=app.state.config.CHUNK_SIZE,
@@ -941,13 +1172,18 @@ def store_data_in_vector_db(
         add_start_index=True,
     )
 
-    docs = text_splitter.split_documents(data)
-
-    if len(docs) > 0:
-        log.info(f"store_data_in_vector_db {docs}")
-        return store_docs_in_vector_db(docs, collection_name, metadata, overwrite), None
-    else:
-        raise ValueError(ERROR_MESSAGES.EMPTY_CONTENT)
+    log.info(f"store_data_in_vector_db {collection_name}")
+    return (
+        store_docs_in_vector_db(
+            data,
+            collection_name,
+            metadata,
+            overwrite,
+            text_splitter=text_splitter,
+            on_progress=on_progress,
+        ),
+        None,
+    )
 
 
 def store_text_in_vector_db(
@@ -963,28 +1199,27 @@ def store_text_in_vector_db(
 
 
 def store_docs_in_vector_db(
-    docs, collection_name, metadata: Optional[dict] = None, overwrite: bool = False
+    docs,
+    collection_name,
+    metadata: Optional[dict] = None,
+    overwrite: bool = False,
+    text_splitter=None,
+    on_progress=None,
 ) -> bool:
-    log.info(f"store_docs_in_vector_db {docs} {collection_name}")
-
-    texts = [doc.page_content for doc in docs]
-    metadatas = [{**doc.metadata, **(metadata if metadata else {})} for doc in docs]
-
-    # ChromaDB does not like datetime formats
-    # for meta-data so convert them to string.
-    for metadata in metadatas:
-        for key, value in metadata.items():
-            if isinstance(value, datetime):
-                metadata[key] = str(value)
+    log.info(f"store_docs_in_vector_db {collection_name}")
 
     try:
         if overwrite:
-            for collection in CHROMA_CLIENT.list_collections():
+            for collection in VECTOR_DB_CLIENT.list_collections():
                 if collection_name == collection.name:
                     log.info(f"deleting existing collection {collection_name}")
-                    CHROMA_CLIENT.delete_collection(name=collection_name)
+                    # Re-fetched content mostly has the same chunks, keep their
+                    # vectors for the new collection
+                    delete_vector_collection(collection_name, gc=False)
 
-        collection = CHROMA_CLIENT.create_collection(name=collection_name)
+        # Raises CollectionExistsError before anything is loaded when the
+        # collection already exists
+        collection = VECTOR_DB_CLIENT.create_collection(name=collection_name)
 
         embedding_func = get_embedding_function(
             app.state.config.RAG_EMBEDDING_ENGINE,
@@ -994,233 +1229,154 @@ def store_docs_in_vector_db(
             app.state.config.OPENAI_API_BASE_URL,
             app.state.config.RAG_EMBEDDING_OPENAI_BATCH_SIZE,
         )
+        if CHUNK_STORE is not None:
+            # Chunks already embedded for any collection are not embedded again.
+            # The chunk store keeps the vectors, so the embedding cache is skipped.
+            embedding_func = CHUNK_STORE.get_embedding_function(
+                app.state.config.RAG_EMBEDDING_ENGINE,
+                app.state.config.RAG_EMBEDDING_MODEL,
+                embedding_func.func,
+                collection_name,
+            )
+        else:
+            # The in-memory embedding cache is kept for query embeddings
+            embedding_func = embedding_func.embed_documents
 
-        embedding_texts = list(map(lambda x: x.replace("\n", " "), texts))
-        embeddings = embedding_func(embedding_texts)
-
-        for batch in create_batches(
-            api=CHROMA_CLIENT,
-            ids=[str(uuid.uuid4()) for _ in texts],
-            metadatas=metadatas,
-            embeddings=embeddings,
-            documents=texts,
-        ):
-            collection.add(*batch)
+        def write_batch(ids, texts, metadatas, embeddings):
+            collection.add(
+                ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas
+            )
+            BM25_INDEXES.add(collection_name, ids, texts)
 
+        try:
+            ids = IngestPipeline(
+                embedding_func,
+                write_batch,
+                text_splitter=text_splitter,
+                metadata=metadata,
+                on_progress=on_progress,
+            ).run(docs)
+        except Exception:
+            ids = []
+            raise
+        finally:
+            if ids:
+                BM25_INDEXES.save(collection_name)
+                RETRIEVAL_CACHE.bump(collection_name)
+            else:
+                # Do not leave an empty or partially filled collection behind,
+                # a retry can still reuse the vectors embedded so far
+                delete_vector_collection(collection_name, gc=False)
+    except IngestLoadError as e:
+        # Loader errors (e.g. a missing pandoc) are reported to the caller
+        raise e.__cause__
+    except CollectionExistsError:
         return True
     except Exception as e:
-        if e.__class__.__name__ == "UniqueConstraintError":
-            return True
-
         log.exception(e)
 
         return False
 
+    if not ids:
+        raise ValueError(ERROR_MESSAGES.EMPTY_CONTENT)
+    return True
 
-class TikaLoader:
-    def __init__(self, file_path, mime_type=None):
-        self.file_path = file_path
-        self.mime_type = mime_type
-
-    def load(self) -> list[Document]:
-        with open(self.file_path, "rb") as f:
-            data = f.read()
-
-        if self.mime_type is not None:
-            headers = {"Content-Type": self.mime_type}
-        else:
-            headers = {}
-
-        endpoint = app.state.config.TIKA_SERVER_URL
-        if not endpoint.endswith("/"):
-            endpoint += "/"
-        endpoint += "tika/text"
-
-        r = requests.put(endpoint, data=data, headers=headers)
-
-        if r.ok:
-            raw_metadata = r.json()
-            text = raw_metadata.get("X-TIKA:content", "<No text content found>")
 
-            if "Content-Type" in raw_metadata:
-                headers["Content-Type"] = raw_metadata["Content-Type"]
+def has_vector_collection(collection_name: str) -> bool:
+    try:
+        VECTOR_DB_CLIENT.get_collection(name=collection_name)
+        return True
+    except Exception:
+        return False
 
-            log.info("Tika extracted text: %s", text)
 
-            return [Document(page_content=text, metadata=headers)]
-        else:
-            raise Exception(f"Error calling Tika: {r.reason}")
-
-
-def get_loader(filename: str, file_content_type: str, file_path: str):
-    file_ext = filename.split(".")[-1].lower()
-    known_type = True
-
-    known_source_ext = [
-        "go",
-        "py",
-        "java",
-        "sh",
-        "bat",
-        "ps1",
-        "cmd",
-        "js",
-        "ts",
-        "css",
-        "cpp",
-        "hpp",
-        "h",
-        "c",
-        "cs",
-        "sql",
-        "log",
-        "ini",
-        "pl",
-        "pm",
-        "r",
-        "dart",
-        "dockerfile",
-        "env",
-        "php",
-        "hs",
-        "hsc",
-        "lua",
-        "nginxconf",
-        "conf",
-        "m",
-        "mm",
-        "plsql",
-        "perl",
-        "rb",
-        "rs",
-        "db2",
-        "scala",
-        "bash",
-        "swift",
-        "vue",
-        "svelte",
-        "msg",
-        "ex",
-        "exs",
-        "erl",
-        "tsx",
-        "jsx",
-        "hs",
-        "lhs",
-    ]
+def delete_vector_collection(collection_name: str, gc: bool = True):
+    """Delete a Chroma collection and everything derived from it.
+
+    With gc=False the chunk store keeps the vectors nobody references any more
+    until another collection is deleted or /chunks/gc runs, for collections that
+    are about to be stored again."""
+    VECTOR_DB_CLIENT.delete_collection(name=collection_name)
+    BM25_INDEXES.delete(collection_name)
+    RETRIEVAL_CACHE.bump(collection_name)
+    if CHUNK_STORE is not None:
+        CHUNK_STORE.release(collection_name, gc=gc)
+    QAPairs.delete_pairs_by_collection_name(collection_name)
+    FAQ_INDEX.prune()
+
+
+def reset_vector_stores():
+    VECTOR_DB_CLIENT.reset()
+    BM25_INDEXES.reset()
+    RETRIEVAL_CACHE.bump_all()
+    if CHUNK_STORE is not None:
+        CHUNK_STORE.clear()
+    # Otherwise the next /scan would consider every file already indexed
+    ScanManifest.delete_all_entries()
+    QAPairs.delete_all_pairs()
+    FAQ_INDEX.clear()
+
+
+def get_loader(
+    filename: str,
+    file_content_type: str,
+    file_path: str,
+    file_hash: Optional[str] = None,
+):
+    return _get_loader(
+        filename,
+        file_content_type,
+        file_path,
+        file_hash=file_hash,
+        **get_loader_options(),
+    )
 
-    if (
-        app.state.config.CONTENT_EXTRACTION_ENGINE == "tika"
-        and app.state.config.TIKA_SERVER_URL
-    ):
-        if file_ext in known_source_ext or (
-            file_content_type and file_content_type.find("text/") >= 0
-        ):
-            loader = TextLoader(file_path, autodetect_encoding=True)
-        else:
-            loader = TikaLoader(file_path, file_content_type)
-    else:
-        if file_ext == "pdf":
-            loader = PyPDFLoader(
-                file_path, extract_images=app.state.config.PDF_EXTRACT_IMAGES
-            )
-        elif file_ext == "csv":
-            loader = CSVLoader(file_path)
-        elif file_ext == "rst":
-            loader = UnstructuredRSTLoader(file_path, mode="elements")
-        elif file_ext == "xml":
-            loader = UnstructuredXMLLoader(file_path)
-        elif file_ext in ["htm", "html"]:
-            loader = BSHTMLLoader(file_path, open_encoding="unicode_escape")
-        elif file_ext == "md":
-            loader = UnstructuredMarkdownLoader(file_path)
-        elif file_content_type == "application/epub+zip":
-            loader = UnstructuredEPubLoader(file_path)
-        elif (
-            file_content_type
-            == "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            or file_ext in ["doc", "docx"]
-        ):
-            loader = Docx2txtLoader(file_path)
-        elif file_content_type in [
-            "application/vnd.ms-excel",
-            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        ] or file_ext in ["xls", "xlsx"]:
-            loader = UnstructuredExcelLoader(file_path)
-        elif file_content_type in [
-            "application/vnd.ms-powerpoint",
-            "application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        ] or file_ext in ["ppt", "pptx"]:
-            loader = UnstructuredPowerPointLoader(file_path)
-        elif file_ext == "msg":
-            loader = OutlookMessageLoader(file_path)
-        elif file_ext in known_source_ext or (
-            file_content_type and file_content_type.find("text/") >= 0
-        ):
-            loader = TextLoader(file_path, autodetect_encoding=True)
-        else:
-            loader = TextLoader(file_path, autodetect_encoding=True)
-            known_type = False
 
-    return loader, known_type
+def get_loader_options() -> dict:
+    return {
+        "extraction_engine": app.state.config.CONTENT_EXTRACTION_ENGINE,
+        "tika_server_url": app.state.config.TIKA_SERVER_URL,
+        "pdf_extract_images": app.state.config.PDF_EXTRACT_IMAGES,
+    }
 
 
 class ProcessQAQuestionsForm(BaseModel):
     files: list[dict[str, Any]]
     collection_names: Optional[list[str]] = None
 
-class QA(BaseModel):
-    question: str
-    answer: str
-
-import re
-QA_PATTERN = re.compile(r'\nQ[:：](.*?)(?=\nQ[:：]|\nA[:：]|$)', re.DOTALL)
-ANSWER_PATTERN = re.compile(r'A[:：](.*?)(?=\nQ[:：]|\nA[:：]|$)', re.DOTALL)
-ZERO_WIDTH_PATTERN = re.compile(r'[\u200c\u200d]')
-WHITESPACE_PATTERN = re.compile(r'\s+', re.DOTALL)
-NUMBER_PATTERN = re.compile(r'^\d+[）)|\)]?\s*(?=\nQ[:：])', re.DOTALL | re.MULTILINE)
-SINGLE_LINE_PATTERN = re.compile(r'^(what|why|how)$', re.MULTILINE)
-GLOBAL_QA_MAP_CACHE: dict[str, dict[int, QA]] = {}
-GLOBAL_QA_MAP_FOR_QUERY: dict[int, str] = {}
-
 
-def parse_qa_file(file_id: str, qa_id: int, qa_map):
+def index_qa_file(collection_name: str, file_id: str):
+    """Parse a QA file into question / answer pairs of the collection."""
     file = Files.get_file_by_id(file_id)
     file_path = file.meta.get("path", f"{UPLOAD_DIR}/{file.filename}")
+    file_hash = file.hash
+    if file_hash is None:
+        with open(file_path, "rb") as f:
+            file_hash = calculate_sha256(f)
     loader, known_type = get_loader(
-        file.filename, file.meta.get("content_type"), file_path
+        file.filename, file.meta.get("content_type"), file_path, file_hash
     )
-    data = loader.load()
-    # log.debug(f"data here: {data}")
-
-    for doc in data:
-        page_content = doc.page_content
-        # 去掉零宽度字符
-        page_content = ZERO_WIDTH_PATTERN.sub('', page_content)
-        # 将连续的空白字符替换为一个 \n
-        page_content = WHITESPACE_PATTERN.sub('\n', page_content)
-        # 去掉问题前的序号
-        page_content = NUMBER_PATTERN.sub('', page_content)
-        # 去掉 what why how
-        page_content = SINGLE_LINE_PATTERN.sub('', page_content)
-
-        # log.debug(f"page_content after: {page_content}")
-
-        for match in QA_PATTERN.finditer(page_content):
-            question = match.group(1).strip()
-            answer_start = match.end()
-            answer_end = page_content.find('\nQ', answer_start)
-            if answer_end == -1:
-                answer_end = len(page_content)
-            answer = page_content[answer_start:answer_end].strip()
-            # 提取答案中的内容
-            answer_match = ANSWER_PATTERN.search(answer)
-            if answer_match:
-                answer = answer_match.group(1).strip()
-                # log.debug(f"strip answer: {answer}")
-            qa_map[qa_id] = QA(question=question, answer=answer)
-            GLOBAL_QA_MAP_FOR_QUERY[qa_id] = answer
-            qa_id += 1
+    data = list(load_documents(loader, file_path, file_hash, get_loader_options()))
+
+    pairs = parse_qa_documents(data)
+    log.debug(f"{len(pairs)} QA pairs in {file_id} for {collection_name}")
+    QAPairs.replace_pairs(collection_name, file_id, pairs)
+
+
+def index_qa_collection(collection_name: str):
+    """Find and parse the QA files of a collection that was not indexed when its
+    files were processed (e.g. created before the QA store existed)."""
+    collection = VECTOR_DB_CLIENT.get_collection(name=collection_name)
+    metadatas = collection.get(include=["metadatas"]).get("metadatas") or []
+
+    file_ids = {
+        metadata["file_id"]
+        for metadata in metadatas
+        if "file_id" in metadata and is_qa_file_name(metadata.get("name", ""))
+    }
+    for file_id in file_ids:
+        index_qa_file(collection_name, file_id)
+    QAPairs.set_collection_indexed(collection_name)
 
 
 @app.post("/process/qa_questions")
@@ -1228,60 +1384,25 @@ def get_qa_questions(
     form_data: ProcessQAQuestionsForm,
     user=Depends(get_verified_user),
 ):
-    collection_file_ids: dict[str, set[str]] = {}  # 用于存储每个 collection_name 对应的 file_id 集合
     all_collection_names = []
-    try:
-        for file in form_data.files:
-            collection_names_in_files = (
-                file["collection_names"]
-                if file["type"] == "collection"
-                else [file["collection_name"]]
-            )
-            all_collection_names.extend(collection_names_in_files)
-            for collection_name in collection_names_in_files:
-                if collection_name in GLOBAL_QA_MAP_CACHE or collection_name in collection_file_ids:
-                    continue
-                collection_file_ids[collection_name] = set()
-                collection = CHROMA_CLIENT.get_collection(name=collection_name)
-                documents = collection.get()
-                metadatas = documents.get("metadatas")
-
-                # 提取所有 file_id
-                for metadata in metadatas:
-                    name = metadata['name']
-                    if '常见问题' in name or 'QA' in name or 'Q&A' in name:
-                        # all_file_ids.add(metadata['file_id'])
-                        collection_file_ids[collection_name].add(metadata['file_id'])
+    for file in form_data.files:
+        all_collection_names.extend(
+            file["collection_names"]
+            if file["type"] == "collection"
+            else [file["collection_name"]]
+        )
+    all_collection_names = list(dict.fromkeys(all_collection_names))
 
-    except Exception as e:
-        raise e
-
-    # 获取所有文档原始内容并生成 qa_map
-    for collection_name, file_ids in collection_file_ids.items():
-        qa_map = {}
-        qa_id = 1  # 自动生成编号的起始值
-        for file_id in file_ids:
-            parse_qa_file(file_id, qa_id, qa_map)
-
-        log.debug(f"update qamap for {collection_name}: {qa_map}")
-        # 更新全局缓存
-        GLOBAL_QA_MAP_CACHE[collection_name] = qa_map
-
-    result_qamap = {}
-    if form_data.collection_names:
-        for collection_name in form_data.collection_names:
-            if collection_name in GLOBAL_QA_MAP_CACHE:
-                result_qamap.update(GLOBAL_QA_MAP_CACHE[collection_name])
-            else:
-                log.error(f"Collection name {collection_name} not found")
-    else:
-        for collection_name in all_collection_names:
-            if collection_name in GLOBAL_QA_MAP_CACHE:
-                log.debug(f"get questions for collection_name ok: {collection_name}, questions: {GLOBAL_QA_MAP_CACHE[collection_name]}")
-                result_qamap.update(GLOBAL_QA_MAP_CACHE[collection_name])
+    indexed = QAPairs.get_indexed_collection_names(all_collection_names)
+    for collection_name in all_collection_names:
+        if collection_name not in indexed:
+            index_qa_collection(collection_name)
 
-    if result_qamap:
-        result = "\n".join([f"{id}: {qa.question}" for id, qa in result_qamap.items()])
+    collection_names = form_data.collection_names or all_collection_names
+    pairs = QAPairs.get_pairs_by_collection_names(collection_names)
+
+    if pairs:
+        result = "\n".join([f"{pair.id}: {pair.question}" for pair in pairs])
         log.debug(f"return qa_questions: {result}")
         return {"qa_questions": result}
     else:
@@ -1290,22 +1411,47 @@ def get_qa_questions(
 
 @app.get("/process/qa_answer")
 def get_qa_answer(
-        questionIndex: int = Query(..., title="questionIndex", description="questionIndex"),
-        user=Depends(get_verified_user)
+    questionIndex: int = Query(..., title="questionIndex", description="questionIndex"),
+    user=Depends(get_verified_user),
 ):
-    log.debug(f"questionIndex: {questionIndex} , GLOBAL_QA_MAP_FOR_QUERY: {GLOBAL_QA_MAP_FOR_QUERY}")
-    answer = GLOBAL_QA_MAP_FOR_QUERY.get(questionIndex)
-    if answer is None:
-        answer = ''
+    log.debug(f"questionIndex: {questionIndex}")
+    pair = QAPairs.get_pair_by_id(questionIndex)
+    if pair is None:
+        answer = ""
         # 如果问题索引不存在，可以抛出一个HTTPException
         # raise HTTPException(status_code=404, detail="Question index not found")
+    else:
+        answer = pair.answer
 
     return {"answer": answer}
 
 
+def process_uploaded_file(
+    file_path: str,
+    filename: str,
+    content_type: Optional[str],
+    collection_name: str,
+    file_hash: Optional[str] = None,
+    on_progress=None,
+) -> dict:
+    loader, known_type = get_loader(filename, content_type, file_path, file_hash)
+    store_data_in_vector_db(
+        load_documents(loader, file_path, file_hash, get_loader_options()),
+        collection_name,
+        on_progress=on_progress,
+    )
+    return {
+        "status": True,
+        "collection_name": collection_name,
+        "filename": filename,
+        "known_type": known_type,
+    }
+
+
 @app.post("/doc")
 def store_doc(
     collection_name: Optional[str] = Form(None),
+    background: bool = Form(False),
     file: UploadFile = File(...),
     user=Depends(get_verified_user),
 ):
@@ -1318,29 +1464,29 @@ def store_doc(
 
         file_path = f"{UPLOAD_DIR}/{filename}"
 
-        contents = file.file.read()
-        with open(file_path, "wb") as f:
-            f.write(contents)
-            f.close()
-
-        f = open(file_path, "rb")
+        file_hash, _ = save_file_with_sha256(file.file, file_path)
         if collection_name is None:
-            collection_name = calculate_sha256(f)[:63]
-        f.close()
+            collection_name = file_hash[:63]
 
-        loader, known_type = get_loader(filename, file.content_type, file_path)
-        data = loader.load()
+        if background:
+            return submit_job(
+                user,
+                "doc",
+                {
+                    "file_path": file_path,
+                    "filename": filename,
+                    "content_type": file.content_type,
+                    "collection_name": collection_name,
+                    "file_hash": file_hash,
+                },
+                JOB_PRIORITY_INTERACTIVE,
+                key=f"doc:{file_hash}:{collection_name}",
+            )
 
         try:
-            result = store_data_in_vector_db(data, collection_name)
-
-            if result:
-                return {
-                    "status": True,
-                    "collection_name": collection_name,
-                    "filename": filename,
-                    "known_type": known_type,
-                }
+            return process_uploaded_file(
+                file_path, filename, file.content_type, collection_name, file_hash
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1363,6 +1509,44 @@ def store_doc(
 class ProcessDocForm(BaseModel):
     file_id: str
     collection_name: Optional[str] = None
+    background: bool = False
+
+
+def process_file(
+    file_id: str,
+    collection_name: str,
+    file_hash: Optional[str] = None,
+    on_progress=None,
+) -> dict:
+    file = Files.get_file_by_id(file_id)
+    file_path = file.meta.get("path", f"{UPLOAD_DIR}/{file.filename}")
+
+    loader, known_type = get_loader(
+        file.filename, file.meta.get("content_type"), file_path, file_hash
+    )
+    name = file.meta.get("name", file.filename)
+    is_new_collection = not has_vector_collection(collection_name)
+    store_data_in_vector_db(
+        load_documents(loader, file_path, file_hash, get_loader_options()),
+        collection_name,
+        {
+            "file_id": file_id,
+            "name": name,
+        },
+        on_progress=on_progress,
+    )
+
+    if is_qa_file_name(name):
+        index_qa_file(collection_name, file_id)
+    if is_new_collection:
+        # All of its files went through here, nothing left to find later
+        QAPairs.set_collection_indexed(collection_name)
+    return {
+        "status": True,
+        "collection_name": collection_name,
+        "known_type": known_type,
+        "filename": file.meta.get("name", file.filename),
+    }
 
 
 @app.post("/process/doc")
@@ -1374,35 +1558,31 @@ def process_doc(
         file = Files.get_file_by_id(form_data.file_id)
         file_path = file.meta.get("path", f"{UPLOAD_DIR}/{file.filename}")
 
-        f = open(file_path, "rb")
+        # Uploads are hashed while they are stored
+        file_hash = file.hash
+        if file_hash is None:
+            with open(file_path, "rb") as f:
+                file_hash = calculate_sha256(f)
 
         collection_name = form_data.collection_name
         if collection_name is None:
-            collection_name = calculate_sha256(f)[:63]
-        f.close()
+            collection_name = file_hash[:63]
 
-        loader, known_type = get_loader(
-            file.filename, file.meta.get("content_type"), file_path
-        )
-        data = loader.load()
-
-        try:
-            result = store_data_in_vector_db(
-                data,
-                collection_name,
+        if form_data.background:
+            return submit_job(
+                user,
+                "process_doc",
                 {
                     "file_id": form_data.file_id,
-                    "name": file.meta.get("name", file.filename),
+                    "collection_name": collection_name,
+                    "file_hash": file_hash,
                 },
+                JOB_PRIORITY_INTERACTIVE,
+                key=f"process_doc:{form_data.file_id}:{file_hash}:{collection_name}",
             )
 
-            if result:
-                return {
-                    "status": True,
-                    "collection_name": collection_name,
-                    "known_type": known_type,
-                    "filename": file.meta.get("name", file.filename),
-                }
+        try:
+            return process_file(form_data.file_id, collection_name, file_hash)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1453,70 +1633,320 @@ def store_text(
         )
 
 
-@app.get("/scan")
-def scan_docs_dir(user=Depends(get_admin_user)):
-    for path in Path(DOCS_DIR).rglob("./**/*"):
-        try:
-            if path.is_file() and not path.name.startswith("."):
-                tags = extract_folders_after_data_docs(path)
-                filename = path.name
-                file_content_type = mimetypes.guess_type(path)
+def scan_docs(user_id: str, dry_run: bool = False, on_progress=None) -> dict:
+    """Incrementally index DOCS_DIR against the scan manifest.
 
-                f = open(path, "rb")
-                collection_name = calculate_sha256(f)[:63]
-                f.close()
+    Files whose size and mtime match the manifest are skipped without being read.
+    New and changed files are hashed and, when their content is not indexed yet,
+    extracted in worker processes; embedding and storing stay in this process.
+    Files that disappeared lose their manifest entry, and their collection and
+    document are removed once no other scanned file has the same content. Scanned
+    files are indexed into "scan-" collections, so uploads are never removed.
 
-                loader, known_type = get_loader(
-                    filename, file_content_type[0], str(path)
-                )
-                data = loader.load()
+    Collections of scans from before the manifest (named after the file hash like
+    uploads) are adopted when the document of the file still points at them, and
+    only removed when no upload or other document uses them.
+    """
+    manifest = ScanManifest.get_entries()
+    files = list_files(DOCS_DIR)
+    plan = plan_scan(files, manifest)
+    log.info(
+        f"scan of {len(files)} files: {len(plan.added)} added, "
+        f"{len(plan.changed)} changed, {len(plan.deleted)} deleted"
+    )
+
+    if dry_run:
+        return {"status": True, "dry_run": True, **plan.to_dict()}
+
+    candidates = {**plan.added, **plan.changed}
+    progress = {
+        "files": len(candidates),
+        "hashed": 0,
+        "indexed": 0,
+        "skipped": 0,
+        "deleted": 0,
+        "failed": 0,
+    }
+    references = Counter(entry.collection_name for entry in manifest.values())
+    collection_names = {
+        collection.name for collection in VECTOR_DB_CLIENT.list_collections()
+    }
+    scanned_doc_names = {get_scanned_doc_name(path) for path in [*files, *manifest]}
+
+    def is_legacy_collection(collection_name: str) -> bool:
+        """Whether a collection that is not a "scan-" one was only used by scans."""
+        if collection_name.startswith(SCAN_COLLECTION_PREFIX):
+            return False
+        if Files.get_file_count_by_hash_prefix(collection_name) > 0:
+            return False
+        return all(
+            doc.name in scanned_doc_names
+            for doc in Documents.get_docs_by_collection_name(collection_name)
+        )
+
+    def release(collection_name: str):
+        references[collection_name] -= 1
+        if references[collection_name] > 0:
+            return
+        if not (
+            collection_name.startswith(SCAN_COLLECTION_PREFIX)
+            or is_legacy_collection(collection_name)
+        ):
+            log.info(f"keeping collection {collection_name}, uploads still use it")
+            return
+
+        log.info(f"removing collection {collection_name} of deleted/changed files")
+        try:
+            delete_vector_collection(collection_name)
+        except Exception as e:
+            log.warning(f"cannot delete collection {collection_name}: {e}")
+        Documents.delete_doc_by_collection_name(collection_name)
+        collection_names.discard(collection_name)
+
+    def record(path: str, sha256: str, collection_name: Optional[str] = None):
+        collection_name = collection_name or get_scan_collection_name(sha256)
+        size, mtime_ns = candidates[path]
+        previous = manifest.get(path)
+        if previous is not None:
+            previous_collection_name = previous.collection_name
+        else:
+            # A document left by a scan from before the manifest
+            doc = Documents.get_doc_by_name(get_scanned_doc_name(path))
+            previous_collection_name = (
+                doc.collection_name
+                if doc is not None and is_legacy_collection(doc.collection_name)
+                else None
+            )
 
+        ScanManifest.upsert_entry(path, size, mtime_ns, sha256, collection_name)
+        references[collection_name] += 1
+        add_scanned_doc(path, collection_name, user_id, previous_collection_name)
+
+        if (
+            previous_collection_name is not None
+            and previous_collection_name != collection_name
+        ):
+            release(previous_collection_name)
+
+    def get_legacy_collection_name(path: str, sha256: str) -> Optional[str]:
+        """The collection of a scan from before the manifest with this content."""
+        if path in manifest or sha256[:63] not in collection_names:
+            return None
+        doc = Documents.get_doc_by_name(get_scanned_doc_name(path))
+        if doc is None or doc.collection_name != sha256[:63]:
+            return None
+        return doc.collection_name
+
+    to_extract = {}
+    executor = get_scan_executor()
+    try:
+        for path, sha256, error in map_files(executor, hash_file, list(candidates)):
+            if error is not None:
+                log.error(f"cannot hash {path}: {error}")
+                progress["failed"] += 1
+                continue
+
+            progress["hashed"] += 1
+            if get_scan_collection_name(sha256) in collection_names:
+                # Only touched, or the same content is already indexed
+                record(path, sha256)
+                progress["skipped"] += 1
+            elif legacy_collection_name := get_legacy_collection_name(path, sha256):
+                # Indexed by a scan from before the manifest, not embedded again
+                record(path, sha256, legacy_collection_name)
+                progress["skipped"] += 1
+            else:
+                to_extract[path] = sha256
+
+        for path, result, error in map_files(
+            executor,
+            extract_file,
+            list(to_extract),
+            get_loader_options(),
+            file_hashes=to_extract,
+        ):
+            if error is None:
                 try:
-                    result = store_data_in_vector_db(data, collection_name)
-
-                    if result:
-                        sanitized_filename = sanitize_filename(filename)
-                        doc = Documents.get_doc_by_name(sanitized_filename)
-
-                        if doc is None:
-                            doc = Documents.insert_new_doc(
-                                user.id,
-                                DocumentForm(
-                                    **{
-                                        "name": sanitized_filename,
-                                        "title": filename,
-                                        "collection_name": collection_name,
-                                        "filename": filename,
-                                        "content": (
-                                            json.dumps(
-                                                {
-                                                    "tags": list(
-                                                        map(
-                                                            lambda name: {"name": name},
-                                                            tags,
-                                                        )
-                                                    )
-                                                }
-                                            )
-                                            if len(tags)
-                                            else "{}"
-                                        ),
-                                    }
-                                ),
-                            )
+                    data, _ = result
+                    stored, _ = store_data_in_vector_db(
+                        data, get_scan_collection_name(to_extract[path])
+                    )
+                    if not stored:
+                        error = Exception("failed to store documents")
                 except Exception as e:
-                    log.exception(e)
-                    pass
+                    error = e
 
-        except Exception as e:
-            log.exception(e)
+            if error is not None:
+                log.error(f"cannot index {path}: {error}")
+                progress["failed"] += 1
+            else:
+                collection_names.add(get_scan_collection_name(to_extract[path]))
+                record(path, to_extract[path])
+                progress["indexed"] += 1
 
-    return True
+            if on_progress is not None:
+                on_progress(dict(progress))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for path in plan.deleted:
+        ScanManifest.delete_entry(path)
+        release(manifest[path].collection_name)
+        progress["deleted"] += 1
+
+    log.info(f"scan finished: {progress}")
+    return {"status": True, "dry_run": False, **plan.to_dict(), **progress}
+
+
+def get_scanned_doc_name(path: str) -> str:
+    return sanitize_filename(Path(path).name)
+
+
+def add_scanned_doc(
+    path: str,
+    collection_name: str,
+    user_id: str,
+    previous_collection_name: Optional[str] = None,
+):
+    path = Path(path)
+    tags = extract_folders_after_data_docs(path)
+    filename = path.name
+    sanitized_filename = sanitize_filename(filename)
+    doc = Documents.get_doc_by_name(sanitized_filename)
+
+    if doc is None:
+        Documents.insert_new_doc(
+            user_id,
+            DocumentForm(
+                **{
+                    "name": sanitized_filename,
+                    "title": filename,
+                    "collection_name": collection_name,
+                    "filename": filename,
+                    "content": (
+                        json.dumps(
+                            {
+                                "tags": list(
+                                    map(
+                                        lambda name: {"name": name},
+                                        tags,
+                                    )
+                                )
+                            }
+                        )
+                        if len(tags)
+                        else "{}"
+                    ),
+                }
+            ),
+        )
+    elif (
+        previous_collection_name is not None
+        and doc.collection_name == previous_collection_name
+    ):
+        # The file changed, point its document at the new collection
+        Documents.update_doc_collection_name_by_name(
+            sanitized_filename, collection_name
+        )
+
+
+@app.get("/scan")
+def scan_docs_dir(
+    background: bool = False, dry_run: bool = False, user=Depends(get_admin_user)
+):
+    if background and not dry_run:
+        return submit_job(user, "scan", {"user_id": user.id}, JOB_PRIORITY_BULK)
+
+    return scan_docs(user.id, dry_run=dry_run)
+
+
+def submit_job(user, type: str, payload: dict, priority: int, key=None) -> dict:
+    job = JOB_QUEUE.submit(user.id, type, payload, priority, key=key)
+    if job is None:
+        raise Exception("Failed to create job")
+
+    return {
+        "status": True,
+        "collection_name": payload.get("collection_name"),
+        "job": job,
+    }
+
+
+JOB_QUEUE.register(
+    "process_doc",
+    lambda payload, on_progress: process_file(**payload, on_progress=on_progress),
+)
+JOB_QUEUE.register(
+    "doc",
+    lambda payload, on_progress: process_uploaded_file(
+        **payload, on_progress=on_progress
+    ),
+)
+JOB_QUEUE.register(
+    "web",
+    lambda payload, on_progress: process_web_page(**payload, on_progress=on_progress),
+)
+JOB_QUEUE.register(
+    "youtube",
+    lambda payload, on_progress: process_youtube_video(
+        **payload, on_progress=on_progress
+    ),
+)
+JOB_QUEUE.register(
+    "scan",
+    lambda payload, on_progress: scan_docs(payload["user_id"], on_progress=on_progress),
+)
+JOB_QUEUE.register(
+    "memory_reindex",
+    lambda payload, on_progress: reindex_all_memories(
+        app.state.EMBEDDING_FUNCTION,
+        payload.get("user_ids"),
+        on_progress=on_progress,
+    ),
+)
+
+
+def get_job_or_raise(id: str, user) -> JobModel:
+    job = Jobs.get_job_by_id(id)
+    if job is None or (job.user_id != user.id and user.role != "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=ERROR_MESSAGES.NOT_FOUND,
+        )
+    return job
+
+
+@app.get("/jobs", response_model=list[JobModel])
+async def get_jobs(skip: int = 0, limit: int = 50, user=Depends(get_verified_user)):
+    return Jobs.get_jobs_by_user_id(user.id, skip, limit)
+
+
+@app.get("/jobs/stats")
+async def get_job_queue_stats(user=Depends(get_admin_user)):
+    return {"status": True, **JOB_QUEUE.get_stats()}
+
+
+@app.get("/jobs/{id}", response_model=JobModel)
+async def get_job_by_id(id: str, user=Depends(get_verified_user)):
+    return get_job_or_raise(id, user)
+
+
+@app.get("/jobs/{id}/progress")
+async def get_job_progress_by_id(id: str, user=Depends(get_verified_user)):
+    job = get_job_or_raise(id, user)
+    return {"id": job.id, "status": job.status, "progress": job.progress}
+
+
+@app.post("/jobs/{id}/cancel", response_model=JobModel)
+async def cancel_job_by_id(id: str, user=Depends(get_verified_user)):
+    get_job_or_raise(id, user)
+    return JOB_QUEUE.cancel(id)
 
 
 @app.get("/reset/db")
 def reset_vector_db(user=Depends(get_admin_user)):
-    CHROMA_CLIENT.reset()
+    reset_vector_stores()
 
 
 @app.get("/reset/uploads")
@@ -1557,40 +1987,13 @@ def reset(user=Depends(get_admin_user)) -> bool:
             log.error("Failed to delete %s. Reason: %s" % (file_path, e))
 
     try:
-        CHROMA_CLIENT.reset()
+        reset_vector_stores()
     except Exception as e:
         log.exception(e)
 
     return True
 
 
-class SafeWebBaseLoader(WebBaseLoader):
-    """WebBaseLoader with enhanced error handling for URLs."""
-
-    def lazy_load(self) -> Iterator[Document]:
-        """Lazy load text from the url(s) in web_path with error handling."""
-        for path in self.web_paths:
-            try:
-                soup = self._scrape(path, bs_kwargs=self.bs_kwargs)
-                text = soup.get_text(**self.bs_get_text_kwargs)
-
-                # Build metadata
-                metadata = {"source": path}
-                if title := soup.find("title"):
-                    metadata["title"] = title.get_text()
-                if description := soup.find("meta", attrs={"name": "description"}):
-                    metadata["description"] = description.get(
-                        "content", "No description found."
-                    )
-                if html := soup.find("html"):
-                    metadata["language"] = html.get("lang", "No language found.")
-
-                yield Document(page_content=text, metadata=metadata)
-            except Exception as e:
-                # Log the error and continue with the next URL
-                log.error(f"Error loading {path}: {e}")
-
-
 if ENV == "dev":
 
     @app.get("/ef")
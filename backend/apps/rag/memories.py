@@ -0,0 +1,108 @@
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from apps.webui.models.memories import Memories, MemoryModel
+from apps.rag.retrieval_cache import RETRIEVAL_CACHE
+from apps.rag.vector.connector import VECTOR_DB_CLIENT
+from config import (
+    SRC_LOG_LEVELS,
+    RAG_MEMORY_BATCH_SIZE,
+    RAG_MEMORY_REINDEX_CONCURRENCY,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+def get_memory_collection_name(user_id: str) -> str:
+    return f"user-memory-{user_id}"
+
+
+def index_memories(
+    user_id: str,
+    memories: list[MemoryModel],
+    embedding_function,
+    batch_size: int = RAG_MEMORY_BATCH_SIZE,
+) -> int:
+    """Embed and upsert memories of a user into their collection, batch_size
+    memories per embedding call and upsert. Blocking, run it off the event loop."""
+    collection_name = get_memory_collection_name(user_id)
+    collection = VECTOR_DB_CLIENT.get_or_create_collection(name=collection_name)
+
+    batch_size = max(batch_size, 1)
+    for start in range(0, len(memories), batch_size):
+        batch = memories[start : start + batch_size]
+        documents = [memory.content for memory in batch]
+        collection.upsert(
+            ids=[memory.id for memory in batch],
+            embeddings=embedding_function(documents),
+            documents=documents,
+            metadatas=[
+                {"created_at": memory.created_at, "updated_at": memory.updated_at}
+                for memory in batch
+            ],
+        )
+
+    RETRIEVAL_CACHE.bump(collection_name)
+    return len(memories)
+
+
+def reset_memories(user_id: str, embedding_function) -> int:
+    """Rebuild the memory collection of a user from the memory table."""
+    collection_name = get_memory_collection_name(user_id)
+    try:
+        VECTOR_DB_CLIENT.delete_collection(collection_name)
+    except Exception as e:
+        # The user had no memory collection yet
+        log.debug(f"no memory collection to delete for {user_id}: {e}")
+    RETRIEVAL_CACHE.bump(collection_name)
+
+    memories = Memories.get_memories_by_user_id(user_id) or []
+    return index_memories(user_id, memories, embedding_function)
+
+
+def reindex_all_memories(
+    embedding_function,
+    user_ids: Optional[list[str]] = None,
+    concurrency: int = RAG_MEMORY_REINDEX_CONCURRENCY,
+    on_progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """Rebuild the memory collections of the given users (default: every user
+    with memories), concurrency users at a time. A failing user is logged and
+    counted, the others are still re-indexed."""
+    if user_ids is None:
+        user_ids = Memories.get_memory_user_ids()
+
+    lock = threading.Lock()
+    progress = {"users": len(user_ids), "done": 0, "failed": 0, "memories": 0}
+
+    def reindex(user_id: str):
+        try:
+            count = reset_memories(user_id, embedding_function)
+        except Exception as e:
+            log.exception(f"re-indexing the memories of {user_id} failed: {e}")
+            count = None
+
+        with lock:
+            progress["done"] += 1
+            if count is None:
+                progress["failed"] += 1
+            else:
+                progress["memories"] += count
+            snapshot = dict(progress)
+        if on_progress is not None:
+            on_progress(snapshot)
+
+    with ThreadPoolExecutor(
+        max(concurrency, 1), thread_name_prefix="rag-memory-reindex"
+    ) as executor:
+        list(executor.map(reindex, user_ids))
+
+    log.info(
+        f"re-indexed {progress['memories']} memories of {progress['done']} users, "
+        f"{progress['failed']} failed"
+    )
+    return progress
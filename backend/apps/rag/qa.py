@@ -0,0 +1,43 @@
+import re
+
+from langchain_core.documents import Document
+
+QA_PATTERN = re.compile(r"\nQ[:：](.*?)(?=\nQ[:：]|\nA[:：]|$)", re.DOTALL)
+ANSWER_PATTERN = re.compile(r"A[:：](.*?)(?=\nQ[:：]|\nA[:：]|$)", re.DOTALL)
+ZERO_WIDTH_PATTERN = re.compile(r"[\u200c\u200d]")
+WHITESPACE_PATTERN = re.compile(r"\s+", re.DOTALL)
+NUMBER_PATTERN = re.compile(r"^\d+[）)|\)]?\s*(?=\nQ[:：])", re.DOTALL | re.MULTILINE)
+SINGLE_LINE_PATTERN = re.compile(r"^(what|why|how)$", re.MULTILINE)
+
+
+def is_qa_file_name(name: str) -> bool:
+    return "常见问题" in name or "QA" in name or "Q&A" in name
+
+
+def parse_qa_documents(documents: list[Document]) -> list[tuple[str, str]]:
+    """Extract the (question, answer) pairs of "Q: ... A: ..." formatted documents."""
+    pairs = []
+    for doc in documents:
+        page_content = doc.page_content
+        # 去掉零宽度字符
+        page_content = ZERO_WIDTH_PATTERN.sub("", page_content)
+        # 将连续的空白字符替换为一个 \n
+        page_content = WHITESPACE_PATTERN.sub("\n", page_content)
+        # 去掉问题前的序号
+        page_content = NUMBER_PATTERN.sub("", page_content)
+        # 去掉 what why how
+        page_content = SINGLE_LINE_PATTERN.sub("", page_content)
+
+        for match in QA_PATTERN.finditer(page_content):
+            question = match.group(1).strip()
+            answer_start = match.end()
+            answer_end = page_content.find("\nQ", answer_start)
+            if answer_end == -1:
+                answer_end = len(page_content)
+            answer = page_content[answer_start:answer_end].strip()
+            # 提取答案中的内容
+            answer_match = ANSWER_PATTERN.search(answer)
+            if answer_match:
+                answer = answer_match.group(1).strip()
+            pairs.append((question, answer))
+    return pairs
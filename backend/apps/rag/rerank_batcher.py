@@ -0,0 +1,136 @@
+import time
+import queue
+import logging
+import threading
+import numpy as np
+
+from concurrent.futures import Future
+
+from config import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+class RerankBatcher:
+    """Drop-in replacement for a CrossEncoder's predict() that merges the
+    (query, passage) pairs of concurrent requests into a single batched call.
+
+    A request waits at most max_wait_ms for other requests to join its batch, and a
+    batch is dispatched as soon as it holds max_batch_size pairs. A request that is
+    not scored within timeout seconds raises TimeoutError. Once closed (e.g. the
+    reranking model was replaced), new requests are rejected with RuntimeError and
+    queued requests that were not dispatched yet fail the same way.
+    """
+
+    def __init__(
+        self,
+        model,
+        model_name: str,
+        max_wait_ms: float,
+        max_batch_size: int,
+        timeout: float = 120,
+    ):
+        self.model = model
+        self.model_name = model_name
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+
+        self.closed = False
+        self.lock = threading.Lock()
+        self.queue: queue.Queue = queue.Queue()
+        self.thread = threading.Thread(
+            target=self._run, name="rag-rerank-batcher", daemon=True
+        )
+        self.thread.start()
+
+    def predict(self, pairs) -> np.ndarray:
+        pairs = list(pairs)
+        if not pairs:
+            return np.array([], dtype=np.float32)
+
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError(f"reranker {self.model_name} was closed")
+            self.queue.put((pairs, future))
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Not scored yet: drop it from its batch if it was not dispatched
+            future.cancel()
+            raise
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.put(None)
+
+    def _collect(self, item) -> list:
+        batch = [item]
+        size = len(item[0])
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    next_item = self.queue.get(timeout=remaining)
+                else:
+                    next_item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if next_item is None:
+                # Put the stop marker back so the loop exits after this batch
+                self.queue.put(None)
+                break
+
+            batch.append(next_item)
+            size += len(next_item[0])
+
+        return batch
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            # Requests that timed out before their batch was dispatched are skipped
+            batch = [
+                (request_pairs, future)
+                for request_pairs, future in self._collect(item)
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+
+            if self.closed:
+                error = RuntimeError(f"reranker {self.model_name} was closed")
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+
+            pairs = [pair for request_pairs, _ in batch for pair in request_pairs]
+
+            try:
+                scores = np.asarray(
+                    self.model.predict(pairs, batch_size=self.max_batch_size)
+                )
+            except Exception as e:
+                log.exception(e)
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            log.debug(f"reranked {len(pairs)} pairs from {len(batch)} requests")
+
+            offset = 0
+            for request_pairs, future in batch:
+                future.set_result(scores[offset : offset + len(request_pairs)])
+                offset += len(request_pairs)
@@ -0,0 +1,156 @@
+import copy
+import json
+import time
+import logging
+import threading
+
+from collections import OrderedDict
+from typing import Optional
+
+from apps.rag.embedding_cache import normalize_text
+from config import SRC_LOG_LEVELS, RAG_RETRIEVAL_CACHE_SIZE, RAG_RETRIEVAL_CACHE_TTL
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+class RetrievalCache:
+    """Bounded TTL cache of retrieval results.
+
+    Every collection has a monotonically increasing version that is bumped whenever
+    this process changes its content. Entries remember the versions of their
+    collections at the time the query started and are discarded as soon as any of
+    them moved on, so writes made through this process are never served stale.
+    Versions are not shared between workers: a result can be up to ttl seconds
+    behind writes made by another worker.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.versions: dict[str, int] = {}
+        self.epoch = 0
+        self.entries: OrderedDict[tuple, tuple[float, tuple, dict]] = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def bump(self, collection_name: str):
+        with self.lock:
+            self.versions[collection_name] = self.versions.get(collection_name, 0) + 1
+
+    def bump_all(self):
+        with self.lock:
+            self.epoch += 1
+            self.entries.clear()
+
+    def get_versions(self, collection_names) -> tuple:
+        with self.lock:
+            return (
+                self.epoch,
+                tuple(self.versions.get(name, 0) for name in sorted(collection_names)),
+            )
+
+    def get_key(
+        self,
+        collection_names,
+        query: str,
+        k: int,
+        r: Optional[float],
+        hybrid: bool,
+        embedding_function,
+        reranking_function=None,
+        where: Optional[dict] = None,
+    ) -> tuple:
+        return (
+            tuple(sorted(collection_names)),
+            normalize_text(query or ""),
+            k,
+            r,
+            hybrid,
+            getattr(embedding_function, "engine", None),
+            getattr(embedding_function, "model", None),
+            getattr(reranking_function, "model_name", None),
+            json.dumps(where, sort_keys=True) if where else None,
+        )
+
+    def _is_fresh(self, key: tuple, entry: tuple) -> bool:
+        expires_at, versions, _ = entry
+        current = (
+            self.epoch,
+            tuple(self.versions.get(name, 0) for name in key[0]),
+        )
+        return expires_at >= time.monotonic() and versions == current
+
+    def contains(self, key: tuple) -> bool:
+        """Whether get(key) would hit right now, without counting a lookup."""
+        if not self.enabled:
+            return False
+
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and self._is_fresh(key, entry)
+
+    def get(self, key: tuple) -> Optional[dict]:
+        if not self.enabled:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            _, _, result = entry
+            if not self._is_fresh(key, entry):
+                del self.entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(result)
+
+    def set(self, key: tuple, versions: tuple, result: dict):
+        if not self.enabled:
+            return
+
+        with self.lock:
+            # The collections changed while the query was running
+            if versions[0] != self.epoch:
+                return
+
+            self.entries[key] = (
+                time.monotonic() + self.ttl,
+                versions,
+                copy.deepcopy(result),
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+RETRIEVAL_CACHE = RetrievalCache(RAG_RETRIEVAL_CACHE_SIZE, RAG_RETRIEVAL_CACHE_TTL)
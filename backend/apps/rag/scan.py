@@ -0,0 +1,139 @@
+import os
+import logging
+import hashlib
+import mimetypes
+import multiprocessing
+
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional
+
+from apps.rag.extraction_cache import load_documents
+from apps.rag.loaders import get_loader
+from config import SRC_LOG_LEVELS, RAG_SCAN_WORKERS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+# Scanned files get collections of their own, so that removing a scanned file never
+# deletes the collection of an upload with the same content
+SCAN_COLLECTION_PREFIX = "scan-"
+
+
+@dataclass
+class ScanPlan:
+    """Difference between the files under the docs directory and the manifest.
+
+    added / changed map paths to their (size, mtime_ns); deleted lists the paths
+    that are only left in the manifest.
+    """
+
+    added: dict[str, tuple[int, int]] = field(default_factory=dict)
+    changed: dict[str, tuple[int, int]] = field(default_factory=dict)
+    deleted: list[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "added": sorted(self.added),
+            "changed": sorted(self.changed),
+            "deleted": sorted(self.deleted),
+            "unchanged": self.unchanged,
+        }
+
+
+def list_files(directory: str) -> dict[str, tuple[int, int]]:
+    """Every non hidden file below directory with its (size, mtime_ns), from stat()
+    only."""
+    files = {}
+    for path in Path(directory).rglob("./**/*"):
+        try:
+            if path.is_file() and not path.name.startswith("."):
+                stat = path.stat()
+                files[str(path)] = (stat.st_size, stat.st_mtime_ns)
+        except OSError as e:
+            log.warning(f"cannot stat {path}: {e}")
+    return files
+
+
+def plan_scan(files: dict[str, tuple[int, int]], manifest: dict) -> ScanPlan:
+    plan = ScanPlan()
+    for path, (size, mtime_ns) in files.items():
+        entry = manifest.get(path)
+        if entry is None:
+            plan.added[path] = (size, mtime_ns)
+        elif entry.size != size or entry.mtime_ns != mtime_ns:
+            plan.changed[path] = (size, mtime_ns)
+        else:
+            plan.unchanged += 1
+
+    plan.deleted = [path for path in manifest if path not in files]
+    return plan
+
+
+def get_scan_collection_name(sha256: str) -> str:
+    return f"{SCAN_COLLECTION_PREFIX}{sha256}"[:63]
+
+
+def hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def extract_file(
+    path: str, loader_options: dict, file_hash: Optional[str] = None
+) -> tuple[list, bool]:
+    """Load a file into documents, through the extraction cache when its hash is
+    given; runs in a worker process."""
+    content_type, _ = mimetypes.guess_type(path)
+    loader, known_type = get_loader(
+        os.path.basename(path),
+        content_type,
+        path,
+        file_hash=file_hash,
+        **loader_options,
+    )
+    return list(load_documents(loader, path, file_hash, loader_options)), known_type
+
+
+def get_scan_executor(workers: int = RAG_SCAN_WORKERS) -> Optional[Executor]:
+    if workers <= 0:
+        return None
+    # Forking a process that runs the server threads can deadlock the children
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def map_files(
+    executor: Optional[Executor],
+    fn,
+    paths: list[str],
+    *args,
+    file_hashes: Optional[dict] = None,
+) -> Iterator[tuple[str, object, Optional[Exception]]]:
+    """Yield (path, result, error) for fn(path, *args) as results become available,
+    in worker processes when an executor is given. With file_hashes, the hash of
+    each path is passed as an extra last argument."""
+
+    def get_args(path: str) -> tuple:
+        return (path, *args, file_hashes[path]) if file_hashes else (path, *args)
+
+    if executor is None:
+        for path in paths:
+            try:
+                yield path, fn(*get_args(path)), None
+            except Exception as e:
+                yield path, None, e
+        return
+
+    futures = {executor.submit(fn, *get_args(path)): path for path in paths}
+    for future in as_completed(futures):
+        try:
+            yield futures[future], future.result(), None
+        except Exception as e:
+            yield futures[future], None, e
@@ -3,7 +3,7 @@ from typing import Optional
 import requests
 
 from apps.rag.search.main import SearchResult, get_filtered_results
-from config import SRC_LOG_LEVELS
+from config import SRC_LOG_LEVELS, RAG_WEB_SEARCH_TIMEOUT
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
@@ -26,7 +26,9 @@ def search_brave(
     }
     params = {"q": query, "count": count}
 
-    response = requests.get(url, headers=headers, params=params)
+    response = requests.get(
+        url, headers=headers, params=params, timeout=RAG_WEB_SEARCH_TIMEOUT
+    )
     response.raise_for_status()
 
     json_response = response.json()
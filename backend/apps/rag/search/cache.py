@@ -0,0 +1,81 @@
+import time
+import logging
+import threading
+
+from collections import OrderedDict
+from typing import Optional
+
+from apps.rag.search.main import SearchResult
+from config import SRC_LOG_LEVELS, RAG_WEB_SEARCH_CACHE_SIZE, RAG_WEB_SEARCH_CACHE_TTL
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+class SearchCache:
+    """Bounded TTL cache of search engine results, keyed by (engine, query, result
+    count, domain filter)."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict[tuple, tuple[float, list[SearchResult]]] = (
+            OrderedDict()
+        )
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get_key(
+        self,
+        engine: str,
+        query: str,
+        count: int,
+        domain_filter_list: Optional[list[str]] = None,
+    ) -> tuple:
+        return (
+            engine,
+            " ".join(query.split()).lower(),
+            count,
+            tuple(sorted(domain_filter_list or [])),
+        )
+
+    def get(self, key: tuple) -> Optional[list[SearchResult]]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def set(self, key: tuple, results: list[SearchResult]):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), list(results))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+SEARCH_CACHE = SearchCache(RAG_WEB_SEARCH_CACHE_SIZE, RAG_WEB_SEARCH_CACHE_TTL)
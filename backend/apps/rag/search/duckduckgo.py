@@ -2,7 +2,7 @@ import logging
 from typing import Optional
 from apps.rag.search.main import SearchResult, get_filtered_results
 from duckduckgo_search import DDGS
-from config import SRC_LOG_LEVELS
+from config import SRC_LOG_LEVELS, RAG_WEB_SEARCH_TIMEOUT
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
@@ -21,7 +21,7 @@ def search_duckduckgo(
         list[SearchResult]: A list of search results
     """
     # Use the DDGS context manager to create a DDGS object
-    with DDGS() as ddgs:
+    with DDGS(timeout=RAG_WEB_SEARCH_TIMEOUT) as ddgs:
         # Use the ddgs.text() method to perform the search
         ddgs_gen = ddgs.text(
             query, safesearch="moderate", max_results=count, backend="api"
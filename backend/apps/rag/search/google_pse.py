@@ -4,7 +4,7 @@ from typing import Optional
 import requests
 
 from apps.rag.search.main import SearchResult, get_filtered_results
-from config import SRC_LOG_LEVELS
+from config import SRC_LOG_LEVELS, RAG_WEB_SEARCH_TIMEOUT
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
@@ -34,7 +34,9 @@ def search_google_pse(
         "num": count,
     }
 
-    response = requests.request("GET", url, headers=headers, params=params)
+    response = requests.request(
+        "GET", url, headers=headers, params=params, timeout=RAG_WEB_SEARCH_TIMEOUT
+    )
     response.raise_for_status()
 
     json_response = response.json()
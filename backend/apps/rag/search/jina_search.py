@@ -3,7 +3,7 @@ import requests
 from yarl import URL
 
 from apps.rag.search.main import SearchResult
-from config import SRC_LOG_LEVELS
+from config import SRC_LOG_LEVELS, RAG_WEB_SEARCH_TIMEOUT
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
@@ -24,7 +24,7 @@ def search_jina(query: str, count: int) -> list[SearchResult]:
         "Accept": "application/json",
     }
     url = str(URL(jina_search_endpoint + query))
-    response = requests.get(url, headers=headers)
+    response = requests.get(url, headers=headers, timeout=RAG_WEB_SEARCH_TIMEOUT)
     response.raise_for_status()
     data = response.json()
 
@@ -0,0 +1,242 @@
+import time
+import logging
+import threading
+import urllib.parse
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+from apps.rag.search.main import SearchResult
+from config import (
+    SRC_LOG_LEVELS,
+    RAG_WEB_SEARCH_TIMEOUT,
+    RAG_WEB_SEARCH_MODE,
+    RAG_WEB_SEARCH_HEDGE_DELAY,
+    RAG_WEB_SEARCH_BREAKER_THRESHOLD,
+    RAG_WEB_SEARCH_BREAKER_COOLDOWN,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+# Upper bounds in seconds of the latency histogram buckets, plus one for slower
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Rank fusion constant, as in reciprocal rank fusion
+RANK_CONSTANT = 60
+
+
+def normalize_url(url: str) -> str:
+    parsed = urllib.parse.urlsplit(url.strip())
+    path = parsed.path.rstrip("/") or "/"
+    return urllib.parse.urlunsplit(
+        (parsed.scheme.lower(), parsed.netloc.lower(), path, parsed.query, "")
+    )
+
+
+def merge_results(
+    results: list[list[SearchResult]], count: Optional[int] = None
+) -> list[SearchResult]:
+    """Merge the ranked results of several engines: deduplicate by URL and order by
+    the sum of 1 / (RANK_CONSTANT + rank) over the engines that returned them."""
+    scores: dict[str, float] = {}
+    merged: dict[str, SearchResult] = {}
+    for engine_results in results:
+        for rank, result in enumerate(engine_results):
+            url = normalize_url(result.link)
+            scores[url] = scores.get(url, 0.0) + 1.0 / (RANK_CONSTANT + rank + 1)
+            merged.setdefault(url, result)
+
+    # sorted() is stable, ties keep the order in which the URLs were first seen
+    ordered = sorted(merged, key=lambda url: scores[url], reverse=True)
+    return [merged[url] for url in ordered[:count]]
+
+
+class EngineStats:
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record(self, elapsed: float, ok: bool, threshold: int, cooldown: float):
+        self.requests += 1
+        self.latency_sum += elapsed
+        bucket = next(
+            (i for i, bound in enumerate(LATENCY_BUCKETS) if elapsed <= bound),
+            len(LATENCY_BUCKETS),
+        )
+        self.latency[bucket] += 1
+
+        if ok:
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= threshold:
+                self.open_until = time.monotonic() + cooldown
+
+    def to_dict(self) -> dict:
+        labels = [f"le_{bound}" for bound in LATENCY_BUCKETS] + ["inf"]
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "mean_latency": self.latency_sum / self.requests if self.requests else 0,
+            "latency": dict(zip(labels, self.latency)),
+            "breaker": "open" if time.monotonic() < self.open_until else "closed",
+        }
+
+
+class SearchOrchestrator:
+    """Queries one or more search engines for a query.
+
+    "parallel" sends the query to all engines at once and merges what came back
+    within the timeout. "hedge" asks the engines in order, starting the next one
+    when the previous failed or has not answered within hedge_delay, and returns
+    the first answer. Engines whose circuit breaker is open (after threshold
+    consecutive failures, for cooldown seconds) are skipped unless no other engine
+    is left. Engine calls are blocking and run in a thread pool.
+    """
+
+    def __init__(
+        self,
+        mode: str = RAG_WEB_SEARCH_MODE,
+        hedge_delay: float = RAG_WEB_SEARCH_HEDGE_DELAY / 1000,
+        timeout: float = RAG_WEB_SEARCH_TIMEOUT,
+        breaker_threshold: int = RAG_WEB_SEARCH_BREAKER_THRESHOLD,
+        breaker_cooldown: float = RAG_WEB_SEARCH_BREAKER_COOLDOWN,
+        workers: int = 8,
+    ):
+        self.mode = mode
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.breaker_threshold = max(breaker_threshold, 1)
+        self.breaker_cooldown = breaker_cooldown
+
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="rag-search")
+        self.stats: dict[str, EngineStats] = {}
+        self.lock = threading.Lock()
+
+    def _get_available_engines(self, engines: list[str]) -> list[str]:
+        now = time.monotonic()
+        with self.lock:
+            available = [
+                engine
+                for engine in engines
+                if engine not in self.stats or now >= self.stats[engine].open_until
+            ]
+        if len(available) < len(engines):
+            log.info(
+                f"skipping search engines with an open circuit breaker: "
+                f"{[engine for engine in engines if engine not in available]}"
+            )
+        return available or engines[:1]
+
+    def _call(
+        self,
+        engine: str,
+        search: Callable[[str, str], list[SearchResult]],
+        query: str,
+    ) -> list[SearchResult]:
+        start = time.monotonic()
+        ok = False
+        try:
+            results = search(engine, query)
+            ok = True
+            return results
+        finally:
+            elapsed = time.monotonic() - start
+            with self.lock:
+                self.stats.setdefault(engine, EngineStats()).record(
+                    elapsed, ok, self.breaker_threshold, self.breaker_cooldown
+                )
+            log.debug(f"search engine {engine}: {elapsed:.2f}s, ok={ok}")
+
+    def _search_parallel(self, engines, search, query, count) -> list[SearchResult]:
+        futures = {
+            self.executor.submit(self._call, engine, search, query): engine
+            for engine in engines
+        }
+        done, not_done = wait(futures, timeout=self.timeout)
+        if not_done:
+            log.warning(f"search engines timed out: {[futures[f] for f in not_done]}")
+
+        results, error = [], None
+        # Merge in engine order so that ties favor the primary engine
+        for future in sorted(done, key=lambda f: engines.index(futures[f])):
+            if future.exception() is not None:
+                error = future.exception()
+                log.error(f"search engine {futures[future]} failed: {error}")
+            else:
+                results.append(future.result())
+
+        if not results:
+            raise error or TimeoutError("No search engine answered in time")
+        return merge_results(results, count)
+
+    def _search_hedged(self, engines, search, query, count) -> list[SearchResult]:
+        deadline = time.monotonic() + self.timeout
+        pending: dict[Future, str] = {}
+        remaining = list(engines)
+        error: Optional[BaseException] = None
+
+        while remaining or pending:
+            if remaining:
+                engine = remaining.pop(0)
+                pending[self.executor.submit(self._call, engine, search, query)] = (
+                    engine
+                )
+
+            # Wait for the hedge delay while there is another engine to try
+            timeout = deadline - time.monotonic()
+            if remaining:
+                timeout = min(timeout, self.hedge_delay)
+            if timeout <= 0 and not remaining:
+                break
+
+            done, _ = wait(
+                pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                engine = pending.pop(future)
+                if future.exception() is None:
+                    if pending:
+                        log.info(f"hedged web search answered by {engine}")
+                    return merge_results([future.result()], count)
+                error = future.exception()
+                log.error(f"search engine {engine} failed: {error}")
+
+        raise error or TimeoutError("No search engine answered in time")
+
+    def search(
+        self,
+        engines: list[str],
+        query: str,
+        search: Callable[[str, str], list[SearchResult]],
+        count: Optional[int] = None,
+    ) -> list[SearchResult]:
+        """Search with the given engines, the first being the preferred one;
+        search(engine, query) calls a single engine."""
+        engines = self._get_available_engines(list(dict.fromkeys(engines)))
+        if len(engines) == 1:
+            return self._call(engines[0], search, query)
+        if self.mode == "parallel":
+            return self._search_parallel(engines, search, query, count)
+        return self._search_hedged(engines, search, query, count)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "mode": self.mode,
+                "engines": {
+                    engine: stats.to_dict() for engine, stats in self.stats.items()
+                },
+            }
+
+
+SEARCH_ORCHESTRATOR = SearchOrchestrator()
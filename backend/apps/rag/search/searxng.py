@@ -4,7 +4,7 @@ import requests
 from typing import Optional
 
 from apps.rag.search.main import SearchResult, get_filtered_results
-from config import SRC_LOG_LEVELS
+from config import SRC_LOG_LEVELS, RAG_WEB_SEARCH_TIMEOUT
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
@@ -75,6 +75,7 @@ def search_searxng(
             "Connection": "keep-alive",
         },
         params=params,
+        timeout=RAG_WEB_SEARCH_TIMEOUT,
     )
 
     response.raise_for_status()  # Raise an exception for HTTP errors.
@@ -5,7 +5,7 @@ import requests
 from urllib.parse import urlencode
 
 from apps.rag.search.main import SearchResult, get_filtered_results
-from config import SRC_LOG_LEVELS
+from config import SRC_LOG_LEVELS, RAG_WEB_SEARCH_TIMEOUT
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
@@ -49,7 +49,9 @@ def search_serply(
         "X-Proxy-Location": proxy_location,
     }
 
-    response = requests.request("GET", url, headers=headers)
+    response = requests.request(
+        "GET", url, headers=headers, timeout=RAG_WEB_SEARCH_TIMEOUT
+    )
     response.raise_for_status()
 
     json_response = response.json()
@@ -3,7 +3,7 @@ import logging
 import requests
 
 from apps.rag.search.main import SearchResult
-from config import SRC_LOG_LEVELS
+from config import SRC_LOG_LEVELS, RAG_WEB_SEARCH_TIMEOUT
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
@@ -22,7 +22,7 @@ def search_tavily(api_key: str, query: str, count: int) -> list[SearchResult]:
     url = "https://api.tavily.com/search"
     data = {"query": query, "api_key": api_key}
 
-    response = requests.post(url, json=data)
+    response = requests.post(url, json=data, timeout=RAG_WEB_SEARCH_TIMEOUT)
     response.raise_for_status()
 
     json_response = response.json()
@@ -1,50 +1,108 @@
 import os
+import asyncio
+import functools
+import threading
 import logging
 import requests
+import aiohttp
+
+from concurrent.futures import ThreadPoolExecutor
 
 from typing import Union
 
 from apps.ollama.main import (
     generate_ollama_embeddings,
+    agenerate_ollama_embeddings,
     GenerateEmbeddingsForm,
 )
 
 from huggingface_hub import snapshot_download
 
-from langchain_core.documents import Document
-from langchain_community.retrievers import BM25Retriever
-from langchain.retrievers import (
-    ContextualCompressionRetriever,
-    EnsembleRetriever,
-)
-
 from typing import Optional
 
 from utils.misc import get_last_user_message, add_or_update_system_message
-from config import SRC_LOG_LEVELS, CHROMA_CLIENT
+from apps.rag.bm25 import BM25_INDEXES
+from apps.rag.collection_query import query_collections_concurrently
+from apps.rag.context import build_contexts
+from apps.rag.embedding_cache import CachedEmbeddingFunction, EMBEDDING_CACHE
+from apps.rag.fusion import hybrid_search
+from apps.rag.retrieval_cache import RETRIEVAL_CACHE
+from apps.rag.vector.connector import VECTOR_DB_CLIENT
+from config import (
+    SRC_LOG_LEVELS,
+    RAG_CONTEXT_CONCURRENCY,
+    RAG_CONTEXT_TOKEN_BUDGET,
+    RAG_HYBRID_FUSION_METHOD,
+    RAG_HYBRID_BM25_WEIGHT,
+)
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
 
+# Chat requests run their RAG stage on a dedicated pool so that retrieval bursts
+# cannot exhaust the threads the server needs for everything else
+RAG_CONTEXT_EXECUTOR = ThreadPoolExecutor(
+    max_workers=RAG_CONTEXT_CONCURRENCY,
+    thread_name_prefix="rag-context",
+)
+RAG_CONTEXT_SEMAPHORE = asyncio.Semaphore(RAG_CONTEXT_CONCURRENCY)
+
+
+# Chunk metadata retrieval can be restricted to, see get_metadata_filter
+METADATA_FILTER_FIELDS = ("file_id", "name", "created_by")
+
+
+def get_metadata_filter(filter: Optional[dict]) -> Optional[dict]:
+    """Build a where clause from {field: value or list of values}, e.g.
+    {"file_id": "..."} to search a single file of a collection. Fields are ANDed,
+    the values of a list ORed. Returns None for an empty filter."""
+    if not filter:
+        return None
+
+    clauses = []
+    for field, value in filter.items():
+        if field not in METADATA_FILTER_FIELDS:
+            raise ValueError(f"Unsupported metadata filter field {field}")
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            values = sorted(set(value))
+            if len(values) == 1:
+                clauses.append({field: values[0]})
+            else:
+                clauses.append({field: {"$in": values}})
+        else:
+            clauses.append({field: value})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
 
 def query_doc(
     collection_name: str,
     query: str,
     embedding_function,
     k: int,
+    query_embedding=None,
+    where: Optional[dict] = None,
 ):
     try:
-        collection = CHROMA_CLIENT.get_collection(name=collection_name)
-        query_embeddings = embedding_function(query)
+        collection = VECTOR_DB_CLIENT.get_collection(name=collection_name)
+        if query_embedding is None:
+            query_embedding = embedding_function(query)
 
         result = collection.query(
-            query_embeddings=[query_embeddings],
+            query_embeddings=[query_embedding],
             n_results=k,
+            where=where,
         )
 
         log.info(f"query_doc:result {result}")
         return result
     except Exception as e:
+        # The cached handle may point to a collection another worker deleted
+        VECTOR_DB_CLIENT.invalidate(collection_name)
         raise e
 
 
@@ -55,48 +113,32 @@ def query_doc_with_hybrid_search(
     k: int,
     reranking_function,
     r: float,
+    query_embedding=None,
+    where: Optional[dict] = None,
 ):
     try:
-        collection = CHROMA_CLIENT.get_collection(name=collection_name)
-        documents = collection.get()  # get all documents
-
-        bm25_retriever = BM25Retriever.from_texts(
-            texts=documents.get("documents"),
-            metadatas=documents.get("metadatas"),
-        )
-        bm25_retriever.k = k
+        collection = VECTOR_DB_CLIENT.get_collection(name=collection_name)
+        if query_embedding is None:
+            query_embedding = embedding_function(query)
 
-        chroma_retriever = ChromaRetriever(
+        result = hybrid_search(
             collection=collection,
-            embedding_function=embedding_function,
-            top_n=k,
-        )
-
-        ensemble_retriever = EnsembleRetriever(
-            retrievers=[bm25_retriever, chroma_retriever], weights=[0.5, 0.5]
-        )
-
-        compressor = RerankCompressor(
-            embedding_function=embedding_function,
-            top_n=k,
+            index=BM25_INDEXES.get_or_build(collection),
+            query=query,
+            query_embedding=query_embedding,
+            k=k,
             reranking_function=reranking_function,
-            r_score=r,
-        )
-
-        compression_retriever = ContextualCompressionRetriever(
-            base_compressor=compressor, base_retriever=ensemble_retriever
+            r=r,
+            method=RAG_HYBRID_FUSION_METHOD,
+            weights=[RAG_HYBRID_BM25_WEIGHT, 1 - RAG_HYBRID_BM25_WEIGHT],
+            where=where,
+            embedding_function=embedding_function,
         )
 
-        result = compression_retriever.invoke(query)
-        result = {
-            "distances": [[d.metadata.get("score") for d in result]],
-            "documents": [[d.page_content for d in result]],
-            "metadatas": [[d.metadata for d in result]],
-        }
-
         log.info(f"query_doc_with_hybrid_search:result {result}")
         return result
     except Exception as e:
+        VECTOR_DB_CLIENT.invalidate(collection_name)
         raise e
 
 
@@ -141,25 +183,52 @@ def merge_and_sort_query_results(query_results, k, reverse=False):
     return result
 
 
+def resolve_query_embedding(query: str, embedding_function, query_embedding=None):
+    """query_embedding can be a vector or a callable returning it, which is only
+    called once the embedding is needed (e.g. on a retrieval cache miss)."""
+    if query_embedding is None:
+        return embedding_function(query)
+    if callable(query_embedding):
+        return query_embedding()
+    return query_embedding
+
+
 def query_collection(
     collection_names: list[str],
     query: str,
     embedding_function,
     k: int,
+    query_embedding=None,
+    where: Optional[dict] = None,
 ):
-    results = []
-    for collection_name in collection_names:
-        try:
-            result = query_doc(
-                collection_name=collection_name,
-                query=query,
-                k=k,
-                embedding_function=embedding_function,
-            )
-            results.append(result)
-        except Exception:
-            pass
-    return merge_and_sort_query_results(results, k=k)
+    cache_key = RETRIEVAL_CACHE.get_key(
+        collection_names, query, k, None, False, embedding_function, where=where
+    )
+    if (result := RETRIEVAL_CACHE.get(cache_key)) is not None:
+        return result
+    versions = RETRIEVAL_CACHE.get_versions(collection_names)
+
+    query_embedding = resolve_query_embedding(
+        query, embedding_function, query_embedding
+    )
+
+    results = query_collections_concurrently(
+        collection_names,
+        lambda collection_name: query_doc(
+            collection_name=collection_name,
+            query=query,
+            k=k,
+            embedding_function=embedding_function,
+            query_embedding=query_embedding,
+            where=where,
+        ),
+    )
+    result = merge_and_sort_query_results(results, k=k)
+
+    # Results missing a failed collection are not cached
+    if len(results) == len(collection_names):
+        RETRIEVAL_CACHE.set(cache_key, versions, result)
+    return result
 
 
 def query_collection_with_hybrid_search(
@@ -169,26 +238,101 @@ def query_collection_with_hybrid_search(
     k: int,
     reranking_function,
     r: float,
+    query_embedding=None,
+    where: Optional[dict] = None,
 ):
-    results = []
-    for collection_name in collection_names:
-        try:
-            result = query_doc_with_hybrid_search(
-                collection_name=collection_name,
-                query=query,
-                embedding_function=embedding_function,
-                k=k,
-                reranking_function=reranking_function,
-                r=r,
-            )
-            results.append(result)
-        except Exception:
-            pass
+    cache_key = RETRIEVAL_CACHE.get_key(
+        collection_names,
+        query,
+        k,
+        r,
+        True,
+        embedding_function,
+        reranking_function,
+        where=where,
+    )
+    if (result := RETRIEVAL_CACHE.get(cache_key)) is not None:
+        return result
+    versions = RETRIEVAL_CACHE.get_versions(collection_names)
+
+    query_embedding = resolve_query_embedding(
+        query, embedding_function, query_embedding
+    )
+
+    results = query_collections_concurrently(
+        collection_names,
+        lambda collection_name: query_doc_with_hybrid_search(
+            collection_name=collection_name,
+            query=query,
+            embedding_function=embedding_function,
+            k=k,
+            reranking_function=reranking_function,
+            r=r,
+            query_embedding=query_embedding,
+            where=where,
+        ),
+    )
     sorted_res = merge_and_sort_query_results(results, k=k, reverse=True)
     log.debug(f"\nsorted rag context segments: {sorted_res}\n")
+
+    if len(results) == len(collection_names):
+        RETRIEVAL_CACHE.set(cache_key, versions, sorted_res)
     return sorted_res
 
 
+def get_file_collections(files):
+    """Yield (file, collection_names) for the files of a chat, leaving out the
+    collections of earlier files."""
+    extracted_collections = []
+    for file in files:
+        collection_names = (
+            file["collection_names"]
+            if file["type"] == "collection"
+            else [file["collection_name"]]
+        )
+
+        collection_names = set(collection_names).difference(extracted_collections)
+        if not collection_names:
+            log.debug(f"skipping {file} as it has already been extracted")
+            continue
+
+        yield file, collection_names
+        extracted_collections.extend(collection_names)
+
+
+def needs_query_embedding(
+    files, query, embedding_function, k, reranking_function, r, hybrid_search
+) -> bool:
+    """Whether the retrieval of any of the files misses RETRIEVAL_CACHE."""
+    for file, collection_names in get_file_collections(files):
+        if file["type"] == "text":
+            continue
+        try:
+            where = get_metadata_filter(file.get("filter"))
+        except ValueError:
+            # get_rag_context reports it
+            continue
+
+        if hybrid_search:
+            key = RETRIEVAL_CACHE.get_key(
+                collection_names,
+                query,
+                k,
+                r,
+                True,
+                embedding_function,
+                reranking_function,
+                where=where,
+            )
+        else:
+            key = RETRIEVAL_CACHE.get_key(
+                collection_names, query, k, None, False, embedding_function, where=where
+            )
+        if not RETRIEVAL_CACHE.contains(key):
+            return True
+    return False
+
+
 def rag_template(template: str, context: str, query: str):
     template = template.replace("[context]", context)
     template = template.replace("[query]", query)
@@ -204,7 +348,9 @@ def get_embedding_function(
     batch_size,
 ):
     if embedding_engine == "":
-        return lambda query: embedding_function.encode(query).tolist()
+        embed = lambda query: embedding_function.encode(query).tolist()
+        # Local models are CPU/GPU bound, CachedEmbeddingFunction runs them in a thread
+        async_embed = None
     elif embedding_engine in ["ollama", "openai"]:
         if embedding_engine == "ollama":
             func = lambda query: generate_ollama_embeddings(
@@ -235,7 +381,48 @@ def get_embedding_function(
             else:
                 return f(query)
 
-        return lambda query: generate_multiple(query, func)
+        embed = lambda query: generate_multiple(query, func)
+
+        if embedding_engine == "ollama":
+            async_func = lambda query: agenerate_ollama_embeddings(
+                GenerateEmbeddingsForm(
+                    **{
+                        "model": embedding_model,
+                        "prompt": query,
+                    }
+                )
+            )
+        elif embedding_engine == "openai":
+            async_func = lambda query: agenerate_openai_embeddings(
+                model=embedding_model,
+                text=query,
+                key=openai_key,
+                url=openai_url,
+            )
+
+        async def agenerate_multiple(query, f):
+            if isinstance(query, list):
+                if embedding_engine == "openai":
+                    embeddings = []
+                    for i in range(0, len(query), batch_size):
+                        embeddings.extend(await f(query[i : i + batch_size]))
+                    return embeddings
+                else:
+                    return list(await asyncio.gather(*[f(q) for q in query]))
+            else:
+                return await f(query)
+
+        async_embed = lambda query: agenerate_multiple(query, async_func)
+    else:
+        return None
+
+    return CachedEmbeddingFunction(
+        embedding_engine,
+        embedding_model,
+        embed,
+        EMBEDDING_CACHE,
+        async_func=async_embed,
+    )
 
 
 def get_rag_context(
@@ -246,31 +433,40 @@ def get_rag_context(
     reranking_function,
     r,
     hybrid_search,
+    query_embedding=None,
+    cancel_event: Optional[threading.Event] = None,
+    token_budget: Optional[int] = None,
 ):
     log.debug(f"\nget_rag_context: {files} {messages} {embedding_function}, top k:{k} {reranking_function}, RELEVANCE_THRESHOLD:{r}\n")
     query = get_last_user_message(messages)
 
-    extracted_collections = []
     relevant_contexts = []
 
-    for file in files:
-        context = None
+    # The query is embedded at most once per request, shared by every collection,
+    # and only when a retrieval misses the cache
+    embedding = query_embedding
 
-        collection_names = (
-            file["collection_names"]
-            if file["type"] == "collection"
-            else [file["collection_name"]]
-        )
+    def get_query_embedding():
+        nonlocal embedding
+        if embedding is None:
+            embedding = embedding_function(query)
+        return embedding
 
-        collection_names = set(collection_names).difference(extracted_collections)
-        if not collection_names:
-            log.debug(f"skipping {file} as it has already been extracted")
-            continue
+    for file, collection_names in get_file_collections(files):
+        if cancel_event is not None and cancel_event.is_set():
+            log.info("get_rag_context cancelled")
+            return [], []
+
+        context = None
 
         try:
             if file["type"] == "text":
                 context = file["content"]
             else:
+
+                # e.g. {"file_id": ...} to search one file of a shared collection
+                where = get_metadata_filter(file.get("filter"))
+
                 if hybrid_search:
                     context = query_collection_with_hybrid_search(
                         collection_names=collection_names,
@@ -279,6 +475,8 @@ def get_rag_context(
                         k=k,
                         reranking_function=reranking_function,
                         r=r,
+                        query_embedding=get_query_embedding,
+                        where=where,
                     )
                 else:
                     context = query_collection(
@@ -286,6 +484,8 @@ def get_rag_context(
                         query=query,
                         embedding_function=embedding_function,
                         k=k,
+                        query_embedding=get_query_embedding,
+                        where=where,
                     )
         except Exception as e:
             log.exception(e)
@@ -294,19 +494,29 @@ def get_rag_context(
         if context:
             relevant_contexts.append({**context, "source": file})
 
-        extracted_collections.extend(collection_names)
-
-    contexts = []
+    file_chunks = []
     citations = []
 
     for context in relevant_contexts:
         try:
             if "documents" in context:
-                contexts.append(
-                    "\n\n".join(
-                        [text for text in context["documents"][0] if text is not None]
-                    )
-                )
+                chunks = []
+                for text, distance, metadata in zip(
+                    context["documents"][0],
+                    context["distances"][0],
+                    context["metadatas"][0],
+                ):
+                    if text is not None:
+                        chunks.append(
+                            {
+                                "text": text,
+                                # Hybrid search returns relevance scores, plain
+                                # vector search returns distances
+                                "score": distance if hybrid_search else -distance,
+                                "metadata": metadata,
+                            }
+                        )
+                file_chunks.append(chunks)
 
                 if "metadatas" in context:
                     citations.append(
@@ -319,9 +529,62 @@ def get_rag_context(
         except Exception as e:
             log.exception(e)
 
+    contexts = build_contexts(
+        file_chunks,
+        token_budget if token_budget is not None else RAG_CONTEXT_TOKEN_BUDGET,
+    )
+
     return contexts, citations
 
 
+async def get_rag_context_async(
+    files,
+    messages,
+    embedding_function,
+    k,
+    reranking_function,
+    r,
+    hybrid_search,
+    token_budget: Optional[int] = None,
+):
+    """Non-blocking get_rag_context for the chat middleware.
+
+    When a retrieval is going to miss RETRIEVAL_CACHE, the query is embedded first
+    with the async embedding path. The retrieval itself runs on
+    RAG_CONTEXT_EXECUTOR, at most RAG_CONTEXT_CONCURRENCY requests at a time.
+    Cancelling the returned coroutine stops the retrieval before its next file.
+    """
+    async with RAG_CONTEXT_SEMAPHORE:
+        query_embedding = None
+        query = get_last_user_message(messages)
+        if query and needs_query_embedding(
+            files, query, embedding_function, k, reranking_function, r, hybrid_search
+        ):
+            query_embedding = await embedding_function.acall(query)
+
+        cancel_event = threading.Event()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                RAG_CONTEXT_EXECUTOR,
+                functools.partial(
+                    get_rag_context,
+                    files=files,
+                    messages=messages,
+                    embedding_function=embedding_function,
+                    k=k,
+                    reranking_function=reranking_function,
+                    r=r,
+                    hybrid_search=hybrid_search,
+                    query_embedding=query_embedding,
+                    cancel_event=cancel_event,
+                    token_budget=token_budget,
+                ),
+            )
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+
+
 def get_model_path(model: str, update_model: bool = False):
     # Construct huggingface_hub kwargs with local_files_only to return the snapshot path
     cache_dir = os.getenv("SENTENCE_TRANSFORMERS_HOME")
@@ -397,99 +660,39 @@ def generate_openai_batch_embeddings(
         return None
 
 
-from typing import Any
-
-from langchain_core.retrievers import BaseRetriever
-from langchain_core.callbacks import CallbackManagerForRetrieverRun
-
-
-class ChromaRetriever(BaseRetriever):
-    collection: Any
-    embedding_function: Any
-    top_n: int
-
-    def _get_relevant_documents(
-        self,
-        query: str,
-        *,
-        run_manager: CallbackManagerForRetrieverRun,
-    ) -> list[Document]:
-        query_embeddings = self.embedding_function(query)
-
-        results = self.collection.query(
-            query_embeddings=[query_embeddings],
-            n_results=self.top_n,
-        )
-
-        ids = results["ids"][0]
-        metadatas = results["metadatas"][0]
-        documents = results["documents"][0]
-
-        results = []
-        for idx in range(len(ids)):
-            results.append(
-                Document(
-                    metadata=metadatas[idx],
-                    page_content=documents[idx],
-                )
-            )
-        return results
-
-
-import operator
-
-from typing import Optional, Sequence
-
-from langchain_core.documents import BaseDocumentCompressor, Document
-from langchain_core.callbacks import Callbacks
-from langchain_core.pydantic_v1 import Extra
-
-
-class RerankCompressor(BaseDocumentCompressor):
-    embedding_function: Any
-    top_n: int
-    reranking_function: Any
-    r_score: float
-
-    class Config:
-        extra = Extra.forbid
-        arbitrary_types_allowed = True
+async def agenerate_openai_embeddings(
+    model: str,
+    text: Union[str, list[str]],
+    key: str,
+    url: str = "https://api.openai.com/v1",
+):
+    if isinstance(text, list):
+        embeddings = await agenerate_openai_batch_embeddings(model, text, key, url)
+    else:
+        embeddings = await agenerate_openai_batch_embeddings(model, [text], key, url)
 
-    def compress_documents(
-        self,
-        documents: Sequence[Document],
-        query: str,
-        callbacks: Optional[Callbacks] = None,
-    ) -> Sequence[Document]:
-        reranking = self.reranking_function is not None
+    return embeddings[0] if isinstance(text, str) else embeddings
 
-        if reranking:
-            scores = self.reranking_function.predict(
-                [(query, doc.page_content) for doc in documents]
-            )
-        else:
-            from sentence_transformers import util
 
-            query_embedding = self.embedding_function(query)
-            document_embedding = self.embedding_function(
-                [doc.page_content for doc in documents]
-            )
-            scores = util.cos_sim(query_embedding, document_embedding)[0]
-
-        docs_with_scores = list(zip(documents, scores.tolist()))
-        if self.r_score:
-            docs_with_scores = [
-                (d, s) for d, s in docs_with_scores if s >= self.r_score
-            ]
-
-        result = sorted(docs_with_scores, key=operator.itemgetter(1), reverse=True)
-        final_results = []
-        for doc, doc_score in result[: self.top_n]:
-            metadata = doc.metadata
-            metadata["score"] = doc_score
-            doc = Document(
-                page_content=doc.page_content,
-                metadata=metadata,
-            )
-            final_results.append(doc)
-        return final_results
+async def agenerate_openai_batch_embeddings(
+    model: str, texts: list[str], key: str, url: str = "https://api.openai.com/v1"
+) -> Optional[list[list[float]]]:
+    try:
+        async with aiohttp.ClientSession(trust_env=True) as session:
+            async with session.post(
+                f"{url}/embeddings",
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {key}",
+                },
+                json={"input": texts, "model": model},
+            ) as r:
+                r.raise_for_status()
+                data = await r.json()
+                if "data" in data:
+                    return [elem["embedding"] for elem in data["data"]]
+                else:
+                    raise Exception("Something went wrong :/")
+    except Exception as e:
+        log.exception(e)
+        return None
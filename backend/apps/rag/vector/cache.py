@@ -0,0 +1,110 @@
+import time
+import threading
+
+from typing import Optional
+
+from apps.rag.vector.main import VectorCollection, VectorDBClient
+
+
+class CachedVectorDBClient(VectorDBClient):
+    """Reuses collection handles of a client for ttl seconds.
+
+    Handles are cached by get_collection, create_collection and
+    get_or_create_collection and dropped by delete_collection and reset, so that an
+    overwritten collection (deleted, then created again) is never served through
+    its old handle in this process. Missing collections are not cached. A lookup
+    that raced with a delete does not store its handle.
+    """
+
+    def __init__(self, client: VectorDBClient, ttl: float):
+        self.client = client
+        self.ttl = ttl
+        self.handles: dict[str, tuple[float, VectorCollection]] = {}
+        self.epoch = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, name: str):
+        if self.ttl <= 0:
+            return None
+
+        with self.lock:
+            entry = self.handles.get(name)
+            if entry is not None and entry[0] >= time.monotonic():
+                self.hits += 1
+                return entry[1]
+
+            self.handles.pop(name, None)
+            self.misses += 1
+            return None
+
+    def _set(self, name: str, collection: VectorCollection, epoch: int):
+        if self.ttl <= 0:
+            return
+
+        with self.lock:
+            if epoch == self.epoch:
+                self.handles[name] = (time.monotonic() + self.ttl, collection)
+
+    def _lookup(self, name: str, lookup) -> VectorCollection:
+        collection = self._get(name)
+        if collection is None:
+            epoch = self.epoch
+            collection = lookup(name)
+            self._set(name, collection, epoch)
+        return collection
+
+    def invalidate(self, name: Optional[str] = None):
+        """Drop the handle of a collection, or every handle."""
+        with self.lock:
+            self.epoch += 1
+            if name is None:
+                self.handles.clear()
+            else:
+                self.handles.pop(name, None)
+
+    def get_collection(self, name: str) -> VectorCollection:
+        return self._lookup(name, lambda name: self.client.get_collection(name=name))
+
+    def create_collection(self, name: str) -> VectorCollection:
+        self.invalidate(name)
+        epoch = self.epoch
+        collection = self.client.create_collection(name=name)
+        self._set(name, collection, epoch)
+        return collection
+
+    def get_or_create_collection(self, name: str) -> VectorCollection:
+        return self._lookup(
+            name, lambda name: self.client.get_or_create_collection(name=name)
+        )
+
+    def delete_collection(self, name: str):
+        self.invalidate(name)
+        try:
+            self.client.delete_collection(name=name)
+        finally:
+            # Lookups that started before the delete may have stored a handle
+            self.invalidate(name)
+
+    def list_collections(self) -> list[VectorCollection]:
+        return self.client.list_collections()
+
+    def reset(self):
+        self.invalidate()
+        try:
+            self.client.reset()
+        finally:
+            self.invalidate()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.handles),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,135 @@
+import chromadb
+
+from chromadb import Settings
+from chromadb.db.base import UniqueConstraintError
+from chromadb.utils.batch_utils import create_batches
+from typing import Optional, Sequence
+
+from apps.rag.vector.main import (
+    CollectionExistsError,
+    DEFAULT_GET_INCLUDE,
+    DEFAULT_QUERY_INCLUDE,
+    VectorCollection,
+    VectorDBClient,
+)
+from config import (
+    CHROMA_DATA_PATH,
+    CHROMA_TENANT,
+    CHROMA_DATABASE,
+    CHROMA_HTTP_HOST,
+    CHROMA_HTTP_PORT,
+    CHROMA_HTTP_HEADERS,
+    CHROMA_HTTP_SSL,
+)
+
+
+def get_chroma_client():
+    if CHROMA_HTTP_HOST != "":
+        return chromadb.HttpClient(
+            host=CHROMA_HTTP_HOST,
+            port=CHROMA_HTTP_PORT,
+            headers=CHROMA_HTTP_HEADERS,
+            ssl=CHROMA_HTTP_SSL,
+            tenant=CHROMA_TENANT,
+            database=CHROMA_DATABASE,
+            settings=Settings(allow_reset=True, anonymized_telemetry=False),
+        )
+    return chromadb.PersistentClient(
+        path=CHROMA_DATA_PATH,
+        settings=Settings(allow_reset=True, anonymized_telemetry=False),
+        tenant=CHROMA_TENANT,
+        database=CHROMA_DATABASE,
+    )
+
+
+class ChromaCollection(VectorCollection):
+    def __init__(self, client, collection):
+        self.client = client
+        self.collection = collection
+        self.name = collection.name
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def _write(self, write, ids, embeddings, documents, metadatas):
+        # Chroma rejects writes above its maximum batch size
+        for batch in create_batches(
+            api=self.client,
+            ids=list(ids),
+            embeddings=list(embeddings),
+            metadatas=list(metadatas) if metadatas is not None else None,
+            documents=list(documents) if documents is not None else None,
+        ):
+            write(*batch)
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(self.collection.add, ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(self.collection.upsert, ids, embeddings, documents, metadatas)
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = DEFAULT_GET_INCLUDE,
+    ) -> dict:
+        return self.collection.get(
+            ids=list(ids) if ids is not None else None,
+            where=where or None,
+            limit=limit,
+            offset=offset,
+            include=list(include),
+        )
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Optional[dict] = None,
+        include: Sequence[str] = DEFAULT_QUERY_INCLUDE,
+    ) -> dict:
+        return self.collection.query(
+            query_embeddings=list(query_embeddings),
+            n_results=n_results,
+            where=where or None,
+            include=list(include),
+        )
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(
+            ids=list(ids) if ids is not None else None, where=where or None
+        )
+
+
+class ChromaClient(VectorDBClient):
+    """Chroma, embedded (CHROMA_DATA_PATH) or over HTTP (CHROMA_HTTP_HOST)."""
+
+    def __init__(self, client=None):
+        self.client = client if client is not None else get_chroma_client()
+
+    def _wrap(self, collection) -> ChromaCollection:
+        return ChromaCollection(self.client, collection)
+
+    def get_collection(self, name: str) -> ChromaCollection:
+        return self._wrap(self.client.get_collection(name=name))
+
+    def create_collection(self, name: str) -> ChromaCollection:
+        try:
+            return self._wrap(self.client.create_collection(name=name))
+        except UniqueConstraintError as e:
+            raise CollectionExistsError(str(e))
+
+    def get_or_create_collection(self, name: str) -> ChromaCollection:
+        return self._wrap(self.client.get_or_create_collection(name=name))
+
+    def delete_collection(self, name: str):
+        self.client.delete_collection(name=name)
+
+    def list_collections(self) -> list[ChromaCollection]:
+        return [self._wrap(collection) for collection in self.client.list_collections()]
+
+    def reset(self):
+        self.client.reset()
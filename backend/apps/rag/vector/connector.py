@@ -0,0 +1,32 @@
+from apps.rag.vector.cache import CachedVectorDBClient
+from apps.rag.vector.main import VectorDBClient
+from config import (
+    VECTOR_DB,
+    FLAT_VECTOR_DB_PATH,
+    FLAT_VECTOR_DB_DTYPE,
+    ENABLE_FLAT_VECTOR_DB_HNSW,
+    FLAT_VECTOR_DB_HNSW_MIN_SIZE,
+    VECTOR_DB_COLLECTION_CACHE_TTL,
+)
+
+
+def get_vector_db_client() -> VectorDBClient:
+    if VECTOR_DB == "flat":
+        from apps.rag.vector.flat import FlatClient
+
+        return FlatClient(
+            FLAT_VECTOR_DB_PATH,
+            dtype=FLAT_VECTOR_DB_DTYPE,
+            hnsw=ENABLE_FLAT_VECTOR_DB_HNSW,
+            hnsw_min_size=FLAT_VECTOR_DB_HNSW_MIN_SIZE,
+        )
+    elif VECTOR_DB == "chroma":
+        from apps.rag.vector.chroma import ChromaClient
+
+        return ChromaClient()
+    raise ValueError(f"Unsupported VECTOR_DB {VECTOR_DB}")
+
+
+VECTOR_DB_CLIENT = CachedVectorDBClient(
+    get_vector_db_client(), VECTOR_DB_COLLECTION_CACHE_TTL
+)
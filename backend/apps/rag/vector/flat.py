@@ -0,0 +1,716 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import logging
+import operator
+import threading
+
+from contextlib import contextmanager
+from typing import Optional, Sequence
+
+import numpy as np
+
+try:
+    # Installed with chromadb (chroma-hnswlib)
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where writes are only serialized within a process
+    fcntl = None
+
+from apps.rag.vector.main import (
+    CollectionExistsError,
+    DEFAULT_GET_INCLUDE,
+    DEFAULT_QUERY_INCLUDE,
+    VectorCollection,
+    VectorDBClient,
+)
+from config import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+# Chroma's collection name rules, which also keep names safe as directory names
+COLLECTION_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9._-]{1,61}[a-zA-Z0-9]$")
+
+# Rows read per block by brute-force search and index builds, bounding the
+# temporary float32 copies of the memory-mapped matrix
+BLOCK_ROWS = 65536
+
+# Deleted rows (including the old versions of upserted records) are compacted away
+# once there are at least this many and more than live rows
+COMPACT_MIN_DEAD_ROWS = 1024
+
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+
+def _compare(compare):
+    def match(value, operand):
+        try:
+            return compare(value, operand)
+        except TypeError:
+            return False
+
+    return match
+
+
+WHERE_OPERATORS = {
+    "$eq": operator.eq,
+    "$ne": operator.ne,
+    "$gt": _compare(operator.gt),
+    "$gte": _compare(operator.ge),
+    "$lt": _compare(operator.lt),
+    "$lte": _compare(operator.le),
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+
+def match_where(metadata: Optional[dict], where: Optional[dict]) -> bool:
+    """Evaluate a Chroma where filter; as in Chroma, a condition on a key the
+    metadata does not have never matches."""
+    if not where:
+        return True
+
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            matched = all(match_where(metadata, c) for c in condition)
+        elif key == "$or":
+            matched = any(match_where(metadata, c) for c in condition)
+        elif key not in metadata:
+            matched = False
+        elif isinstance(condition, dict):
+            matched = all(
+                WHERE_OPERATORS[op](metadata[key], operand)
+                for op, operand in condition.items()
+            )
+        else:
+            matched = metadata[key] == condition
+
+        if not matched:
+            return False
+    return True
+
+
+def validate_collection_name(name: str):
+    if not COLLECTION_NAME_PATTERN.match(name) or ".." in name:
+        raise ValueError(
+            f"Expected collection name of 3-63 alphanumeric, '.', '_' or '-' "
+            f"characters, starting and ending with an alphanumeric one, got {name}"
+        )
+
+
+class FlatCollection(VectorCollection):
+    """A collection stored as an append-only log in {directory}/{name}/:
+
+    meta.json            id, generation, dimension and dtype of the collection
+    vectors.{gen}.bin    raw float32 / float16 rows, memory-mapped for search
+    records.{gen}.jsonl  one line per added row ({"id", "document", "metadata"},
+                         the n-th add is row n) or deleted id ({"delete": id})
+    hnsw.{gen}.bin       optional HNSW graph over the rows, labelled by row,
+                         with the number of rows it covers in hnsw.{gen}.json
+
+    Upserts delete and re-add, and a compaction writes the live rows to the next
+    generation. Writers hold an exclusive file lock; readers pick up what other
+    processes appended by reading the new complete lines of the log.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        name: str,
+        dtype: str = "float32",
+        hnsw: bool = False,
+        hnsw_min_size: int = 0,
+    ):
+        self.name = name
+        self.directory = os.path.join(directory, name)
+        self.dtype = dtype
+        self.hnsw = hnsw and hnswlib is not None
+        self.hnsw_min_size = hnsw_min_size
+        self.lock = threading.RLock()
+        self._clear_state()
+
+    def _clear_state(self):
+        self.meta: Optional[dict] = None
+        self.meta_stat: Optional[tuple] = None
+        self.ids: list[Optional[str]] = []
+        self.documents: list[Optional[str]] = []
+        self.metadatas: list[Optional[dict]] = []
+        self.positions: dict[str, int] = {}
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.vectors: Optional[np.memmap] = None
+        self.records_offset = 0
+
+        self.index = None
+        self.index_rows = 0
+        self.index_saved_rows = 0
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _generation_path(self, prefix: str, suffix: str) -> str:
+        return self._path(f"{prefix}.{self.meta['generation']}.{suffix}")
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self._path("lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write_meta(self, meta: dict):
+        tmp_path = self._path(f"meta.json.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path("meta.json"))
+
+    def _refresh(self):
+        """Bring the in-memory state up to date with the files; called with
+        self.lock held."""
+        try:
+            stat = os.stat(self._path("meta.json"))
+        except FileNotFoundError:
+            self._clear_state()
+            raise ValueError(f"Collection {self.name} does not exist.")
+
+        meta_stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if meta_stat != self.meta_stat:
+            with open(self._path("meta.json"), "r") as f:
+                meta = json.load(f)
+            # A new generation (compaction) or a recreated collection
+            if self.meta is None or (meta["id"], meta["generation"]) != (
+                self.meta["id"],
+                self.meta["generation"],
+            ):
+                self._clear_state()
+            self.meta = meta
+            self.meta_stat = meta_stat
+
+        self._read_records()
+
+    def _read_records(self):
+        path = self._generation_path("records", "jsonl")
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            size = 0
+        if size <= self.records_offset:
+            return
+
+        with open(path, "rb") as f:
+            f.seek(self.records_offset)
+            data = f.read(size - self.records_offset)
+        # A line another process is still writing is read next time
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return
+        self.records_offset += end
+
+        first_row = len(self.ids)
+        deleted_rows = []
+        for line in data[:end].splitlines():
+            record = json.loads(line)
+            if "delete" in record:
+                row = self.positions.pop(record["delete"], None)
+                if row is not None:
+                    self.ids[row] = None
+                    self.documents[row] = None
+                    self.metadatas[row] = None
+                    deleted_rows.append(row)
+            else:
+                self.positions[record["id"]] = len(self.ids)
+                self.ids.append(record["id"])
+                self.documents.append(record.get("document"))
+                self.metadatas.append(record.get("metadata"))
+
+        rows = len(self.ids)
+        if rows > first_row:
+            self.vectors = np.memmap(
+                self._generation_path("vectors", "bin"),
+                dtype=self.meta["dtype"],
+                mode="r",
+                shape=(rows, self.meta["dimension"]),
+            )
+            norms = [self.norms]
+            for start in range(first_row, rows, BLOCK_ROWS):
+                block = np.asarray(
+                    self.vectors[start : min(start + BLOCK_ROWS, rows)],
+                    dtype=np.float32,
+                )
+                norms.append(np.einsum("ij,ij->i", block, block))
+            self.norms = np.concatenate(norms)
+
+        # Deleted rows never come out of brute-force search
+        self.norms[deleted_rows] = np.inf
+
+        if self.index is not None:
+            self._update_index(deleted_rows)
+
+    def _append(self, records: list[dict], embeddings: Optional[np.ndarray] = None):
+        """Append records, with one embedding row per added record; called with
+        both locks held and the state refreshed."""
+        if embeddings is not None and len(embeddings):
+            path = self._generation_path("vectors", "bin")
+            row_size = self.meta["dimension"] * np.dtype(self.meta["dtype"]).itemsize
+            with open(path, "ab") as f:
+                # Drop rows of a writer that died before logging them
+                f.truncate(len(self.ids) * row_size)
+                f.write(np.ascontiguousarray(embeddings, dtype=self.meta["dtype"]))
+
+        with open(self._generation_path("records", "jsonl"), "ab") as f:
+            f.write(
+                b"".join(
+                    json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+                    for record in records
+                )
+            )
+        self._read_records()
+        self._compact()
+
+    def _compact(self):
+        dead = len(self.ids) - len(self.positions)
+        if dead < COMPACT_MIN_DEAD_ROWS or dead <= len(self.positions):
+            return
+
+        old_files = [
+            self._generation_path(prefix, suffix)
+            for prefix, suffix in [
+                ("vectors", "bin"),
+                ("records", "jsonl"),
+                ("hnsw", "bin"),
+                ("hnsw", "json"),
+            ]
+        ]
+        live_rows = [row for row, id in enumerate(self.ids) if id is not None]
+        meta = {**self.meta, "generation": self.meta["generation"] + 1}
+        generation = meta["generation"]
+
+        with open(self._path(f"vectors.{generation}.bin"), "wb") as f:
+            for start in range(0, len(live_rows), BLOCK_ROWS):
+                f.write(
+                    np.ascontiguousarray(
+                        self.vectors[live_rows[start : start + BLOCK_ROWS]]
+                    )
+                )
+        with open(self._path(f"records.{generation}.jsonl"), "wb") as f:
+            for row in live_rows:
+                record = {
+                    "id": self.ids[row],
+                    "document": self.documents[row],
+                    "metadata": self.metadatas[row],
+                }
+                f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._write_meta(meta)
+
+        for path in old_files:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        log.info(f"compacted collection {self.name}: dropped {dead} deleted rows")
+
+        self._clear_state()
+        self._refresh()
+
+    def _set_dimension(self, dimension: int):
+        if self.meta["dimension"] is None:
+            self._write_meta({**self.meta, "dimension": dimension})
+            self._refresh()
+        elif self.meta["dimension"] != dimension:
+            raise ValueError(
+                f"Embedding dimension {dimension} does not match collection "
+                f"dimensionality {self.meta['dimension']}"
+            )
+
+    ####################################
+    # HNSW
+    ####################################
+
+    def _get_index(self):
+        if not self.hnsw or len(self.positions) < max(self.hnsw_min_size, 1):
+            return None
+        if self.index is None:
+            self._load_index()
+        return self.index
+
+    def _add_to_index(self, rows: list[int]):
+        rows = [row for row in rows if self.ids[row] is not None]
+        if self.index.get_max_elements() < len(self.ids):
+            self.index.resize_index(
+                max(len(self.ids), 2 * self.index.get_max_elements())
+            )
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = rows[start : start + BLOCK_ROWS]
+            self.index.add_items(
+                np.asarray(self.vectors[block], dtype=np.float32), np.asarray(block)
+            )
+
+    def _mark_deleted(self, rows: list[int]):
+        for row in rows:
+            try:
+                self.index.mark_deleted(row)
+            except RuntimeError:
+                # Never indexed or already marked
+                pass
+
+    def _load_index(self):
+        rows = len(self.ids)
+        path = self._generation_path("hnsw", "bin")
+        index = hnswlib.Index(space="l2", dim=self.meta["dimension"])
+        try:
+            with open(self._generation_path("hnsw", "json"), "r") as f:
+                indexed_rows = json.load(f)["rows"]
+            if indexed_rows > rows:
+                raise ValueError("index covers unknown rows")
+            index.load_index(path, max_elements=max(rows, 1))
+        except (FileNotFoundError, RuntimeError, ValueError, KeyError) as e:
+            log.debug(f"building the HNSW index of {self.name}: {e!r}")
+            index.init_index(
+                max_elements=max(rows, 1),
+                ef_construction=HNSW_EF_CONSTRUCTION,
+                M=HNSW_M,
+            )
+            indexed_rows = 0
+
+        self.index = index
+        self.index_rows = rows
+        self.index_saved_rows = indexed_rows
+        # Catch up with the rows written since the index was saved
+        self._add_to_index(list(range(indexed_rows, rows)))
+        self._mark_deleted(
+            [row for row in range(indexed_rows) if self.ids[row] is None]
+        )
+        if rows != indexed_rows:
+            self._save_index()
+
+    def _update_index(self, deleted_rows: list[int]):
+        rows = len(self.ids)
+        self._add_to_index(list(range(self.index_rows, rows)))
+        self.index_rows = rows
+        self._mark_deleted(deleted_rows)
+
+        if rows - self.index_saved_rows >= max(self.index_saved_rows // 10, 1024):
+            self._save_index()
+
+    def _save_index(self):
+        path = self._generation_path("hnsw", "bin")
+        tmp_suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        self.index.save_index(f"{path}.{tmp_suffix}")
+        os.replace(f"{path}.{tmp_suffix}", path)
+
+        state_path = self._generation_path("hnsw", "json")
+        with open(f"{state_path}.{tmp_suffix}", "w") as f:
+            json.dump({"rows": self.index_rows}, f)
+        os.replace(f"{state_path}.{tmp_suffix}", state_path)
+        self.index_saved_rows = self.index_rows
+
+    ####################################
+    # Search
+    ####################################
+
+    def _search(
+        self, query: np.ndarray, k: int, rows: Optional[np.ndarray]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Exact k nearest rows (of rows, default all) by squared L2 distance,
+        computed as |x|^2 - 2 x.q + |q|^2 block by block."""
+        query_norm = float(query @ query)
+        total = len(self.ids) if rows is None else len(rows)
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_distances = np.empty(0, dtype=np.float32)
+        for start in range(0, total, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, total)
+            if rows is None:
+                block_rows = np.arange(start, stop)
+                block = self.vectors[start:stop]
+            else:
+                block_rows = rows[start:stop]
+                block = self.vectors[block_rows]
+
+            distances = (
+                self.norms[block_rows]
+                - 2 * (np.asarray(block, dtype=np.float32) @ query)
+                + query_norm
+            )
+            best_rows = np.concatenate([best_rows, block_rows])
+            best_distances = np.concatenate([best_distances, distances])
+            if len(best_rows) > k:
+                top = np.argpartition(best_distances, k)[:k]
+                best_rows, best_distances = best_rows[top], best_distances[top]
+
+        order = np.argsort(best_distances, kind="stable")
+        order = order[np.isfinite(best_distances[order])]
+        return best_rows[order], np.maximum(best_distances[order], 0)
+
+    def _select_rows(
+        self, ids: Optional[Sequence[str]], where: Optional[dict]
+    ) -> list[int]:
+        if ids is not None:
+            rows = sorted(self.positions[id] for id in set(ids) if id in self.positions)
+        else:
+            rows = [row for row, id in enumerate(self.ids) if id is not None]
+        if where:
+            rows = [row for row in rows if match_where(self.metadatas[row], where)]
+        return rows
+
+    def _get_fields(self, rows, include) -> dict:
+        return {
+            "embeddings": (
+                np.asarray(self.vectors[rows], dtype=np.float32).tolist()
+                if "embeddings" in include and len(rows)
+                else ([] if "embeddings" in include else None)
+            ),
+            "documents": (
+                [self.documents[row] for row in rows]
+                if "documents" in include
+                else None
+            ),
+            "metadatas": (
+                [self.metadatas[row] for row in rows]
+                if "metadatas" in include
+                else None
+            ),
+        }
+
+    ####################################
+    # VectorCollection
+    ####################################
+
+    def count(self) -> int:
+        with self.lock:
+            self._refresh()
+            return len(self.positions)
+
+    def _write(self, ids, embeddings, documents, metadatas, upsert: bool):
+        ids = list(ids)
+        if len(set(ids)) != len(ids):
+            raise ValueError("Expected IDs to be unique")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not ids:
+            return
+        if embeddings.ndim != 2 or len(embeddings) != len(ids):
+            raise ValueError("Expected one embedding per ID")
+
+        with self.lock, self._file_lock():
+            self._refresh()
+            self._set_dimension(embeddings.shape[1])
+
+            records, rows = [], []
+            for i, id in enumerate(ids):
+                document = documents[i] if documents is not None else None
+                metadata = metadatas[i] if metadatas is not None else None
+
+                row = self.positions.get(id)
+                if row is not None:
+                    if not upsert:
+                        log.debug(f"add of existing id {id} to {self.name} ignored")
+                        continue
+                    records.append({"delete": id})
+                    if documents is None:
+                        document = self.documents[row]
+                    if metadatas is None:
+                        metadata = self.metadatas[row]
+
+                records.append({"id": id, "document": document, "metadata": metadata})
+                rows.append(i)
+
+            if records:
+                self._append(records, embeddings[rows])
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, upsert=False)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, upsert=True)
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = DEFAULT_GET_INCLUDE,
+    ) -> dict:
+        with self.lock:
+            self._refresh()
+            rows = self._select_rows(ids, where)
+            start = offset or 0
+            rows = rows[start : start + limit if limit is not None else None]
+            return {
+                "ids": [self.ids[row] for row in rows],
+                **self._get_fields(rows, include),
+                "included": list(include),
+            }
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Optional[dict] = None,
+        include: Sequence[str] = DEFAULT_QUERY_INCLUDE,
+    ) -> dict:
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        result = {"ids": [], "distances": [], "documents": [], "metadatas": []}
+        result["embeddings"] = []
+
+        with self.lock:
+            self._refresh()
+            if self.meta["dimension"] is not None and (
+                queries.shape[1] != self.meta["dimension"]
+            ):
+                raise ValueError(
+                    f"Embedding dimension {queries.shape[1]} does not match "
+                    f"collection dimensionality {self.meta['dimension']}"
+                )
+
+            rows = None
+            if where:
+                rows = np.asarray(self._select_rows(None, where), dtype=np.int64)
+            index = self._get_index() if rows is None else None
+            k = min(n_results, len(self.positions) if rows is None else len(rows))
+
+            for query in queries:
+                top_rows = np.empty(0, dtype=np.int64)
+                distances = np.empty(0, dtype=np.float32)
+                if k > 0 and index is not None:
+                    try:
+                        index.set_ef(max(HNSW_EF_SEARCH, k))
+                        labels, found = index.knn_query(query, k=k)
+                        top_rows, distances = labels[0].astype(np.int64), found[0]
+                    except RuntimeError as e:
+                        log.warning(f"HNSW search of {self.name} failed: {e}")
+                        index = None
+                if k > 0 and index is None:
+                    top_rows, distances = self._search(query, k, rows)
+
+                top_rows = top_rows.tolist()
+                fields = self._get_fields(top_rows, include)
+                result["ids"].append([self.ids[row] for row in top_rows])
+                result["distances"].append(distances.tolist())
+                for field in ["documents", "metadatas", "embeddings"]:
+                    result[field].append(fields[field])
+
+        for field in ["distances", "documents", "metadatas", "embeddings"]:
+            if field not in include:
+                result[field] = None
+        result["included"] = list(include)
+        return result
+
+    def delete(self, ids=None, where=None):
+        with self.lock, self._file_lock():
+            self._refresh()
+            records = [
+                {"delete": self.ids[row]} for row in self._select_rows(ids, where)
+            ]
+            if records:
+                self._append(records)
+
+
+class FlatClient(VectorDBClient):
+    """In-process vector store: a memory-mapped float32 (or float16) matrix per
+    collection, searched exactly with NumPy or, from hnsw_min_size records, with an
+    HNSW graph (hnswlib, installed with chromadb). Records and the matrix live on
+    disk under directory; only ids, documents, metadatas and row norms are kept in
+    memory."""
+
+    def __init__(
+        self,
+        directory: str,
+        dtype: str = "float32",
+        hnsw: bool = False,
+        hnsw_min_size: int = 10000,
+    ):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported vector dtype {dtype}")
+        if hnsw and hnswlib is None:
+            log.warning("hnswlib is not installed, using exact search only")
+
+        self.directory = directory
+        self.dtype = dtype
+        self.hnsw = hnsw
+        self.hnsw_min_size = hnsw_min_size
+        self.lock = threading.Lock()
+        self.collections: dict[str, FlatCollection] = {}
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _get(self, name: str) -> FlatCollection:
+        validate_collection_name(name)
+        with self.lock:
+            collection = self.collections.get(name)
+            if collection is None:
+                collection = FlatCollection(
+                    self.directory, name, self.dtype, self.hnsw, self.hnsw_min_size
+                )
+                self.collections[name] = collection
+            return collection
+
+    def _exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.directory, name, "meta.json"))
+
+    def get_collection(self, name: str) -> FlatCollection:
+        collection = self._get(name)
+        if not self._exists(name):
+            raise ValueError(f"Collection {name} does not exist.")
+        return collection
+
+    def create_collection(self, name: str) -> FlatCollection:
+        collection = self._get(name)
+        os.makedirs(collection.directory, exist_ok=True)
+
+        meta = {
+            "id": uuid.uuid4().hex,
+            "generation": 0,
+            "dimension": None,
+            "dtype": self.dtype,
+        }
+        tmp_path = collection._path(f"meta.json.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        try:
+            # Fails when the collection exists, also across processes
+            os.link(tmp_path, collection._path("meta.json"))
+        except FileExistsError:
+            raise CollectionExistsError(f"Collection {name} already exists")
+        finally:
+            os.remove(tmp_path)
+        return collection
+
+    def get_or_create_collection(self, name: str) -> FlatCollection:
+        try:
+            return self.create_collection(name)
+        except CollectionExistsError:
+            return self.get_collection(name)
+
+    def delete_collection(self, name: str):
+        collection = self.get_collection(name)
+        with collection.lock:
+            shutil.rmtree(collection.directory, ignore_errors=True)
+            collection._clear_state()
+
+    def list_collections(self) -> list[FlatCollection]:
+        return [
+            self._get(name)
+            for name in sorted(os.listdir(self.directory))
+            if COLLECTION_NAME_PATTERN.match(name) and self._exists(name)
+        ]
+
+    def reset(self):
+        for collection in self.list_collections():
+            self.delete_collection(collection.name)
@@ -0,0 +1,106 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Sequence
+
+
+# Fields returned by get() and query() when include is not given, as in Chroma
+DEFAULT_GET_INCLUDE = ("metadatas", "documents")
+DEFAULT_QUERY_INCLUDE = ("metadatas", "documents", "distances")
+
+
+class CollectionExistsError(ValueError):
+    pass
+
+
+class VectorCollection(ABC):
+    """A named set of (id, embedding, document, metadata) records.
+
+    The API is the subset of the Chroma collection API the RAG code uses, with the
+    same result shapes: get() returns {"ids": [...], "<field>": [...]} and query()
+    the same with one list per query embedding. Distances are squared L2 (lower is
+    closer), Chroma's default. Fields that were not included are None.
+
+    where filters use Chroma's syntax: {"key": value}, operators $eq, $ne, $gt,
+    $gte, $lt, $lte, $in and $nin, combined with $and / $or.
+    """
+
+    name: str
+
+    @abstractmethod
+    def count(self) -> int:
+        pass
+
+    @abstractmethod
+    def add(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Optional[Sequence[str]] = None,
+        metadatas: Optional[Sequence[dict]] = None,
+    ):
+        """Add records; ids that already exist are left unchanged."""
+
+    @abstractmethod
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Optional[Sequence[str]] = None,
+        metadatas: Optional[Sequence[dict]] = None,
+    ):
+        """Add records or replace the existing ones; documents and metadatas that
+        are not given are kept."""
+
+    @abstractmethod
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[dict] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = DEFAULT_GET_INCLUDE,
+    ) -> dict:
+        """Records by id and / or metadata filter, all records without either.
+        Unknown ids are skipped and the order of the result is unspecified."""
+
+    @abstractmethod
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Optional[dict] = None,
+        include: Sequence[str] = DEFAULT_QUERY_INCLUDE,
+    ) -> dict:
+        """The n_results nearest records of each query embedding, closest first."""
+
+    @abstractmethod
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[dict] = None):
+        pass
+
+
+class VectorDBClient(ABC):
+    """Collections by name. Missing collections raise ValueError, like Chroma."""
+
+    @abstractmethod
+    def get_collection(self, name: str) -> VectorCollection:
+        pass
+
+    @abstractmethod
+    def create_collection(self, name: str) -> VectorCollection:
+        """Create a collection, raising CollectionExistsError when it already
+        exists."""
+
+    @abstractmethod
+    def get_or_create_collection(self, name: str) -> VectorCollection:
+        pass
+
+    @abstractmethod
+    def delete_collection(self, name: str):
+        pass
+
+    @abstractmethod
+    def list_collections(self) -> list[VectorCollection]:
+        pass
+
+    @abstractmethod
+    def reset(self):
+        """Delete every collection."""
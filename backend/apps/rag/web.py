@@ -0,0 +1,386 @@
+import time
+import asyncio
+import hashlib
+import codecs
+import logging
+import threading
+import urllib.parse
+
+from html.parser import HTMLParser
+from typing import Iterator, Optional, Sequence
+
+import aiohttp
+from langchain_core.documents import Document
+
+from apps.rag.disk_cache import DiskCache
+from config import (
+    SRC_LOG_LEVELS,
+    RAG_WEB_FETCH_TIMEOUT,
+    RAG_WEB_FETCH_URL_TIMEOUT,
+    RAG_WEB_FETCH_MAX_SIZE,
+    RAG_WEB_FETCH_PER_HOST,
+    ENABLE_RAG_WEB_PAGE_CACHE,
+    RAG_WEB_PAGE_CACHE_MAX_SIZE,
+    RAG_WEB_PAGE_CACHE_DIR,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.5",
+    "Accept-Language": "en-US,en;q=0.5",
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HTMLTextParser(HTMLParser):
+    """Incremental HTML to text conversion: feed() decoded chunks as they arrive,
+    then read text and the title / description / language metadata."""
+
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+    BLOCK_TAGS = {
+        "p",
+        "div",
+        "br",
+        "li",
+        "tr",
+        "section",
+        "article",
+        "header",
+        "footer",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "pre",
+        "blockquote",
+        "table",
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self.skip_depth = 0
+        self.in_title = False
+        self.title = ""
+        self.description: Optional[str] = None
+        self.language: Optional[str] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "html":
+            self.language = dict(attrs).get("lang") or self.language
+        elif tag == "title":
+            self.in_title = True
+        elif tag == "meta":
+            attrs = dict(attrs)
+            if (attrs.get("name") or "").lower() == "description":
+                self.description = attrs.get("content")
+
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self.in_title = False
+        if tag in self.SKIP_TAGS and self.skip_depth > 0:
+            self.skip_depth -= 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title += data
+        elif self.skip_depth == 0:
+            self.parts.append(data)
+
+    def get_text(self) -> str:
+        lines = (line.strip() for line in "".join(self.parts).splitlines())
+        return "\n".join(line for line in lines if line)
+
+    def get_metadata(self) -> dict:
+        metadata = {}
+        if self.title.strip():
+            metadata["title"] = self.title.strip()
+        if self.description is not None:
+            metadata["description"] = self.description
+        metadata["language"] = self.language or "No language found."
+        return metadata
+
+
+class WebFetcher:
+    """Concurrent page fetcher on a shared aiohttp connection pool.
+
+    The session lives on an event loop in a background thread, so synchronous
+    endpoints and job workers share its connections (at most per_host per host).
+    Responses are read in chunks, capped at max_size bytes and converted to text
+    while they stream in.
+
+    With a page cache, converted pages are stored with their ETag / Last-Modified
+    validators and later requests for the same URL are conditional; a 304 answer
+    is served from the cache.
+    """
+
+    def __init__(
+        self,
+        timeout: float = RAG_WEB_FETCH_TIMEOUT,
+        url_timeout: float = RAG_WEB_FETCH_URL_TIMEOUT,
+        max_size: int = RAG_WEB_FETCH_MAX_SIZE * 1024 * 1024,
+        per_host: int = RAG_WEB_FETCH_PER_HOST,
+        page_cache: Optional[DiskCache] = None,
+    ):
+        self.timeout = timeout
+        self.url_timeout = url_timeout
+        self.max_size = max_size
+        self.per_host = per_host
+        self.page_cache = page_cache
+
+        self.lock = threading.Lock()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        # host -> (semaphore, number of fetches using it), only used on the loop
+        self.hosts: dict[str, tuple[asyncio.Semaphore, int]] = {}
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="rag-web-fetcher", daemon=True
+                ).start()
+                self.loop = loop
+            return self.loop
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Only called on the fetcher loop
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0, ttl_dns_cache=300),
+                headers=DEFAULT_HEADERS,
+            )
+        return self.session
+
+    async def _fetch_url_per_host(
+        self, url: str, verify_ssl: bool
+    ) -> Optional[Document]:
+        # Limited here rather than by the connector, so that the per-URL deadline
+        # starts when the request is sent and not while it waits for its host
+        host = urllib.parse.urlparse(url).netloc
+        semaphore, users = self.hosts.get(host, (asyncio.Semaphore(self.per_host), 0))
+        self.hosts[host] = (semaphore, users + 1)
+        try:
+            async with semaphore:
+                return await self._fetch_url(url, verify_ssl)
+        finally:
+            semaphore, users = self.hosts[host]
+            if users <= 1:
+                del self.hosts[host]
+            else:
+                self.hosts[host] = (semaphore, users - 1)
+
+    def _get_page_key(self, url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    async def _get_cached_page(self, url: str) -> Optional[dict]:
+        if self.page_cache is None:
+            return None
+        entry = await asyncio.get_running_loop().run_in_executor(
+            None, self.page_cache.get, self._get_page_key(url)
+        )
+        # Keys are hashes, make sure the entry is for this URL
+        if entry is None or entry.get("url") != url:
+            return None
+        return entry
+
+    async def _cache_page(self, url: str, response, document: Document):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if self.page_cache is None or (etag is None and last_modified is None):
+            return
+
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "page_content": document.page_content,
+            "metadata": document.metadata,
+        }
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.page_cache.set, self._get_page_key(url), entry
+            )
+        except Exception as e:
+            log.warning(f"caching {url} failed: {e}")
+
+    async def _fetch_url(self, url: str, verify_ssl: bool) -> Optional[Document]:
+        headers = {}
+        cached = await self._get_cached_page(url)
+        if cached is not None:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        session = self._get_session()
+        async with session.get(
+            url,
+            headers=headers,
+            ssl=None if verify_ssl else False,
+            timeout=aiohttp.ClientTimeout(total=self.url_timeout),
+        ) as response:
+            if response.status == 304 and cached is not None:
+                log.debug(f"{url} not modified, using the cached page")
+                return Document(
+                    page_content=cached["page_content"], metadata=cached["metadata"]
+                )
+            response.raise_for_status()
+
+            content_type = response.content_type or ""
+            if not content_type.startswith("text/") and "xml" not in content_type:
+                log.warning(f"skipping {url}: unsupported content type {content_type}")
+                return None
+
+            try:
+                decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(
+                    errors="replace"
+                )
+            except LookupError:
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+            parser = HTMLTextParser() if "html" in content_type else None
+            parts: list[str] = []
+            size = 0
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                chunk = chunk[: self.max_size - size]
+                size += len(chunk)
+
+                text = decoder.decode(chunk)
+                if parser is not None:
+                    parser.feed(text)
+                else:
+                    parts.append(text)
+
+                if size >= self.max_size:
+                    log.warning(f"truncated {url} at {self.max_size} bytes")
+                    break
+
+            text = decoder.decode(b"", final=True)
+            if parser is not None:
+                parser.feed(text)
+                parser.close()
+                document = Document(
+                    page_content=parser.get_text(),
+                    metadata={"source": url, **parser.get_metadata()},
+                )
+            else:
+                parts.append(text)
+                document = Document(
+                    page_content="".join(parts), metadata={"source": url}
+                )
+
+            await self._cache_page(url, response, document)
+            return document
+
+    async def _fetch(
+        self, urls: Sequence[str], verify_ssl: bool, concurrent_requests: int
+    ) -> list[Document]:
+        semaphore = asyncio.Semaphore(max(concurrent_requests, 1))
+
+        async def fetch(url: str) -> Optional[Document]:
+            async with semaphore:
+                return await self._fetch_url_per_host(url, verify_ssl)
+
+        start = time.monotonic()
+        tasks = {asyncio.ensure_future(fetch(url)): url for url in urls}
+        done, pending = await asyncio.wait(tasks, timeout=self.timeout)
+
+        # Past the deadline, return what has been fetched so far
+        for task in pending:
+            task.cancel()
+        if pending:
+            log.warning(
+                f"web fetch deadline of {self.timeout}s hit, dropping "
+                f"{len(pending)}/{len(urls)} pages"
+            )
+
+        documents = {}
+        for task in done:
+            url = tasks[task]
+            if task.exception() is not None:
+                log.error(f"Error loading {url}: {task.exception()!r}")
+            elif task.result() is not None:
+                documents[url] = task.result()
+
+        log.info(
+            f"fetched {len(documents)}/{len(urls)} pages in "
+            f"{time.monotonic() - start:.2f}s"
+        )
+        return [documents[url] for url in urls if url in documents]
+
+    def close(self):
+        if self.loop is None:
+            return
+        if self.session is not None:
+            asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop = None
+        self.session = None
+
+    def fetch(
+        self,
+        urls: Sequence[str],
+        verify_ssl: bool = True,
+        concurrent_requests: int = 10,
+    ) -> list[Document]:
+        """Fetch pages concurrently and return the documents of the ones that
+        succeeded within the deadline, in the order of urls. Blocks the calling
+        thread, which must not be the fetcher loop."""
+        # Duplicate URLs are fetched once
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return []
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._fetch(urls, verify_ssl, concurrent_requests), self._get_loop()
+        )
+        return future.result()
+
+
+WEB_PAGE_CACHE: Optional[DiskCache] = (
+    DiskCache(RAG_WEB_PAGE_CACHE_DIR, RAG_WEB_PAGE_CACHE_MAX_SIZE * 1024 * 1024)
+    if ENABLE_RAG_WEB_PAGE_CACHE
+    else None
+)
+
+WEB_FETCHER = WebFetcher(page_cache=WEB_PAGE_CACHE)
+
+
+class WebPageLoader:
+    """Document loader for web pages fetched by WEB_FETCHER; failed pages are
+    logged and skipped."""
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        verify_ssl: bool = True,
+        concurrent_requests: int = 10,
+    ):
+        self.urls = [urls] if isinstance(urls, str) else list(urls)
+        self.verify_ssl = verify_ssl
+        self.concurrent_requests = concurrent_requests
+
+    def lazy_load(self) -> Iterator[Document]:
+        yield from self.load()
+
+    def load(self) -> list[Document]:
+        return WEB_FETCHER.fetch(self.urls, self.verify_ssl, self.concurrent_requests)
@@ -105,6 +105,16 @@ class DocumentsTable:
         except Exception:
             return None
 
+    def get_docs_by_collection_name(self, collection_name: str) -> list[DocumentModel]:
+        with get_db() as db:
+
+            return [
+                DocumentModel.model_validate(doc)
+                for doc in db.query(Document)
+                .filter_by(collection_name=collection_name)
+                .all()
+            ]
+
     def get_docs(self) -> list[DocumentModel]:
         with get_db() as db:
 
@@ -153,6 +163,24 @@ class DocumentsTable:
             log.exception(e)
             return None
 
+    def update_doc_collection_name_by_name(
+        self, name: str, collection_name: str
+    ) -> Optional[DocumentModel]:
+        try:
+            with get_db() as db:
+
+                db.query(Document).filter_by(name=name).update(
+                    {
+                        "collection_name": collection_name,
+                        "timestamp": int(time.time()),
+                    }
+                )
+                db.commit()
+                return self.get_doc_by_name(name)
+        except Exception as e:
+            log.exception(e)
+            return None
+
     def delete_doc_by_name(self, name: str) -> bool:
         try:
             with get_db() as db:
@@ -163,5 +191,15 @@ class DocumentsTable:
         except Exception:
             return False
 
+    def delete_doc_by_collection_name(self, collection_name: str) -> bool:
+        try:
+            with get_db() as db:
+
+                db.query(Document).filter_by(collection_name=collection_name).delete()
+                db.commit()
+                return True
+        except Exception:
+            return False
+
 
 Documents = DocumentsTable()
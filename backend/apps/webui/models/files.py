@@ -25,6 +25,8 @@ class File(Base):
     id = Column(String, primary_key=True)
     user_id = Column(String)
     filename = Column(Text)
+    # sha256 of the content; files with the same hash share one blob on disk
+    hash = Column(String, index=True)
     meta = Column(JSONField)
     created_at = Column(BigInteger)
 
@@ -33,6 +35,7 @@ class FileModel(BaseModel):
     id: str
     user_id: str
     filename: str
+    hash: Optional[str] = None
     meta: dict
     created_at: int  # timestamp in epoch
 
@@ -48,6 +51,7 @@ class FileModelResponse(BaseModel):
     id: str
     user_id: str
     filename: str
+    hash: Optional[str] = None
     meta: dict
     created_at: int  # timestamp in epoch
 
@@ -55,6 +59,7 @@ class FileModelResponse(BaseModel):
 class FileForm(BaseModel):
     id: str
     filename: str
+    hash: Optional[str] = None
     meta: dict = {}
 
 
@@ -98,6 +103,19 @@ class FilesTable:
 
             return [FileModel.model_validate(file) for file in db.query(File).all()]
 
+    def get_file_count_by_hash(self, hash: str) -> int:
+        """Number of files referencing the blob with the given hash."""
+        with get_db() as db:
+
+            return db.query(File).filter_by(hash=hash).count()
+
+    def get_file_count_by_hash_prefix(self, prefix: str) -> int:
+        """Number of files whose hash starts with prefix, e.g. a default
+        collection name (hash[:63])."""
+        with get_db() as db:
+
+            return db.query(File).filter(File.hash.startswith(prefix)).count()
+
     def delete_file_by_id(self, id: str) -> bool:
 
         with get_db() as db:
@@ -0,0 +1,244 @@
+from pydantic import BaseModel, ConfigDict
+from typing import Optional
+import time
+import uuid
+import logging
+
+from sqlalchemy import Column, String, BigInteger, Integer, Text
+
+from apps.webui.internal.db import JSONField, Base, get_db
+
+from config import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MODELS"])
+
+####################
+# Job DB Schema
+####################
+
+
+class Job(Base):
+    __tablename__ = "job"
+
+    id = Column(String, primary_key=True)
+    user_id = Column(String)
+    type = Column(String)
+    key = Column(String, index=True)
+    status = Column(String, index=True)
+    priority = Column(Integer)
+    payload = Column(JSONField)
+    progress = Column(JSONField)
+    result = Column(JSONField)
+    error = Column(Text)
+
+    # Worker running the job and the last time it confirmed it still does
+    worker_id = Column(String)
+    heartbeat_at = Column(BigInteger)
+
+    created_at = Column(BigInteger)
+    started_at = Column(BigInteger)
+    finished_at = Column(BigInteger)
+
+
+class JobModel(BaseModel):
+    id: str
+    user_id: str
+    type: str
+    key: Optional[str] = None
+    status: str
+    priority: int
+    payload: dict = {}
+    progress: Optional[dict] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+    worker_id: Optional[str] = None
+    heartbeat_at: Optional[int] = None  # timestamp in epoch
+
+    created_at: int  # timestamp in epoch
+    started_at: Optional[int] = None  # timestamp in epoch
+    finished_at: Optional[int] = None  # timestamp in epoch
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+####################
+# Forms
+####################
+
+
+class JobStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobsTable:
+
+    def insert_new_job(
+        self,
+        user_id: str,
+        type: str,
+        payload: dict,
+        priority: int,
+        key: Optional[str] = None,
+    ) -> Optional[JobModel]:
+        with get_db() as db:
+
+            job = JobModel(
+                **{
+                    "id": str(uuid.uuid4()),
+                    "user_id": user_id,
+                    "type": type,
+                    "key": key,
+                    "status": JobStatus.PENDING,
+                    "priority": priority,
+                    "payload": payload,
+                    "created_at": int(time.time()),
+                }
+            )
+
+            try:
+                result = Job(**job.model_dump())
+                db.add(result)
+                db.commit()
+                db.refresh(result)
+                if result:
+                    return JobModel.model_validate(result)
+                else:
+                    return None
+            except Exception as e:
+                log.error(f"Error creating job: {e}")
+                return None
+
+    def get_job_by_id(self, id: str) -> Optional[JobModel]:
+        with get_db() as db:
+
+            try:
+                job = db.get(Job, id)
+                return JobModel.model_validate(job)
+            except Exception:
+                return None
+
+    def get_job_by_key(self, key: str) -> Optional[JobModel]:
+        """Latest pending or running job with the given idempotency key."""
+        with get_db() as db:
+
+            job = (
+                db.query(Job)
+                .filter(
+                    Job.key == key,
+                    Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING]),
+                )
+                .order_by(Job.created_at.desc())
+                .first()
+            )
+            return JobModel.model_validate(job) if job else None
+
+    def get_jobs_by_user_id(
+        self, user_id: str, skip: int = 0, limit: int = 50
+    ) -> list[JobModel]:
+        with get_db() as db:
+
+            return [
+                JobModel.model_validate(job)
+                for job in db.query(Job)
+                .filter_by(user_id=user_id)
+                .order_by(Job.created_at.desc())
+                .offset(skip)
+                .limit(limit)
+                .all()
+            ]
+
+    def get_jobs_by_status(self, statuses: list[str]) -> list[JobModel]:
+        with get_db() as db:
+
+            return [
+                JobModel.model_validate(job)
+                for job in db.query(Job)
+                .filter(Job.status.in_(statuses))
+                .order_by(Job.priority, Job.created_at)
+                .all()
+            ]
+
+    def update_job_by_id(self, id: str, updated: dict) -> Optional[JobModel]:
+        with get_db() as db:
+
+            try:
+                db.query(Job).filter_by(id=id).update(updated)
+                db.commit()
+
+                job = db.get(Job, id)
+                return JobModel.model_validate(job)
+            except Exception as e:
+                log.error(f"Error updating job {id}: {e}")
+                return None
+
+    def update_job_if(self, id: str, updated: dict, **conditions) -> bool:
+        """Update the job only while its columns match conditions, in a single
+        UPDATE so that concurrent workers cannot both succeed."""
+        with get_db() as db:
+
+            try:
+                count = (
+                    db.query(Job)
+                    .filter_by(id=id, **conditions)
+                    .update(updated, synchronize_session=False)
+                )
+                db.commit()
+                return count == 1
+            except Exception as e:
+                log.error(f"Error updating job {id}: {e}")
+                return False
+
+    def touch_jobs(self, ids: list[str], worker_id: str) -> int:
+        """Renew the lease of the given jobs still run by worker_id."""
+        with get_db() as db:
+
+            count = (
+                db.query(Job)
+                .filter(
+                    Job.id.in_(ids),
+                    Job.worker_id == worker_id,
+                    Job.status == JobStatus.RUNNING,
+                )
+                .update({"heartbeat_at": int(time.time())}, synchronize_session=False)
+            )
+            db.commit()
+            return count
+
+    def reset_expired_jobs(self, expired_before: int) -> int:
+        """Put running jobs whose worker has not renewed the lease since
+        expired_before (e.g. because it died) back to pending."""
+        with get_db() as db:
+
+            count = (
+                db.query(Job)
+                .filter(
+                    Job.status == JobStatus.RUNNING,
+                    Job.heartbeat_at.is_(None) | (Job.heartbeat_at < expired_before),
+                )
+                .update(
+                    {"status": JobStatus.PENDING, "worker_id": None},
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            return count
+
+    def delete_job_by_id(self, id: str) -> bool:
+        with get_db() as db:
+
+            try:
+                db.query(Job).filter_by(id=id).delete()
+                db.commit()
+
+                return True
+            except Exception:
+                return False
+
+
+Jobs = JobsTable()
@@ -101,6 +101,11 @@ class MemoriesTable:
             except Exception:
                 return None
 
+    def get_memory_user_ids(self) -> list[str]:
+        with get_db() as db:
+
+            return [user_id for (user_id,) in db.query(Memory.user_id).distinct().all()]
+
     def get_memory_by_id(self, id: str) -> Optional[MemoryModel]:
         with get_db() as db:
 
@@ -0,0 +1,205 @@
+from pydantic import BaseModel, ConfigDict
+from typing import Optional
+import time
+import logging
+
+from sqlalchemy import Column, String, BigInteger, Integer, Text, Index, func
+
+from apps.webui.internal.db import Base, get_db
+
+from config import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MODELS"])
+
+####################
+# QA DB Schema
+####################
+
+
+class QAPair(Base):
+    __tablename__ = "qa_pair"
+
+    # Global question number, what the chat UI asks /process/qa_answer for
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    collection_name = Column(String)
+    file_id = Column(String)
+    qa_index = Column(Integer)
+    question = Column(Text)
+    answer = Column(Text)
+    created_at = Column(BigInteger)
+    # Set past every other revision of the table whenever the pair changes
+    revision = Column(BigInteger)
+
+    __table_args__ = (
+        Index(
+            "ix_qa_pair_collection_file",
+            "collection_name",
+            "file_id",
+            "qa_index",
+            unique=True,
+        ),
+    )
+
+
+class QACollection(Base):
+    """Collections whose QA files have been parsed into qa_pair."""
+
+    __tablename__ = "qa_collection"
+
+    collection_name = Column(String, primary_key=True)
+    updated_at = Column(BigInteger)
+
+
+class QAPairModel(BaseModel):
+    id: int
+    collection_name: str
+    file_id: str
+    qa_index: int
+    question: str
+    answer: str
+    created_at: int  # timestamp in epoch
+    revision: Optional[int] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class QAPairsTable:
+    """Question / answer pairs parsed from the QA files of each collection."""
+
+    def replace_pairs(
+        self, collection_name: str, file_id: str, pairs: list[tuple[str, str]]
+    ) -> bool:
+        """Upsert the pairs of a file by (collection_name, file_id, qa_index), so a
+        pair keeps its id (the question number shown in the chat) across updates,
+        and delete the pairs past the end of the file."""
+        with get_db() as db:
+
+            try:
+                existing = {
+                    pair.qa_index: pair
+                    for pair in db.query(QAPair).filter_by(
+                        collection_name=collection_name, file_id=file_id
+                    )
+                }
+                revision = (db.query(func.max(QAPair.revision)).scalar() or 0) + 1
+                now = int(time.time())
+                for qa_index, (question, answer) in enumerate(pairs):
+                    pair = existing.pop(qa_index, None)
+                    if pair is None:
+                        db.add(
+                            QAPair(
+                                collection_name=collection_name,
+                                file_id=file_id,
+                                qa_index=qa_index,
+                                question=question,
+                                answer=answer,
+                                created_at=now,
+                                revision=revision,
+                            )
+                        )
+                    elif (pair.question, pair.answer) != (question, answer):
+                        pair.question = question
+                        pair.answer = answer
+                        pair.revision = revision
+
+                for pair in existing.values():
+                    db.delete(pair)
+                db.commit()
+                return True
+            except Exception as e:
+                log.error(f"Error storing QA pairs of {file_id}: {e}")
+                db.rollback()
+                return False
+
+    def get_pair_by_id(self, id: int) -> Optional[QAPairModel]:
+        with get_db() as db:
+
+            pair = db.get(QAPair, id)
+            return QAPairModel.model_validate(pair) if pair else None
+
+    def get_pairs_by_collection_names(
+        self, collection_names: list[str]
+    ) -> list[QAPairModel]:
+        with get_db() as db:
+
+            return [
+                QAPairModel.model_validate(pair)
+                for pair in db.query(QAPair)
+                .filter(QAPair.collection_name.in_(collection_names))
+                .order_by(QAPair.id)
+                .all()
+            ]
+
+    def get_collection_versions(self, collection_names: list[str]) -> dict[str, str]:
+        """A string per collection that changes whenever one of its pairs is added,
+        changed or deleted; collections without pairs are left out."""
+        with get_db() as db:
+
+            rows = (
+                db.query(
+                    QAPair.collection_name,
+                    func.count(QAPair.id),
+                    func.max(QAPair.id),
+                    func.max(QAPair.revision),
+                )
+                .filter(QAPair.collection_name.in_(collection_names))
+                .group_by(QAPair.collection_name)
+                .all()
+            )
+            return {
+                collection_name: f"{count}-{max_id}-{revision}"
+                for collection_name, count, max_id, revision in rows
+            }
+
+    def get_indexed_collection_names(self, collection_names: list[str]) -> set[str]:
+        with get_db() as db:
+
+            return {
+                collection.collection_name
+                for collection in db.query(QACollection).filter(
+                    QACollection.collection_name.in_(collection_names)
+                )
+            }
+
+    def set_collection_indexed(self, collection_name: str) -> bool:
+        with get_db() as db:
+
+            try:
+                db.merge(
+                    QACollection(
+                        collection_name=collection_name, updated_at=int(time.time())
+                    )
+                )
+                db.commit()
+                return True
+            except Exception as e:
+                log.error(f"Error updating QA collection {collection_name}: {e}")
+                return False
+
+    def delete_pairs_by_collection_name(self, collection_name: str) -> bool:
+        with get_db() as db:
+
+            try:
+                db.query(QAPair).filter_by(collection_name=collection_name).delete()
+                db.query(QACollection).filter_by(
+                    collection_name=collection_name
+                ).delete()
+                db.commit()
+                return True
+            except Exception:
+                return False
+
+    def delete_all_pairs(self) -> bool:
+        with get_db() as db:
+
+            try:
+                db.query(QAPair).delete()
+                db.query(QACollection).delete()
+                db.commit()
+                return True
+            except Exception:
+                return False
+
+
+QAPairs = QAPairsTable()
@@ -0,0 +1,96 @@
+from pydantic import BaseModel, ConfigDict
+from typing import Optional
+import time
+import logging
+
+from sqlalchemy import Column, String, BigInteger, Text
+
+from apps.webui.internal.db import Base, get_db
+
+from config import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MODELS"])
+
+####################
+# Scan Manifest DB Schema
+####################
+
+
+class ScanManifestEntry(Base):
+    __tablename__ = "scan_manifest"
+
+    path = Column(Text, primary_key=True)
+    size = Column(BigInteger)
+    mtime_ns = Column(BigInteger)
+    sha256 = Column(String)
+    collection_name = Column(String, index=True)
+    updated_at = Column(BigInteger)
+
+
+class ScanManifestEntryModel(BaseModel):
+    path: str
+    size: int
+    mtime_ns: int
+    sha256: str
+    collection_name: str
+    updated_at: int  # timestamp in epoch
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ScanManifestTable:
+    """What the last /scan indexed for every file under DOCS_DIR, so that files
+    whose size and mtime did not change are skipped without being read."""
+
+    def get_entries(self) -> dict[str, ScanManifestEntryModel]:
+        with get_db() as db:
+
+            return {
+                entry.path: ScanManifestEntryModel.model_validate(entry)
+                for entry in db.query(ScanManifestEntry).all()
+            }
+
+    def upsert_entry(
+        self, path: str, size: int, mtime_ns: int, sha256: str, collection_name: str
+    ) -> Optional[ScanManifestEntryModel]:
+        with get_db() as db:
+
+            try:
+                entry = ScanManifestEntry(
+                    path=path,
+                    size=size,
+                    mtime_ns=mtime_ns,
+                    sha256=sha256,
+                    collection_name=collection_name,
+                    updated_at=int(time.time()),
+                )
+                entry = db.merge(entry)
+                db.commit()
+                return ScanManifestEntryModel.model_validate(entry)
+            except Exception as e:
+                log.error(f"Error updating scan manifest for {path}: {e}")
+                return None
+
+    def delete_entry(self, path: str) -> bool:
+        with get_db() as db:
+
+            try:
+                db.query(ScanManifestEntry).filter_by(path=path).delete()
+                db.commit()
+                return True
+            except Exception:
+                return False
+
+    def delete_all_entries(self) -> bool:
+        with get_db() as db:
+
+            try:
+                db.query(ScanManifestEntry).delete()
+                db.commit()
+                return True
+            except Exception:
+                return False
+
+
+ScanManifest = ScanManifestTable()
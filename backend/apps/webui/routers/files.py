@@ -10,6 +10,7 @@ from fastapi import (
 )
 
 
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Union, Optional
 from pathlib import Path
@@ -27,12 +28,20 @@ from apps.webui.models.files import (
     FileModelResponse,
 )
 from utils.utils import get_verified_user, get_admin_user
+from utils.misc import save_file_with_sha256
 from constants import ERROR_MESSAGES
 
 from importlib import util
 import os
 import uuid
 import os, shutil, logging, re
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where blobs are only serialized within a process
+    fcntl = None
 
 
 from config import SRC_LOG_LEVELS, UPLOAD_DIR
@@ -44,6 +53,46 @@ log.setLevel(SRC_LOG_LEVELS["MODELS"])
 
 router = APIRouter()
 
+# Serializes moving blobs into place / removing them with the file rows that
+# reference them, so a blob is never removed while a new upload starts using it.
+# The thread lock covers one process, the lock file every worker sharing UPLOAD_DIR
+blob_thread_lock = threading.Lock()
+BLOB_LOCK_FILENAME = ".blobs.lock"
+
+
+@contextmanager
+def blob_lock():
+    with blob_thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(f"{UPLOAD_DIR}/{BLOB_LOCK_FILENAME}", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def get_blob_path(file_hash: str, filename: str) -> str:
+    # The extension is kept so that loaders and FileResponse still see the type
+    _, ext = os.path.splitext(filename)
+    return f"{UPLOAD_DIR}/{file_hash}{ext.lower()}"
+
+
+def release_blob(file: FileModel):
+    """Remove the blob of a deleted file once no other file references it."""
+    if not file.hash:
+        return
+
+    with blob_lock():
+        if Files.get_file_count_by_hash(file.hash) == 0:
+            try:
+                os.remove(file.meta["path"])
+            except FileNotFoundError:
+                pass
+
+
 ############################
 # Upload File
 ############################
@@ -60,28 +109,41 @@ def upload_file(file: UploadFile = File(...), user=Depends(get_verified_user)):
         id = str(uuid.uuid4())
         name = filename
         filename = f"{id}_{filename}"
-        file_path = f"{UPLOAD_DIR}/{filename}"
-
-        contents = file.file.read()
-        with open(file_path, "wb") as f:
-            f.write(contents)
-            f.close()
-
-        file = Files.insert_new_file(
-            user.id,
-            FileForm(
-                **{
-                    "id": id,
-                    "filename": filename,
-                    "meta": {
-                        "name": name,
-                        "content_type": file.content_type,
-                        "size": len(contents),
-                        "path": file_path,
-                    },
-                }
-            ),
-        )
+
+        # Stream to a temporary file, then store it under its hash so identical
+        # uploads share one blob
+        tmp_path = f"{UPLOAD_DIR}/.{id}.tmp"
+        try:
+            file_hash, size = save_file_with_sha256(file.file, tmp_path)
+            file_path = get_blob_path(file_hash, name)
+
+            with blob_lock():
+                if os.path.exists(file_path):
+                    os.remove(tmp_path)
+                else:
+                    os.replace(tmp_path, file_path)
+
+                file = Files.insert_new_file(
+                    user.id,
+                    FileForm(
+                        **{
+                            "id": id,
+                            "filename": filename,
+                            "hash": file_hash,
+                            "meta": {
+                                "name": name,
+                                "content_type": file.content_type,
+                                "size": size,
+                                "path": file_path,
+                            },
+                        }
+                    ),
+                )
+                if file is None and Files.get_file_count_by_hash(file_hash) == 0:
+                    os.remove(file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
         if file:
             return file
@@ -126,6 +188,8 @@ async def delete_all_files(user=Depends(get_admin_user)):
             if os.path.exists(folder):
                 # Iterate over all the files and directories in the specified directory
                 for filename in os.listdir(folder):
+                    if filename == BLOB_LOCK_FILENAME:
+                        continue
                     file_path = os.path.join(folder, filename)
                     try:
                         if os.path.isfile(file_path) or os.path.islink(file_path):
@@ -228,6 +292,7 @@ async def delete_file_by_id(id: str, user=Depends(get_verified_user)):
     if file:
         result = Files.delete_file_by_id(id)
         if result:
+            release_blob(file)
             return {"message": "File deleted successfully"}
         else:
             raise HTTPException(
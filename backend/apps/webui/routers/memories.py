@@ -9,10 +9,18 @@ import logging
 
 from apps.webui.models.memories import Memories, MemoryModel
 
-from utils.utils import get_verified_user
+from utils.utils import get_verified_user, get_admin_user
 from constants import ERROR_MESSAGES
 
-from config import SRC_LOG_LEVELS, CHROMA_CLIENT
+from apps.rag.jobs import JOB_QUEUE, JOB_PRIORITY_BULK
+from apps.rag.memories import (
+    get_memory_collection_name,
+    index_memories,
+    reset_memories,
+)
+from apps.rag.retrieval_cache import RETRIEVAL_CACHE
+from apps.rag.vector.connector import VECTOR_DB_CLIENT
+from config import SRC_LOG_LEVELS
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["MODELS"])
@@ -48,28 +56,23 @@ class MemoryUpdateModel(BaseModel):
     content: Optional[str] = None
 
 
+# Embedding and Chroma calls block, so these handlers are sync and run in the
+# threadpool instead of on the event loop
+
+
 @router.post("/add", response_model=Optional[MemoryModel])
-async def add_memory(
+def add_memory(
     request: Request,
     form_data: AddMemoryForm,
     user=Depends(get_verified_user),
 ):
     memory = Memories.insert_new_memory(user.id, form_data.content)
-    memory_embedding = request.app.state.EMBEDDING_FUNCTION(memory.content)
-
-    collection = CHROMA_CLIENT.get_or_create_collection(name=f"user-memory-{user.id}")
-    collection.upsert(
-        documents=[memory.content],
-        ids=[memory.id],
-        embeddings=[memory_embedding],
-        metadatas=[{"created_at": memory.created_at}],
-    )
-
+    index_memories(user.id, [memory], request.app.state.EMBEDDING_FUNCTION)
     return memory
 
 
 @router.post("/{memory_id}/update", response_model=Optional[MemoryModel])
-async def update_memory_by_id(
+def update_memory_by_id(
     memory_id: str,
     request: Request,
     form_data: MemoryUpdateModel,
@@ -80,18 +83,7 @@ async def update_memory_by_id(
         raise HTTPException(status_code=404, detail="Memory not found")
 
     if form_data.content is not None:
-        memory_embedding = request.app.state.EMBEDDING_FUNCTION(form_data.content)
-        collection = CHROMA_CLIENT.get_or_create_collection(
-            name=f"user-memory-{user.id}"
-        )
-        collection.upsert(
-            documents=[form_data.content],
-            ids=[memory.id],
-            embeddings=[memory_embedding],
-            metadatas=[
-                {"created_at": memory.created_at, "updated_at": memory.updated_at}
-            ],
-        )
+        index_memories(user.id, [memory], request.app.state.EMBEDDING_FUNCTION)
 
     return memory
 
@@ -107,11 +99,13 @@ class QueryMemoryForm(BaseModel):
 
 
 @router.post("/query")
-async def query_memory(
+def query_memory(
     request: Request, form_data: QueryMemoryForm, user=Depends(get_verified_user)
 ):
     query_embedding = request.app.state.EMBEDDING_FUNCTION(form_data.content)
-    collection = CHROMA_CLIENT.get_or_create_collection(name=f"user-memory-{user.id}")
+    collection = VECTOR_DB_CLIENT.get_or_create_collection(
+        name=get_memory_collection_name(user.id)
+    )
 
     results = collection.query(
         query_embeddings=[query_embedding],
@@ -125,23 +119,38 @@ async def query_memory(
 # ResetMemoryFromVectorDB
 ############################
 @router.get("/reset", response_model=bool)
-async def reset_memory_from_vector_db(
-    request: Request, user=Depends(get_verified_user)
-):
-    CHROMA_CLIENT.delete_collection(f"user-memory-{user.id}")
-    collection = CHROMA_CLIENT.get_or_create_collection(name=f"user-memory-{user.id}")
-
-    memories = Memories.get_memories_by_user_id(user.id)
-    for memory in memories:
-        memory_embedding = request.app.state.EMBEDDING_FUNCTION(memory.content)
-        collection.upsert(
-            documents=[memory.content],
-            ids=[memory.id],
-            embeddings=[memory_embedding],
-        )
+def reset_memory_from_vector_db(request: Request, user=Depends(get_verified_user)):
+    reset_memories(user.id, request.app.state.EMBEDDING_FUNCTION)
     return True
 
 
+############################
+# ReindexAllMemories
+############################
+
+
+class ReindexMemoriesForm(BaseModel):
+    user_ids: Optional[list[str]] = None
+
+
+@router.post("/reindex")
+def reindex_memories(form_data: ReindexMemoriesForm, user=Depends(get_admin_user)):
+    """Rebuild the memory collections of all users (or of user_ids) in a
+    background job; follow it with /rag/api/v1/jobs/{id}."""
+    job = JOB_QUEUE.submit(
+        user.id,
+        "memory_reindex",
+        {"user_ids": form_data.user_ids},
+        JOB_PRIORITY_BULK,
+    )
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=ERROR_MESSAGES.DEFAULT(),
+        )
+    return {"status": True, "job": job}
+
+
 ############################
 # DeleteMemoriesByUserId
 ############################
@@ -153,7 +162,8 @@ async def delete_memory_by_user_id(user=Depends(get_verified_user)):
 
     if result:
         try:
-            CHROMA_CLIENT.delete_collection(f"user-memory-{user.id}")
+            VECTOR_DB_CLIENT.delete_collection(get_memory_collection_name(user.id))
+            RETRIEVAL_CACHE.bump(get_memory_collection_name(user.id))
         except Exception as e:
             log.error(e)
         return True
@@ -171,10 +181,11 @@ async def delete_memory_by_id(memory_id: str, user=Depends(get_verified_user)):
     result = Memories.delete_memory_by_id_and_user_id(memory_id, user.id)
 
     if result:
-        collection = CHROMA_CLIENT.get_or_create_collection(
-            name=f"user-memory-{user.id}"
+        collection = VECTOR_DB_CLIENT.get_or_create_collection(
+            name=get_memory_collection_name(user.id)
         )
         collection.delete(ids=[memory_id])
+        RETRIEVAL_CACHE.bump(get_memory_collection_name(user.id))
         return True
 
     return False
@@ -6,7 +6,6 @@ import pkgutil
 from urllib.parse import urlparse
 
 import chromadb
-from chromadb import Settings
 from bs4 import BeautifulSoup
 from typing import TypeVar, Generic
 from pydantic import BaseModel
@@ -1058,6 +1057,29 @@ if CHROMA_HTTP_HEADERS:
 else:
     CHROMA_HTTP_HEADERS = None
 CHROMA_HTTP_SSL = os.environ.get("CHROMA_HTTP_SSL", "false").lower() == "true"
+
+# Vector database: "chroma" (the CHROMA_* settings above) or "flat", an in-process
+# store of memory-mapped float32 / float16 matrices under DATA_DIR/vector_db/flat,
+# searched exactly or, from FLAT_VECTOR_DB_HNSW_MIN_SIZE records in a collection,
+# with an HNSW graph
+VECTOR_DB = os.environ.get("VECTOR_DB", "chroma")
+FLAT_VECTOR_DB_PATH = f"{DATA_DIR}/vector_db/flat"
+FLAT_VECTOR_DB_DTYPE = os.environ.get("FLAT_VECTOR_DB_DTYPE", "float32")
+ENABLE_FLAT_VECTOR_DB_HNSW = (
+    os.environ.get("ENABLE_FLAT_VECTOR_DB_HNSW", "True").lower() == "true"
+)
+FLAT_VECTOR_DB_HNSW_MIN_SIZE = int(
+    os.environ.get("FLAT_VECTOR_DB_HNSW_MIN_SIZE", "10000")
+)
+
+# Collection handles are reused for this many seconds instead of being looked up
+# (an HTTP round-trip with a remote Chroma) on every request. Deletes and resets in
+# this process drop them immediately, the TTL bounds how long a collection another
+# worker deleted or re-created can be missed. 0 disables the cache
+VECTOR_DB_COLLECTION_CACHE_TTL = float(
+    os.environ.get("VECTOR_DB_COLLECTION_CACHE_TTL", "300")
+)
+
 # this uses the model defined in the Dockerfile ENV variable. If you dont use docker or docker based deployments such as k8s, the default embedding model will be used (sentence-transformers/all-MiniLM-L6-v2)
 
 RAG_TOP_K = PersistentConfig(
@@ -1075,6 +1097,49 @@ ENABLE_RAG_HYBRID_SEARCH = PersistentConfig(
     os.environ.get("ENABLE_RAG_HYBRID_SEARCH", "").lower() == "true",
 )
 
+# Number of collections queried in parallel and the time (in seconds) allowed
+# for each collection, counted from when its query starts, before its result is
+# dropped. A query that waited as long for a free worker is dropped too.
+RAG_COLLECTION_QUERY_CONCURRENCY = int(
+    os.environ.get("RAG_COLLECTION_QUERY_CONCURRENCY", "8")
+)
+RAG_COLLECTION_QUERY_TIMEOUT = float(
+    os.environ.get("RAG_COLLECTION_QUERY_TIMEOUT", "30")
+)
+
+# Number of chat requests allowed to run their RAG stage at the same time
+RAG_CONTEXT_CONCURRENCY = int(os.environ.get("RAG_CONTEXT_CONCURRENCY", "4"))
+
+# Retrieval result cache: max entries (0 disables it) and time to live in seconds
+RAG_RETRIEVAL_CACHE_SIZE = int(os.environ.get("RAG_RETRIEVAL_CACHE_SIZE", "1000"))
+RAG_RETRIEVAL_CACHE_TTL = float(os.environ.get("RAG_RETRIEVAL_CACHE_TTL", "600"))
+
+# How hybrid search fuses the BM25 and vector rankings ("rrf" or "weighted") and
+# the weight given to the BM25 side
+RAG_HYBRID_FUSION_METHOD = os.environ.get("RAG_HYBRID_FUSION_METHOD", "rrf").lower()
+RAG_HYBRID_BM25_WEIGHT = float(os.environ.get("RAG_HYBRID_BM25_WEIGHT", "0.5"))
+
+# Token budget of the retrieved context injected into the prompt (0, the default,
+# means no limit and keeps one context per file; with a budget the chunks of all
+# files are merged into one context), optional per-model overrides as a JSON
+# object {"model id": budget}, and the tiktoken encoding used to count tokens
+RAG_CONTEXT_TOKEN_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKEN_BUDGET", "0"))
+
+try:
+    RAG_CONTEXT_MODEL_TOKEN_BUDGETS = {
+        model: int(budget)
+        for model, budget in json.loads(
+            os.environ.get("RAG_CONTEXT_MODEL_TOKEN_BUDGETS", "{}")
+        ).items()
+    }
+except Exception as e:
+    print(f"Error loading RAG_CONTEXT_MODEL_TOKEN_BUDGETS: {e}")
+    RAG_CONTEXT_MODEL_TOKEN_BUDGETS = {}
+
+RAG_CONTEXT_TOKENIZER_ENCODING = os.environ.get(
+    "RAG_CONTEXT_TOKENIZER_ENCODING", "cl100k_base"
+)
+
 ENABLE_RAG_WEB_LOADER_SSL_VERIFICATION = PersistentConfig(
     "ENABLE_RAG_WEB_LOADER_SSL_VERIFICATION",
     "rag.enable_web_loader_ssl_verification",
@@ -1114,6 +1179,35 @@ RAG_EMBEDDING_OPENAI_BATCH_SIZE = PersistentConfig(
     int(os.environ.get("RAG_EMBEDDING_OPENAI_BATCH_SIZE", "1")),
 )
 
+# Embedding cache: number of vectors kept in memory as float32 (0 disables the
+# cache, 10000 vectors of 768 dimensions take about 30 MB) and an optional
+# sqlite-backed tier under CACHE_DIR shared by all workers
+RAG_EMBEDDING_CACHE_SIZE = int(os.environ.get("RAG_EMBEDDING_CACHE_SIZE", "10000"))
+ENABLE_RAG_EMBEDDING_DISK_CACHE = (
+    os.environ.get("ENABLE_RAG_EMBEDDING_DISK_CACHE", "False").lower() == "true"
+)
+RAG_EMBEDDING_DISK_CACHE_MAX_ENTRIES = int(
+    os.environ.get("RAG_EMBEDDING_DISK_CACHE_MAX_ENTRIES", "200000")
+)
+RAG_EMBEDDING_CACHE_DIR = f"{CACHE_DIR}/embeddings"
+
+# Content-addressed store of chunk embeddings shared by all collections, with
+# per-collection reference counts so unused vectors can be garbage collected.
+# Ingestion skips the embedding cache when it is enabled.
+ENABLE_RAG_CHUNK_STORE = (
+    os.environ.get("ENABLE_RAG_CHUNK_STORE", "False").lower() == "true"
+)
+RAG_CHUNK_STORE_DIR = f"{CACHE_DIR}/chunks"
+
+# On-disk cache of extracted documents keyed by file hash and loader, bounded in MB
+ENABLE_RAG_EXTRACTION_CACHE = (
+    os.environ.get("ENABLE_RAG_EXTRACTION_CACHE", "True").lower() == "true"
+)
+RAG_EXTRACTION_CACHE_MAX_SIZE = int(
+    os.environ.get("RAG_EXTRACTION_CACHE_MAX_SIZE", "1024")
+)
+RAG_EXTRACTION_CACHE_DIR = f"{CACHE_DIR}/extraction"
+
 RAG_RERANKING_MODEL = PersistentConfig(
     "RAG_RERANKING_MODEL",
     "rag.reranking_model",
@@ -1130,24 +1224,19 @@ RAG_RERANKING_MODEL_TRUST_REMOTE_CODE = (
     os.environ.get("RAG_RERANKING_MODEL_TRUST_REMOTE_CODE", "").lower() == "true"
 )
 
+# Reranking requests from concurrent chats are merged into one CrossEncoder call:
+# a request waits at most RAG_RERANKING_BATCH_MAX_WAIT_MS for others to join, and
+# a batch is dispatched once it holds RAG_RERANKING_BATCH_SIZE pairs
+RAG_RERANKING_BATCH_MAX_WAIT_MS = float(
+    os.environ.get("RAG_RERANKING_BATCH_MAX_WAIT_MS", "5")
+)
+RAG_RERANKING_BATCH_SIZE = int(os.environ.get("RAG_RERANKING_BATCH_SIZE", "64"))
+# Seconds a request waits for its batch to be scored before giving up
+RAG_RERANKING_TIMEOUT = float(os.environ.get("RAG_RERANKING_TIMEOUT", "120"))
 
-if CHROMA_HTTP_HOST != "":
-    CHROMA_CLIENT = chromadb.HttpClient(
-        host=CHROMA_HTTP_HOST,
-        port=CHROMA_HTTP_PORT,
-        headers=CHROMA_HTTP_HEADERS,
-        ssl=CHROMA_HTTP_SSL,
-        tenant=CHROMA_TENANT,
-        database=CHROMA_DATABASE,
-        settings=Settings(allow_reset=True, anonymized_telemetry=False),
-    )
-else:
-    CHROMA_CLIENT = chromadb.PersistentClient(
-        path=CHROMA_DATA_PATH,
-        settings=Settings(allow_reset=True, anonymized_telemetry=False),
-        tenant=CHROMA_TENANT,
-        database=CHROMA_DATABASE,
-    )
+# Persistent per-collection BM25 indexes used by hybrid search
+RAG_BM25_INDEX_DIR = os.getenv("RAG_BM25_INDEX_DIR", f"{CACHE_DIR}/bm25")
+Path(RAG_BM25_INDEX_DIR).mkdir(parents=True, exist_ok=True)
 
 
 # device type embedding models - "cpu" (default), "cuda" (nvidia gpu required) or "mps" (apple silicon) - choosing this right can lead to better performance
@@ -1167,6 +1256,43 @@ CHUNK_OVERLAP = PersistentConfig(
     int(os.environ.get("CHUNK_OVERLAP", "100")),
 )
 
+# Streaming ingestion: chunks embedded and written per batch, and how many batches
+# may wait between the split, embed and write stages before the producer blocks
+RAG_INGEST_BATCH_SIZE = int(os.environ.get("RAG_INGEST_BATCH_SIZE", "64"))
+RAG_INGEST_QUEUE_SIZE = int(os.environ.get("RAG_INGEST_QUEUE_SIZE", "2"))
+
+# Background document processing jobs: worker threads and how many jobs of the
+# same user may run at the same time
+RAG_JOB_WORKERS = int(os.environ.get("RAG_JOB_WORKERS", "2"))
+RAG_JOB_MAX_PER_USER = int(os.environ.get("RAG_JOB_MAX_PER_USER", "1"))
+
+# Seconds a running job stays claimed without a heartbeat from its worker; after
+# that (e.g. the worker process died) any worker may run it again
+RAG_JOB_LEASE = int(os.environ.get("RAG_JOB_LEASE", "300"))
+
+# Memory indexing: memories embedded and upserted per batch, and how many users the
+# admin bulk re-index processes at the same time
+RAG_MEMORY_BATCH_SIZE = int(os.environ.get("RAG_MEMORY_BATCH_SIZE", "64"))
+RAG_MEMORY_REINDEX_CONCURRENCY = int(
+    os.environ.get("RAG_MEMORY_REINDEX_CONCURRENCY", "4")
+)
+
+# Worker processes used by /scan to hash and extract changed files (0 runs them in
+# the request process)
+RAG_SCAN_WORKERS = int(
+    os.environ.get("RAG_SCAN_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+
+# PDF extraction: worker processes (a pool started with the first PDF and kept
+# for the lifetime of the server), pages per task and seconds allowed per page
+# (OCR included) before the pool is restarted and the extraction aborted. With 0
+# workers the pages are extracted in the request process, without a timeout
+RAG_PDF_WORKERS = int(
+    os.environ.get("RAG_PDF_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+RAG_PDF_PAGES_PER_TASK = int(os.environ.get("RAG_PDF_PAGES_PER_TASK", "2"))
+RAG_PDF_PAGE_TIMEOUT = float(os.environ.get("RAG_PDF_PAGE_TIMEOUT", "120"))
+
 DEFAULT_RAG_TEMPLATE = """Use the following context as your learned knowledge, inside <context></context> XML tags.
 <context>
     [context]
@@ -1299,6 +1425,54 @@ RAG_WEB_SEARCH_CONCURRENT_REQUESTS = PersistentConfig(
     int(os.getenv("RAG_WEB_SEARCH_CONCURRENT_REQUESTS", "10")),
 )
 
+# Web page fetching (web search and /web): deadline for all pages and for each
+# page in seconds, response size cap in MB and connections per host
+RAG_WEB_FETCH_TIMEOUT = float(os.getenv("RAG_WEB_FETCH_TIMEOUT", "10"))
+RAG_WEB_FETCH_URL_TIMEOUT = float(os.getenv("RAG_WEB_FETCH_URL_TIMEOUT", "8"))
+RAG_WEB_FETCH_MAX_SIZE = int(os.getenv("RAG_WEB_FETCH_MAX_SIZE", "5"))
+RAG_WEB_FETCH_PER_HOST = int(os.getenv("RAG_WEB_FETCH_PER_HOST", "2"))
+
+# Search engines: request timeout in seconds, additional engines queried besides
+# RAG_WEB_SEARCH_ENGINE (comma separated) and how: "parallel" queries all of them
+# and merges the results, "hedge" only asks the next engine when the previous one
+# has not answered within RAG_WEB_SEARCH_HEDGE_DELAY milliseconds. An engine that
+# failed RAG_WEB_SEARCH_BREAKER_THRESHOLD times in a row is skipped for
+# RAG_WEB_SEARCH_BREAKER_COOLDOWN seconds.
+RAG_WEB_SEARCH_TIMEOUT = int(os.getenv("RAG_WEB_SEARCH_TIMEOUT", "10"))
+RAG_WEB_SEARCH_ENGINES = [
+    engine.strip()
+    for engine in os.getenv("RAG_WEB_SEARCH_ENGINES", "").split(",")
+    if engine.strip()
+]
+RAG_WEB_SEARCH_MODE = os.getenv("RAG_WEB_SEARCH_MODE", "hedge")
+RAG_WEB_SEARCH_HEDGE_DELAY = int(os.getenv("RAG_WEB_SEARCH_HEDGE_DELAY", "1500"))
+RAG_WEB_SEARCH_BREAKER_THRESHOLD = int(
+    os.getenv("RAG_WEB_SEARCH_BREAKER_THRESHOLD", "3")
+)
+RAG_WEB_SEARCH_BREAKER_COOLDOWN = float(
+    os.getenv("RAG_WEB_SEARCH_BREAKER_COOLDOWN", "60")
+)
+
+# Web search caches: search results per (engine, query) for a TTL in seconds (the
+# collection of a repeated query is reused within the same TTL when its pages did
+# not change), and fetched pages on disk, revalidated with ETag / Last-Modified
+RAG_WEB_SEARCH_CACHE_SIZE = int(os.getenv("RAG_WEB_SEARCH_CACHE_SIZE", "1000"))
+RAG_WEB_SEARCH_CACHE_TTL = float(os.getenv("RAG_WEB_SEARCH_CACHE_TTL", "3600"))
+ENABLE_RAG_WEB_PAGE_CACHE = (
+    os.getenv("ENABLE_RAG_WEB_PAGE_CACHE", "True").lower() == "true"
+)
+RAG_WEB_PAGE_CACHE_MAX_SIZE = int(os.getenv("RAG_WEB_PAGE_CACHE_MAX_SIZE", "512"))
+RAG_WEB_PAGE_CACHE_DIR = f"{CACHE_DIR}/web"
+
+# FAQ short-circuit: the last user message of a chat with collections is compared
+# with the questions parsed from their QA files, and when the cosine similarity of
+# the closest one reaches RAG_FAQ_SIMILARITY_THRESHOLD its stored answer is
+# returned with a citation instead of calling the model (disabled by default).
+# Requests with tools, and models with filters or pipelines, always call the model
+ENABLE_RAG_FAQ = os.getenv("ENABLE_RAG_FAQ", "False").lower() == "true"
+RAG_FAQ_SIMILARITY_THRESHOLD = float(os.getenv("RAG_FAQ_SIMILARITY_THRESHOLD", "0.9"))
+RAG_FAQ_DIR = f"{CACHE_DIR}/faq"
+
 
 ####################################
 # Transcribe
@@ -1,3 +1,4 @@
+import asyncio
 import base64
 import uuid
 from contextlib import asynccontextmanager
@@ -14,6 +15,7 @@ import requests
 import mimetypes
 import shutil
 import inspect
+from datetime import datetime, timezone
 from typing import Optional
 
 from fastapi import FastAPI, Request, Depends, status, UploadFile, File, Form
@@ -61,6 +63,7 @@ from apps.webui.models.auths import Auths
 from apps.webui.models.models import Models
 from apps.webui.models.functions import Functions
 from apps.webui.models.users import Users, UserModel
+from apps.webui.models.files import Files
 
 from apps.webui.utils import load_function_module_by_id
 
@@ -87,9 +90,16 @@ from utils.misc import (
     add_or_update_system_message,
     prepend_to_first_user_message_content,
     parse_duration,
+    openai_chat_chunk_message_template,
+    openai_chat_completion_message_template,
 )
 
-from apps.rag.utils import get_rag_context, rag_template
+from apps.rag.context import get_token_budget
+from apps.rag.faq import FAQ_INDEX
+from apps.rag.jobs import JOB_QUEUE
+from apps.rag.loaders import PDF_WORKER_POOL
+from apps.rag.web import WEB_FETCHER
+from apps.rag.utils import get_rag_context_async, rag_template
 
 from config import (
     WEBUI_NAME,
@@ -127,6 +137,7 @@ from config import (
     ENABLE_ADMIN_CHAT_ACCESS,
     AppConfig,
     CORS_ALLOW_ORIGIN,
+    ENABLE_RAG_FAQ,
 )
 
 from constants import ERROR_MESSAGES, WEBHOOK_MESSAGES, TASKS
@@ -180,7 +191,12 @@ def run_migrations():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     run_migrations()
+    JOB_QUEUE.start()
     yield
+    JOB_QUEUE.stop()
+    WEB_FETCHER.close()
+    if PDF_WORKER_POOL is not None:
+        PDF_WORKER_POOL.close()
 
 
 app = FastAPI(
@@ -465,7 +481,7 @@ async def chat_completion_files_handler(body) -> tuple[dict, dict[str, list]]:
     citations = []
 
     if files := body.get("metadata", {}).get("files", None):
-        contexts, citations = get_rag_context(
+        contexts, citations = await get_rag_context_async(
             files=files,
             messages=body["messages"],
             embedding_function=rag_app.state.EMBEDDING_FUNCTION,
@@ -473,6 +489,7 @@ async def chat_completion_files_handler(body) -> tuple[dict, dict[str, list]]:
             reranking_function=rag_app.state.sentence_transformer_rf,
             r=rag_app.state.config.RELEVANCE_THRESHOLD,
             hybrid_search=rag_app.state.config.ENABLE_RAG_HYBRID_SEARCH,
+            token_budget=get_token_budget(body.get("model")),
         )
 
         log.debug(f"\nrag_contexts: {contexts}, citations: {citations}\n")
@@ -480,6 +497,116 @@ async def chat_completion_files_handler(body) -> tuple[dict, dict[str, list]]:
     return body, {"contexts": contexts, "citations": citations}
 
 
+def get_faq_response(request: Request, body: dict, answer: str, citation: dict):
+    model_id = body["model"]
+    is_ollama = "/ollama/api/chat" in request.url.path
+
+    def ollama_message(content: str, done: bool) -> dict:
+        message = {
+            "model": model_id,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+        }
+        if done:
+            message["done_reason"] = "stop"
+        return message
+
+    # Ollama streams by default, the OpenAI API does not
+    if not body.get("stream", is_ollama):
+        if is_ollama:
+            return JSONResponse(ollama_message(answer, True))
+        return JSONResponse(openai_chat_completion_message_template(model_id, answer))
+
+    if is_ollama:
+
+        async def stream_content():
+            yield f"{json.dumps({'citations': [citation]})}\n"
+            yield f"{json.dumps(ollama_message(answer, False))}\n"
+            yield f"{json.dumps(ollama_message('', True))}\n"
+
+        return StreamingResponse(stream_content(), media_type="application/x-ndjson")
+
+    async def stream_content():
+        yield f"data: {json.dumps({'citations': [citation]})}\n\n"
+        message = openai_chat_chunk_message_template(model_id, answer)
+        yield f"data: {json.dumps(message)}\n\n"
+        finish_message = openai_chat_chunk_message_template(model_id, "")
+        finish_message["choices"][0]["finish_reason"] = "stop"
+        yield f"data: {json.dumps(finish_message)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream_content(), media_type="text/event-stream")
+
+
+async def chat_completion_faq_handler(
+    request: Request, body: dict, model: dict
+) -> Optional[Response]:
+    """Answer with the stored answer of a QA file when the last user message
+    matches one of the questions of the chat's collections, without calling the
+    model."""
+    files = body.get("metadata", {}).get("files", None)
+    embedding_function = rag_app.state.EMBEDDING_FUNCTION
+    if not ENABLE_RAG_FAQ or not files or embedding_function is None:
+        return None
+
+    # The stored answer would skip the pipelines and the outlets of the filters
+    if (
+        "pipeline" in model
+        or get_sorted_filters(body["model"])
+        or get_filter_function_ids(model)
+    ):
+        return None
+
+    query = get_last_user_message(body["messages"])
+    collection_names = []
+    for file in files:
+        if file.get("type") == "collection":
+            collection_names.extend(file.get("collection_names", []))
+        elif file.get("collection_name"):
+            collection_names.append(file["collection_name"])
+    if not query or not collection_names:
+        return None
+
+    query_embedding = await embedding_function.acall(query)
+    result = await asyncio.get_running_loop().run_in_executor(
+        None,
+        FAQ_INDEX.match,
+        list(dict.fromkeys(collection_names)),
+        query_embedding,
+        embedding_function,
+    )
+    if result is None:
+        return None
+
+    pair, score = result
+    file = Files.get_file_by_id(pair.file_id)
+    name = file.meta.get("name", file.filename) if file else pair.file_id
+    citation = {
+        "source": {"name": name},
+        "document": [f"{pair.question}\n{pair.answer}"],
+        "metadata": [{"source": name, "question": pair.question, "score": score}],
+    }
+    return get_faq_response(request, body, pair.answer, citation)
+
+
+class ClientDisconnectedError(Exception):
+    pass
+
+
+async def run_until_disconnected(request: Request, coro, poll_interval: float = 0.5):
+    """Await coro, cancelling it as soon as the client goes away."""
+    task = asyncio.ensure_future(coro)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=poll_interval)
+        if done:
+            return task.result()
+
+        if await request.is_disconnected():
+            task.cancel()
+            raise ClientDisconnectedError()
+
+
 def is_chat_completion_request(request):
     return request.method == "POST" and any(
         endpoint in request.url.path
@@ -566,6 +693,15 @@ class ChatCompletionMiddleware(BaseHTTPMiddleware):
         }
         body["metadata"] = metadata
 
+        # Tools may need the model even for a known question
+        if not metadata["tool_ids"]:
+            try:
+                response = await chat_completion_faq_handler(request, body, model)
+                if response is not None:
+                    return response
+            except Exception as e:
+                log.exception(e)
+
         try:
             body, flags = await chat_completion_tools_handler(body, user, extra_params)
             contexts.extend(flags.get("contexts", []))
@@ -574,9 +710,14 @@ class ChatCompletionMiddleware(BaseHTTPMiddleware):
             log.exception(e)
 
         try:
-            body, flags = await chat_completion_files_handler(body)
+            body, flags = await run_until_disconnected(
+                request, chat_completion_files_handler(body)
+            )
             contexts.extend(flags.get("contexts", []))
             citations.extend(flags.get("citations", []))
+        except ClientDisconnectedError:
+            log.info("client disconnected while retrieving RAG context")
+            return Response(status_code=499)
         except Exception as e:
             log.exception(e)
 
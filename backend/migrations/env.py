@@ -17,6 +17,9 @@ from apps.webui.models.tools import Tool
 from apps.webui.models.users import User
 from apps.webui.models.files import File
 from apps.webui.models.functions import Function
+from apps.webui.models.jobs import Job
+from apps.webui.models.scans import ScanManifestEntry
+from apps.webui.models.qa import QAPair, QACollection
 
 from config import DATABASE_URL
 
@@ -7,3 +7,9 @@ def get_existing_tables():
     inspector = Inspector.from_engine(con)
     tables = set(inspector.get_table_names())
     return tables
+
+
+def get_existing_columns(table_name: str):
+    con = op.get_bind()
+    inspector = Inspector.from_engine(con)
+    return {column["name"] for column in inspector.get_columns(table_name)}
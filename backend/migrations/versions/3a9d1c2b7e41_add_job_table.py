@@ -0,0 +1,51 @@
+"""add job table
+
+Revision ID: 3a9d1c2b7e41
+Revises: 7e5b5dc7342b
+Create Date: 2026-10-18 10:12:04.512331
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import apps.webui.internal.db
+from migrations.util import get_existing_tables
+
+# revision identifiers, used by Alembic.
+revision: str = "3a9d1c2b7e41"
+down_revision: Union[str, None] = "7e5b5dc7342b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing_tables = set(get_existing_tables())
+
+    if "job" not in existing_tables:
+        op.create_table(
+            "job",
+            sa.Column("id", sa.String(), nullable=False),
+            sa.Column("user_id", sa.String(), nullable=True),
+            sa.Column("type", sa.String(), nullable=True),
+            sa.Column("key", sa.String(), nullable=True),
+            sa.Column("status", sa.String(), nullable=True),
+            sa.Column("priority", sa.Integer(), nullable=True),
+            sa.Column("payload", apps.webui.internal.db.JSONField(), nullable=True),
+            sa.Column("progress", apps.webui.internal.db.JSONField(), nullable=True),
+            sa.Column("result", apps.webui.internal.db.JSONField(), nullable=True),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.BigInteger(), nullable=True),
+            sa.Column("started_at", sa.BigInteger(), nullable=True),
+            sa.Column("finished_at", sa.BigInteger(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(op.f("ix_job_key"), "job", ["key"], unique=False)
+        op.create_index(op.f("ix_job_status"), "job", ["status"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_job_status"), table_name="job")
+    op.drop_index(op.f("ix_job_key"), table_name="job")
+    op.drop_table("job")
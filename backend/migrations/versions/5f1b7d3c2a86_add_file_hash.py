@@ -0,0 +1,31 @@
+"""add file hash
+
+Revision ID: 5f1b7d3c2a86
+Revises: 8c4f2e6a9d13
+Create Date: 2026-10-18 12:21:05.493817
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import apps.webui.internal.db
+from migrations.util import get_existing_columns
+
+# revision identifiers, used by Alembic.
+revision: str = "5f1b7d3c2a86"
+down_revision: Union[str, None] = "8c4f2e6a9d13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if "hash" not in get_existing_columns("file"):
+        op.add_column("file", sa.Column("hash", sa.String(), nullable=True))
+        op.create_index(op.f("ix_file_hash"), "file", ["hash"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_file_hash"), table_name="file")
+    op.drop_column("file", "hash")
@@ -0,0 +1,47 @@
+"""add scan manifest table
+
+Revision ID: 8c4f2e6a9d13
+Revises: 3a9d1c2b7e41
+Create Date: 2026-10-18 11:03:47.218650
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import apps.webui.internal.db
+from migrations.util import get_existing_tables
+
+# revision identifiers, used by Alembic.
+revision: str = "8c4f2e6a9d13"
+down_revision: Union[str, None] = "3a9d1c2b7e41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing_tables = set(get_existing_tables())
+
+    if "scan_manifest" not in existing_tables:
+        op.create_table(
+            "scan_manifest",
+            sa.Column("path", sa.Text(), nullable=False),
+            sa.Column("size", sa.BigInteger(), nullable=True),
+            sa.Column("mtime_ns", sa.BigInteger(), nullable=True),
+            sa.Column("sha256", sa.String(), nullable=True),
+            sa.Column("collection_name", sa.String(), nullable=True),
+            sa.Column("updated_at", sa.BigInteger(), nullable=True),
+            sa.PrimaryKeyConstraint("path"),
+        )
+        op.create_index(
+            op.f("ix_scan_manifest_collection_name"),
+            "scan_manifest",
+            ["collection_name"],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_scan_manifest_collection_name"), table_name="scan_manifest")
+    op.drop_table("scan_manifest")
@@ -0,0 +1,57 @@
+"""add qa tables
+
+Revision ID: b2e4a7c91f05
+Revises: 5f1b7d3c2a86
+Create Date: 2026-10-18 14:02:37.615204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import apps.webui.internal.db
+from migrations.util import get_existing_tables
+
+# revision identifiers, used by Alembic.
+revision: str = "b2e4a7c91f05"
+down_revision: Union[str, None] = "5f1b7d3c2a86"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing_tables = set(get_existing_tables())
+
+    if "qa_pair" not in existing_tables:
+        op.create_table(
+            "qa_pair",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("collection_name", sa.String(), nullable=True),
+            sa.Column("file_id", sa.String(), nullable=True),
+            sa.Column("qa_index", sa.Integer(), nullable=True),
+            sa.Column("question", sa.Text(), nullable=True),
+            sa.Column("answer", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.BigInteger(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ix_qa_pair_collection_file",
+            "qa_pair",
+            ["collection_name", "file_id", "qa_index"],
+            unique=True,
+        )
+
+    if "qa_collection" not in existing_tables:
+        op.create_table(
+            "qa_collection",
+            sa.Column("collection_name", sa.String(), nullable=False),
+            sa.Column("updated_at", sa.BigInteger(), nullable=True),
+            sa.PrimaryKeyConstraint("collection_name"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("qa_collection")
+    op.drop_index("ix_qa_pair_collection_file", table_name="qa_pair")
+    op.drop_table("qa_pair")
@@ -0,0 +1,33 @@
+"""add job lease
+
+Revision ID: d4a8f1e2c7b3
+Revises: b2e4a7c91f05
+Create Date: 2026-10-18 15:20:41.208154
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import apps.webui.internal.db
+from migrations.util import get_existing_columns
+
+# revision identifiers, used by Alembic.
+revision: str = "d4a8f1e2c7b3"
+down_revision: Union[str, None] = "b2e4a7c91f05"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing_columns = get_existing_columns("job")
+    if "worker_id" not in existing_columns:
+        op.add_column("job", sa.Column("worker_id", sa.String(), nullable=True))
+    if "heartbeat_at" not in existing_columns:
+        op.add_column("job", sa.Column("heartbeat_at", sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("job", "heartbeat_at")
+    op.drop_column("job", "worker_id")
@@ -0,0 +1,29 @@
+"""add qa pair revision
+
+Revision ID: e7c3a9b15d42
+Revises: d4a8f1e2c7b3
+Create Date: 2026-10-18 16:41:09.573821
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import apps.webui.internal.db
+from migrations.util import get_existing_columns
+
+# revision identifiers, used by Alembic.
+revision: str = "e7c3a9b15d42"
+down_revision: Union[str, None] = "d4a8f1e2c7b3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if "revision" not in get_existing_columns("qa_pair"):
+        op.add_column("qa_pair", sa.Column("revision", sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("qa_pair", "revision")
@@ -0,0 +1,108 @@
+import os
+import threading
+
+from apps.rag.bm25 import BM25Index, BM25IndexStore
+
+
+class FakeCollection:
+    def __init__(self, name, ids, documents, on_get=None):
+        self.name = name
+        self.ids = ids
+        self.documents = documents
+        self.on_get = on_get
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, include):
+        if self.on_get is not None:
+            self.on_get()
+        return {"ids": self.ids, "documents": self.documents}
+
+
+class TestBM25Index:
+    def test_search(self):
+        index = BM25Index()
+        index.add(
+            ["a", "b", "c"],
+            ["apple banana", "apple apple cherry", "cherry date"],
+        )
+
+        result = index.search("apple", 10)
+        assert [id for id, _ in result] == ["b", "a"]
+        assert result[0][1] > result[1][1] > 0
+        assert index.search("missing", 10) == []
+        assert [id for id, _ in index.search("apple cherry", 1)] == ["b"]
+
+    def test_search_ids(self):
+        index = BM25Index()
+        index.add(["a", "b", "c"], ["apple", "apple apple", "apple"])
+
+        assert [id for id, _ in index.search("apple", 10, {"a", "c"})] == ["a", "c"]
+        assert index.search("apple", 10, set()) == []
+
+    def test_update_and_remove(self):
+        index = BM25Index()
+        index.add(["a", "b"], ["apple", "banana"])
+        index.add(["a"], ["cherry"])
+
+        assert len(index) == 2
+        assert index.search("apple", 10) == []
+        assert [id for id, _ in index.search("cherry", 10)] == ["a"]
+
+        index.remove(["a", "missing"])
+        assert len(index) == 1
+        assert index.search("cherry", 10) == []
+        assert index.total_len == 1
+
+
+class TestBM25IndexStore:
+    def test_save(self, tmp_path):
+        store = BM25IndexStore(str(tmp_path))
+        store.add("docs", ["a", "b"], ["apple", "banana"])
+        # Writes stay in memory until the collection is saved
+        assert not os.path.exists(tmp_path / "docs.pkl")
+
+        store.save("docs")
+        assert os.path.exists(tmp_path / "docs.pkl")
+        index = BM25IndexStore(str(tmp_path)).get("docs")
+        assert [id for id, _ in index.search("apple", 10)] == ["a"]
+
+        store.delete("docs")
+        assert store.get("docs") is None
+        assert not os.path.exists(tmp_path / "docs.pkl")
+
+    def test_get_or_build(self, tmp_path):
+        store = BM25IndexStore(str(tmp_path))
+        collection = FakeCollection("docs", ["a", "b"], ["apple", "banana"])
+
+        index = store.get_or_build(collection)
+        assert len(index) == 2
+        assert store.get_or_build(collection) is index
+
+        # Out of sync with the collection, rebuilt
+        collection.ids, collection.documents = ["a"], ["cherry"]
+        index = store.get_or_build(collection)
+        assert [id for id, _ in index.search("cherry", 10)] == ["a"]
+
+    def test_build_does_not_block_other_collections(self, tmp_path):
+        store = BM25IndexStore(str(tmp_path))
+        store.add("other", ["a"], ["apple"])
+
+        building = threading.Event()
+        release = threading.Event()
+
+        def on_get():
+            building.set()
+            release.wait(5)
+
+        slow = FakeCollection("slow", ["a"], ["apple"], on_get=on_get)
+        thread = threading.Thread(target=store.get_or_build, args=(slow,))
+        thread.start()
+        try:
+            assert building.wait(5)
+            other = store.get_or_build(FakeCollection("other", ["a"], ["apple"]))
+            assert len(other) == 1
+        finally:
+            release.set()
+            thread.join()
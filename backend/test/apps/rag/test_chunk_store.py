@@ -0,0 +1,83 @@
+import pytest
+
+from apps.rag.chunk_store import ChunkStore
+
+
+class FakeEmbeddingFunction:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkStore(str(tmp_path / "chunks" / "chunks.db"))
+
+
+def embed(store, embedding_function, texts, collection_name):
+    return store.embed("openai", "m", texts, embedding_function, collection_name)
+
+
+def test_embeds_each_chunk_once(store):
+    ef = FakeEmbeddingFunction()
+    assert embed(store, ef, ["a", "bb", "a"], "c1") == [[1, 1], [2, 1], [1, 1]]
+    assert embed(store, ef, ["bb", "ccc"], "c2") == [[2, 1], [3, 1]]
+    assert ef.calls == [["a", "bb"], ["ccc"]]
+
+    stats = store.get_stats()
+    assert stats["vectors"] == 3
+    assert stats["references"] == 5
+    assert stats["collections"] == 2
+    assert stats["reused_chunks"] == 2
+
+
+def test_release_and_gc(store):
+    ef = FakeEmbeddingFunction()
+    embed(store, ef, ["a", "bb"], "c1")
+    embed(store, ef, ["bb"], "c2")
+
+    store.release("c1")
+    assert store.get_stats()["vectors"] == 1
+    assert store.get_stats()["references"] == 1
+
+    embed(store, ef, ["a"], "c1")
+    assert ef.calls[-1] == ["a"]
+
+    store.release("c2")
+    store.release("c1")
+    assert store.get_stats()["vectors"] == 0
+
+
+def test_release_without_gc_keeps_vectors(store):
+    ef = FakeEmbeddingFunction()
+    embed(store, ef, ["a", "bb"], "c1")
+
+    # The collection is stored again right after, e.g. an overwritten web page
+    store.release("c1", gc=False)
+    assert store.get_stats()["vectors"] == 2
+    assert store.get_stats()["references"] == 0
+
+    embed(store, ef, ["a", "bb", "new"], "c1")
+    assert ef.calls == [["a", "bb"], ["new"]]
+    assert store.get_stats()["references"] == 3
+
+    store.release("c1", gc=False)
+    assert store.gc() == 3
+    assert store.gc() == 0
+
+
+def test_failed_embedding_takes_no_reference(store):
+    with pytest.raises(ValueError):
+        embed(store, lambda texts: None, ["a"], "c1")
+    assert store.get_stats()["vectors"] == 0
+    assert store.get_stats()["collections"] == 0
+
+
+def test_clear(store):
+    embed(store, FakeEmbeddingFunction(), ["a"], "c1")
+    store.clear()
+    assert store.get_stats()["vectors"] == 0
+    assert store.get_stats()["collections"] == 0
@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from apps.rag.collection_query import query_collections_concurrently
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=1)
+    yield executor
+    executor.shutdown(wait=False)
+
+
+def test_results_keep_the_collection_order(executor):
+    def query(collection_name):
+        if collection_name == "broken":
+            raise ValueError("boom")
+        return {"collection": collection_name}
+
+    results = query_collections_concurrently(
+        ["a", "broken", "b"], query, executor=executor
+    )
+    assert results == [{"collection": "a"}, {"collection": "b"}]
+
+    with pytest.raises(ValueError):
+        query_collections_concurrently(["broken"], query, executor=executor)
+
+
+def test_timeout_starts_when_the_query_runs(executor):
+    def query(collection_name):
+        time.sleep(0.2)
+        return collection_name
+
+    # The second query waits for the only worker, which is not held against it
+    results = query_collections_concurrently(
+        ["a", "b"], query, executor=executor, timeout=0.3
+    )
+    assert results == ["a", "b"]
+
+
+def test_hung_query_returns_partial_results():
+    executor = ThreadPoolExecutor(max_workers=2)
+    release = threading.Event()
+
+    def query(collection_name):
+        if collection_name == "hung":
+            release.wait(5)
+        return collection_name
+
+    try:
+        started = time.monotonic()
+        results = query_collections_concurrently(
+            ["hung", "a"], query, executor=executor, timeout=0.1
+        )
+        assert results == ["a"]
+        assert time.monotonic() - started < 1
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_query_waiting_for_a_worker_times_out(executor):
+    release = threading.Event()
+    calls = []
+
+    def query(collection_name):
+        calls.append(collection_name)
+        release.wait(5)
+        return collection_name
+
+    try:
+        with pytest.raises(TimeoutError):
+            query_collections_concurrently(
+                ["hung", "queued"], query, executor=executor, timeout=0.1
+            )
+    finally:
+        release.set()
+    # The queued query was cancelled instead of running after the hung one
+    executor.shutdown()
+    assert calls == ["hung"]
@@ -0,0 +1,83 @@
+from apps.rag.context import (
+    build_context,
+    build_contexts,
+    count_tokens,
+    merge_chunks,
+    pack_chunks,
+)
+
+
+def chunk(text, score, **metadata):
+    return {"text": text, "score": score, "metadata": metadata}
+
+
+def test_merge_overlapping_chunks():
+    chunks = [
+        chunk("world, hello", 0.5, source="a.pdf", start_index=6),
+        chunk("hello world", 0.9, source="a.pdf", start_index=0),
+        chunk("far away", 0.1, source="a.pdf", start_index=100),
+        chunk("hello world", 0.2, source="b.pdf", start_index=0),
+    ]
+
+    merged = merge_chunks(chunks)
+    assert [(c["text"], c["score"]) for c in merged] == [
+        ("hello world, hello", 0.9),
+        ("hello world", 0.2),
+        ("far away", 0.1),
+    ]
+
+
+def test_merge_deduplicates_chunks_without_position():
+    merged = merge_chunks([chunk("same", 0.2), chunk(" same ", 0.8), chunk("", 1.0)])
+    assert [(c["text"], c["score"]) for c in merged] == [(" same ", 0.8)]
+
+
+def test_pack_without_budget_keeps_everything():
+    chunks = [chunk("low " * 100, 0.1), chunk("high " * 100, 0.9)]
+    assert [c["score"] for c in pack_chunks(chunks, 0)] == [0.9, 0.1]
+
+
+def test_pack_keeps_the_best_chunks_that_fit():
+    best, second, third = "alpha " * 20, "beta " * 50, "gamma " * 10
+    chunks = [chunk(second, 0.5), chunk(third, 0.1), chunk(best, 0.9)]
+    budget = count_tokens(best) + count_tokens(third)
+
+    packed = pack_chunks(chunks, budget)
+    assert [c["text"] for c in packed] == [best, third]
+    assert sum(count_tokens(c["text"]) for c in packed) <= budget
+
+
+def test_pack_truncates_the_best_chunk_when_nothing_fits():
+    text = "word " * 200
+    packed = pack_chunks([chunk(text, 0.9), chunk(text + "more", 0.1)], 10)
+
+    assert len(packed) == 1
+    assert text.startswith(packed[0]["text"])
+    assert 0 < count_tokens(packed[0]["text"]) <= 10
+
+
+def test_build_context():
+    chunks = [
+        chunk("second part", 0.4, source="a.pdf", start_index=12),
+        chunk("first part, ", 0.6, source="a.pdf", start_index=0),
+        chunk("other", 0.5),
+    ]
+    assert build_context(chunks, 0) == "first part, second part\n\nother"
+
+
+def test_build_contexts_without_budget_keeps_the_files_apart():
+    files = [
+        [chunk("b", 0.1, source="a.pdf"), chunk("a", 0.9, source="a.pdf")],
+        [chunk("c", 0.5, source="c.pdf")],
+    ]
+    assert build_contexts(files, 0) == ["b\n\na", "c"]
+    assert build_contexts([], 0) == []
+
+
+def test_build_contexts_with_budget_merges_the_files():
+    files = [
+        [chunk("b", 0.1, source="a.pdf"), chunk("a", 0.9, source="a.pdf")],
+        [chunk("c", 0.5, source="c.pdf")],
+    ]
+    assert build_contexts(files, 100) == ["a\n\nc\n\nb"]
+    assert build_contexts([[]], 100) == []
@@ -0,0 +1,127 @@
+import asyncio
+
+from apps.rag.embedding_cache import (
+    CachedEmbeddingFunction,
+    EmbeddingCache,
+    EmbeddingDiskCache,
+    get_embedding_cache_key,
+)
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, query):
+        self.calls.append(query)
+        if isinstance(query, list):
+            return [[float(len(text)), 1.0] for text in query]
+        return [float(len(query)), 1.0]
+
+
+def test_key_normalizes_whitespace():
+    assert get_embedding_cache_key("", "m", "a  b\n") == get_embedding_cache_key(
+        "", "m", "a b"
+    )
+    assert get_embedding_cache_key("", "m", "a b") != get_embedding_cache_key(
+        "", "other", "a b"
+    )
+
+
+def test_hits_and_misses():
+    embedder = CountingEmbedder()
+    cache = EmbeddingCache(10)
+    embed = CachedEmbeddingFunction("", "model", embedder, cache)
+
+    assert embed(["ab", "abc", "ab"]) == [[2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+    # Duplicates are embedded once
+    assert embedder.calls == [["ab", "abc"]]
+
+    assert embed("abc") == [3.0, 1.0]
+    assert embed(["abc", "abcd"]) == [[3.0, 1.0], [4.0, 1.0]]
+    assert embedder.calls == [["ab", "abc"], ["abcd"]]
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 3
+
+
+def test_lru_eviction_and_invalidation():
+    embedder = CountingEmbedder()
+    cache = EmbeddingCache(2)
+    embed = CachedEmbeddingFunction("", "model", embedder, cache)
+
+    embed(["a", "bb", "ccc"])
+    assert cache.get_stats()["size"] == 2
+    embed("a")
+    assert embedder.calls[-1] == ["a"]
+
+    cache.invalidate("", "model")
+    assert cache.get_stats()["size"] == 0
+    embed("bb")
+    assert embedder.calls[-1] == ["bb"]
+
+
+def test_disk_tier(tmp_path):
+    disk_cache = EmbeddingDiskCache(str(tmp_path / "cache.db"), 10)
+    embedder = CountingEmbedder()
+    CachedEmbeddingFunction("", "model", embedder, EmbeddingCache(10, disk_cache))(
+        ["ab", "abc"]
+    )
+
+    # A new in-memory tier finds the vectors on disk
+    cache = EmbeddingCache(10, disk_cache)
+    embed = CachedEmbeddingFunction("", "model", embedder, cache)
+    assert embed(["abc", "ab"]) == [[3.0, 1.0], [2.0, 1.0]]
+    assert len(embedder.calls) == 1
+    assert cache.get_stats()["disk_hits"] == 2
+
+
+def test_disabled_cache_passes_through():
+    embedder = CountingEmbedder()
+    embed = CachedEmbeddingFunction("", "model", embedder, EmbeddingCache(0))
+
+    embed("ab")
+    embed("ab")
+    assert embedder.calls == ["ab", "ab"]
+
+
+def test_acall_uses_async_func():
+    embedder = CountingEmbedder()
+
+    async def async_func(query):
+        return embedder(query)
+
+    embed = CachedEmbeddingFunction(
+        "", "model", None, EmbeddingCache(10), async_func=async_func
+    )
+    assert asyncio.run(embed.acall("abc")) == [3.0, 1.0]
+    assert asyncio.run(embed.acall(["abc"])) == [[3.0, 1.0]]
+    assert embedder.calls == [["abc"]]
+
+
+def test_vectors_are_stored_as_float32():
+    cache = EmbeddingCache(10)
+    cache.set_many("", "model", {"k": [0.5, 1.5]})
+
+    assert cache.entries["k"][2].typecode == "f"
+    result = cache.get_many(["k"])
+    assert result == {"k": [0.5, 1.5]}
+    assert isinstance(result["k"], list)
+
+
+def test_documents_skip_the_memory_tier(tmp_path):
+    embedder = CountingEmbedder()
+    cache = EmbeddingCache(10)
+    embed = CachedEmbeddingFunction("", "model", embedder, cache)
+
+    embed("q")
+    assert embed.embed_documents(["ab", "abc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert list(cache.entries) == [get_embedding_cache_key("", "model", "q")]
+
+    cache = EmbeddingCache(10, EmbeddingDiskCache(str(tmp_path / "cache.db"), 10))
+    embed = CachedEmbeddingFunction("", "model", embedder, cache)
+    embed.embed_documents(["ab", "abc"])
+    embed.embed_documents(["abc", "abcd"])
+    assert embedder.calls[-1] == ["abcd"]
+    assert not cache.entries
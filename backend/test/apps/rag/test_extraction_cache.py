@@ -0,0 +1,69 @@
+import pytest
+from langchain_core.documents import Document
+
+from apps.rag import extraction_cache
+from apps.rag.extraction_cache import ExtractionCache, load_documents
+
+
+class FakeLoader:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.calls = 0
+
+    def lazy_load(self):
+        self.calls += 1
+        yield Document(page_content="one", metadata={"source": self.file_path})
+        yield Document(page_content="two", metadata={"source": "elsewhere"})
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ExtractionCache(str(tmp_path / "cache"), 1024 * 1024)
+    monkeypatch.setattr(extraction_cache, "EXTRACTION_CACHE", cache)
+    return cache
+
+
+def load(file_path, file_hash="h", options=None):
+    loader = FakeLoader(file_path)
+    return list(load_documents(loader, file_path, file_hash, options)), loader
+
+
+def test_hit_rewrites_the_source(cache):
+    documents, loader = load("/docs/a.pdf")
+    assert loader.calls == 1
+    assert [doc.metadata["source"] for doc in documents] == ["/docs/a.pdf", "elsewhere"]
+
+    # Same content under another path
+    documents, loader = load("/docs/copy/b.pdf")
+    assert loader.calls == 0
+    assert [doc.page_content for doc in documents] == ["one", "two"]
+    assert [doc.metadata["source"] for doc in documents] == [
+        "/docs/copy/b.pdf",
+        "elsewhere",
+    ]
+
+
+def test_key_includes_hash_and_options(cache):
+    load("/docs/a.pdf", options={"pdf_extract_images": False})
+
+    assert load("/docs/a.pdf", options={"pdf_extract_images": True})[1].calls == 1
+    assert load("/docs/a.pdf", file_hash="other")[1].calls == 1
+    assert load("/docs/a.pdf", options={"pdf_extract_images": False})[1].calls == 0
+
+
+def test_without_hash_or_cache(cache, monkeypatch):
+    load("/docs/a.pdf", file_hash=None)
+    assert cache.get_stats()["size"] == 0
+
+    monkeypatch.setattr(extraction_cache, "EXTRACTION_CACHE", None)
+    assert load("/docs/a.pdf")[1].calls == 1
+    assert load("/docs/a.pdf")[1].calls == 1
+
+
+def test_interrupted_load_is_not_cached(cache):
+    loader = FakeLoader("/docs/a.pdf")
+    documents = load_documents(loader, "/docs/a.pdf", "h")
+    next(documents)
+    documents.close()
+
+    assert load("/docs/a.pdf")[1].calls == 1
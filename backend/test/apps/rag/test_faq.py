@@ -0,0 +1,98 @@
+import pytest
+
+from apps.rag.faq import FAQIndex
+from apps.webui.internal.db import Base, engine, get_db
+from apps.webui.models.qa import QACollection, QAPair, QAPairs
+
+QUESTIONS = {
+    "how do I book": [1.0, 0.0, 0.0],
+    "opening hours": [0.0, 1.0, 0.0],
+}
+
+
+class FakeEmbeddingFunction:
+    engine = "openai"
+    model = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        return [QUESTIONS[text] for text in texts]
+
+
+@pytest.fixture
+def faq(tmp_path):
+    Base.metadata.create_all(engine, tables=[QAPair.__table__, QACollection.__table__])
+    QAPairs.replace_pairs(
+        "c1", "f1", [("how do I book", "online"), ("opening hours", "9 to 5")]
+    )
+    yield FAQIndex(str(tmp_path / "faq"), threshold=0.9)
+    with get_db() as db:
+        db.query(QAPair).delete()
+        db.query(QACollection).delete()
+        db.commit()
+
+
+def test_match_above_threshold(faq):
+    ef = FakeEmbeddingFunction()
+
+    pair, score = faq.match(["c1"], [2.0, 0.1, 0.0], ef)
+    assert pair.answer == "online"
+    assert score == pytest.approx(0.9988, abs=1e-3)
+
+    # The index is built once and then memory-mapped
+    assert faq.match(["c1"], [0.0, 3.0, 0.0], ef)[0].answer == "9 to 5"
+    assert ef.calls == 1
+    assert faq.get_stats()["hits"] == 2
+
+
+def test_no_match_below_threshold(faq):
+    ef = FakeEmbeddingFunction()
+
+    # cos = 0.707
+    assert faq.match(["c1"], [1.0, 1.0, 0.0], ef) is None
+    assert faq.match(["c1"], [0.0, 0.0, 1.0], ef) is None
+    assert faq.match(["other"], [1.0, 0.0, 0.0], ef) is None
+    assert faq.get_stats()["misses"] == 3
+
+    faq.threshold = 0.7
+    assert faq.match(["c1"], [1.0, 1.0, 0.0], ef) is not None
+
+
+def test_rebuilt_after_the_pairs_change(faq):
+    ef = FakeEmbeddingFunction()
+    assert faq.match(["c1"], [1.0, 0.0, 0.0], ef)[0].answer == "online"
+
+    QAPairs.replace_pairs("c1", "f1", [("opening hours", "10 to 6")])
+    assert faq.match(["c1"], [1.0, 0.0, 0.0], ef) is None
+    assert faq.match(["c1"], [0.0, 1.0, 0.0], ef)[0].answer == "10 to 6"
+    assert faq.get_stats()["builds"] == 2
+
+
+def test_dimension_mismatch_is_a_miss(faq):
+    assert faq.match(["c1"], [1.0, 0.0], FakeEmbeddingFunction()) is None
+
+
+def test_replace_pairs_keeps_the_ids(faq):
+    ids = [pair.id for pair in QAPairs.get_pairs_by_collection_names(["c1"])]
+    version = QAPairs.get_collection_versions(["c1"])["c1"]
+
+    QAPairs.replace_pairs(
+        "c1", "f1", [("how do I book", "online"), ("opening hours", "10 to 6")]
+    )
+    pairs = QAPairs.get_pairs_by_collection_names(["c1"])
+    assert [pair.id for pair in pairs] == ids
+    assert pairs[1].answer == "10 to 6"
+    assert QAPairs.get_collection_versions(["c1"])["c1"] != version
+
+    version = QAPairs.get_collection_versions(["c1"])["c1"]
+    QAPairs.replace_pairs(
+        "c1", "f1", [("how do I book", "online"), ("opening hours", "10 to 6")]
+    )
+    assert QAPairs.get_collection_versions(["c1"])["c1"] == version
+
+    QAPairs.replace_pairs("c1", "f1", [("how do I book", "by phone")])
+    pairs = QAPairs.get_pairs_by_collection_names(["c1"])
+    assert [(pair.id, pair.answer) for pair in pairs] == [(ids[0], "by phone")]
@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+from apps.rag.bm25 import BM25Index
+from apps.rag.fusion import fuse_rankings, get_embeddings, hybrid_search
+from apps.rag.vector.flat import FlatClient
+
+
+class FakeReranker:
+    def predict(self, pairs):
+        # Longer documents first
+        return [len(document) for _, document in pairs]
+
+
+class FakeCollection:
+    """Records without a stored vector, which the flat backend cannot hold."""
+
+    def __init__(self, records):
+        self.records = records
+
+    def get(self, ids, include):
+        ids = [id for id in ids if id in self.records]
+        result = {"ids": ids}
+        for field in include:
+            result[field] = [self.records[id][field] for id in ids]
+        return result
+
+
+@pytest.fixture
+def collection(tmp_path):
+    collection = FlatClient(str(tmp_path)).create_collection("docs")
+    collection.add(
+        ids=["a", "b", "c"],
+        embeddings=[[1.0, 0.0], [0.7, 0.7], [0.0, 1.0]],
+        documents=["apple", "apple banana", "banana"],
+        metadatas=[{"name": "a"}, {"name": "b"}, {"name": "c"}],
+    )
+    return collection
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add(["a", "b", "c"], ["apple", "apple banana", "banana"])
+    return index
+
+
+def test_fuse_rankings_rrf():
+    ids, scores = fuse_rankings(
+        [
+            (["a", "b", "c"], np.array([3.0, 2.0, 1.0])),
+            (["c", "b", "d"], np.array([0.9, 0.8, 0.7])),
+        ],
+        [0.5, 0.5],
+    )
+    # Reciprocal ranks favour a first and a third place over two second places
+    assert ids == ["c", "b", "a", "d"]
+    assert scores.tolist() == sorted(scores.tolist(), reverse=True)
+    assert scores[0] == pytest.approx(0.5 / 63 + 0.5 / 61)
+    assert scores[1] == pytest.approx(1 / 62)
+
+
+def test_fuse_rankings_weights_and_ties():
+    rankings = [(["a"], np.array([1.0])), (["b"], np.array([1.0]))]
+    assert fuse_rankings(rankings, [0.5, 0.5])[0] == ["a", "b"]
+    assert fuse_rankings(rankings, [0.2, 0.8])[0] == ["b", "a"]
+    assert fuse_rankings([([], np.array([])), (["a"], np.array([1.0]))], [1, 1])[0] == [
+        "a"
+    ]
+
+
+def test_fuse_rankings_weighted():
+    ids, scores = fuse_rankings(
+        [
+            (["a", "b", "c"], np.array([10.0, 5.0, 0.0])),
+            (["c", "a"], np.array([1.0, 0.0])),
+        ],
+        [0.5, 0.5],
+        method="weighted",
+    )
+    assert ids == ["a", "c", "b"]
+    assert scores.tolist() == pytest.approx([0.5, 0.5, 0.25])
+
+
+def test_hybrid_search_scores_by_stored_vectors(collection, index):
+    result = hybrid_search(collection, index, "banana", [1.0, 0.0], 3, None, 0.0)
+
+    assert result["documents"] == [["apple", "apple banana", "banana"]]
+    assert result["distances"][0] == sorted(result["distances"][0], reverse=True)
+    assert [m["name"] for m in result["metadatas"][0]] == ["a", "b", "c"]
+    assert result["metadatas"][0][0]["score"] == pytest.approx(1.0)
+
+
+def test_hybrid_search_threshold_and_reranker(collection, index):
+    result = hybrid_search(collection, index, "banana", [1.0, 0.0], 3, None, 0.9)
+    assert result["documents"] == [["apple"]]
+
+    result = hybrid_search(
+        collection, index, "banana", [1.0, 0.0], 2, FakeReranker(), 0.0
+    )
+    assert result["documents"] == [["apple banana", "banana"]]
+
+
+def test_hybrid_search_skips_stale_bm25_ids(collection, index):
+    # Another worker rebuilt the collection without these chunks
+    index.add(["gone"], ["banana banana banana"])
+    collection.delete(ids=["c"])
+
+    for reranker in (None, FakeReranker()):
+        result = hybrid_search(
+            collection, index, "banana", [0.0, 1.0], 4, reranker, 0.0
+        )
+        assert sorted(result["documents"][0]) == ["apple", "apple banana"]
+
+    collection.delete(ids=["a", "b"])
+    result = hybrid_search(collection, index, "banana", [0.0, 1.0], 4, None, 0.0)
+    assert result == {"distances": [[]], "documents": [[]], "metadatas": [[]]}
+
+
+def test_get_embeddings_falls_back_to_embedding():
+    collection = FakeCollection(
+        {
+            "a": {"embeddings": np.array([1.0, 0.0]), "documents": "apple"},
+            "b": {"embeddings": None, "documents": "banana"},
+        }
+    )
+    calls = []
+
+    def embedding_function(texts):
+        calls.append(texts)
+        return [[0.0, 1.0] for _ in texts]
+
+    embeddings = get_embeddings(collection, ["a", "b", "gone"], embedding_function)
+    assert sorted(embeddings) == ["a", "b"]
+    assert embeddings["b"] == [0.0, 1.0]
+    assert calls == [["banana"]]
+
+    # Without an embedding function chunks without a vector are left out
+    assert sorted(get_embeddings(collection, ["a", "b"])) == ["a"]
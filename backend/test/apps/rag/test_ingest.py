@@ -0,0 +1,136 @@
+import threading
+from datetime import datetime
+
+import pytest
+from langchain_core.documents import Document
+
+from apps.rag.ingest import (
+    IngestCancelled,
+    IngestLoadError,
+    IngestPipeline,
+    lazy_load,
+)
+
+
+class Recorder:
+    def __init__(self, fail_embed_at=None, fail_write_at=None):
+        self.embed_calls = []
+        self.writes = []
+        self.fail_embed_at = fail_embed_at
+        self.fail_write_at = fail_write_at
+
+    def embed(self, texts):
+        self.embed_calls.append(texts)
+        if len(self.embed_calls) == self.fail_embed_at:
+            raise ValueError("embedding failed")
+        return [[float(len(text))] for text in texts]
+
+    def write(self, ids, texts, metadatas, embeddings):
+        if len(self.writes) + 1 == self.fail_write_at:
+            raise IOError("write failed")
+        self.writes.append((ids, texts, metadatas, embeddings))
+
+
+def documents(n, **metadata):
+    return [Document(page_content=f"doc {i}", metadata=metadata) for i in range(n)]
+
+
+def ingest_threads():
+    return [t for t in threading.enumerate() if t.name.startswith("rag-ingest")]
+
+
+def test_batches_and_metadata():
+    recorder = Recorder()
+    progress = []
+    ids = IngestPipeline(
+        recorder.embed,
+        recorder.write,
+        metadata={"file_id": "f"},
+        batch_size=4,
+        queue_size=1,
+        on_progress=progress.append,
+    ).run(iter(documents(10, created=datetime(2024, 1, 1))))
+
+    assert [len(texts) for texts in recorder.embed_calls] == [4, 4, 2]
+    assert len(ids) == len(set(ids)) == 10
+    assert [id for write in recorder.writes for id in write[0]] == ids
+
+    _, texts, metadatas, embeddings = recorder.writes[0]
+    assert texts[0] == "doc 0"
+    assert metadatas[0] == {"created": "2024-01-01 00:00:00", "file_id": "f"}
+    assert embeddings[0] == [5.0]
+    assert progress[-1]["stored"] == 10
+    assert progress[-1]["documents"] == 10
+
+
+def test_id_function():
+    recorder = Recorder()
+    ids = IngestPipeline(
+        recorder.embed,
+        recorder.write,
+        id_function=lambda text, metadata: text.replace(" ", "-"),
+    ).run(documents(2))
+    assert ids == ["doc-0", "doc-1"]
+
+
+@pytest.mark.parametrize(
+    "recorder, error",
+    [
+        (Recorder(fail_embed_at=2), ValueError),
+        (Recorder(fail_write_at=2), IOError),
+    ],
+)
+def test_stage_failure_stops_the_pipeline(recorder, error):
+    with pytest.raises(error):
+        IngestPipeline(recorder.embed, recorder.write, batch_size=2).run(documents(20))
+
+    assert len(recorder.embed_calls) < 10
+    assert not ingest_threads()
+
+
+def test_load_failure():
+    def broken_documents():
+        yield from documents(3)
+        raise OSError("unreadable")
+
+    recorder = Recorder()
+    with pytest.raises(IngestLoadError) as e:
+        IngestPipeline(recorder.embed, recorder.write, batch_size=2).run(
+            broken_documents()
+        )
+
+    assert isinstance(e.value.__cause__, OSError)
+    assert not ingest_threads()
+
+
+def test_cancel():
+    recorder = Recorder()
+    pipeline = IngestPipeline(recorder.embed, recorder.write, batch_size=1)
+
+    def cancelling_documents():
+        yield from documents(2)
+        pipeline.cancel()
+        yield from documents(10)
+
+    with pytest.raises(IngestCancelled):
+        pipeline.run(cancelling_documents())
+    assert pipeline.progress["documents"] == 2
+    assert not ingest_threads()
+
+
+def test_lazy_load():
+    class Loader:
+        def load(self):
+            return documents(2)
+
+    class LazyLoader(Loader):
+        def lazy_load(self):
+            yield from documents(3)
+
+    class NotLazyLoader(Loader):
+        def lazy_load(self):
+            raise NotImplementedError()
+
+    assert len(list(lazy_load(Loader()))) == 2
+    assert len(list(lazy_load(LazyLoader()))) == 3
+    assert len(list(lazy_load(NotLazyLoader()))) == 2
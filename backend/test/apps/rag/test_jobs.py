@@ -0,0 +1,185 @@
+import threading
+import time
+
+import pytest
+
+from apps.rag.jobs import JobQueue
+from apps.webui.internal.db import Base, engine, get_db
+from apps.webui.models.jobs import Job, Jobs, JobStatus
+
+
+@pytest.fixture
+def queue():
+    Base.metadata.create_all(engine, tables=[Job.__table__])
+    queue = JobQueue(workers=1, max_per_user=1)
+    yield queue
+    queue.stop()
+    with get_db() as db:
+        db.query(Job).delete()
+        db.commit()
+
+
+def wait_for(id, statuses, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = Jobs.get_job_by_id(id)
+        if job.status in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {id} is still {job.status}")
+
+
+def test_pending_job_is_reused(queue):
+    queue.register("doc", lambda payload, on_progress: {})
+
+    first = queue.submit("u1", "doc", {"n": 1}, key="doc:a")
+    assert queue.submit("u1", "doc", {"n": 2}, key="doc:a").id == first.id
+    assert queue.submit("u1", "doc", {"n": 3}, key="doc:b").id != first.id
+    assert queue.submit("u1", "doc", {"n": 4}).id != first.id
+    assert queue.get_stats()["pending"] == 3
+
+
+def test_running_job_is_reused(queue):
+    started, release = threading.Event(), threading.Event()
+
+    def handler(payload, on_progress):
+        started.set()
+        release.wait(5)
+        return {"n": payload["n"]}
+
+    queue.register("doc", handler)
+    queue.start()
+    try:
+        first = queue.submit("u1", "doc", {"n": 1}, key="doc:a")
+        assert started.wait(5)
+        assert queue.submit("u1", "doc", {"n": 2}, key="doc:a").id == first.id
+    finally:
+        release.set()
+
+    assert wait_for(first.id, [JobStatus.COMPLETED]).result == {"n": 1}
+
+
+@pytest.mark.parametrize(
+    "fail, status",
+    [(False, JobStatus.COMPLETED), (True, JobStatus.FAILED)],
+)
+def test_finished_job_is_resubmitted(queue, fail, status):
+    def handler(payload, on_progress):
+        if fail:
+            raise ValueError("boom")
+        return {}
+
+    queue.register("doc", handler)
+    queue.start()
+
+    first = queue.submit("u1", "doc", {}, key="doc:a")
+    wait_for(first.id, [status])
+
+    # e.g. the collection was reset after the job completed
+    second = queue.submit("u1", "doc", {}, key="doc:a")
+    assert second.id != first.id
+    wait_for(second.id, [status])
+
+
+def test_cancelled_job_is_resubmitted(queue):
+    queue.register("doc", lambda payload, on_progress: {})
+
+    first = queue.submit("u1", "doc", {}, key="doc:a")
+    assert queue.cancel(first.id).status == JobStatus.CANCELLED
+    assert queue.get_stats()["pending"] == 0
+
+    second = queue.submit("u1", "doc", {}, key="doc:a")
+    assert second.id != first.id
+    assert second.status == JobStatus.PENDING
+
+
+def test_unknown_type(queue):
+    with pytest.raises(ValueError):
+        queue.submit("u1", "doc", {})
+
+
+def test_two_queues_run_a_job_once(queue):
+    # e.g. two uvicorn workers sharing the job table
+    other = JobQueue(workers=2, max_per_user=1)
+    calls = []
+    release = threading.Event()
+
+    def handler(payload, on_progress):
+        calls.append(payload)
+        release.wait(5)
+        return {}
+
+    queue.register("doc", handler)
+    other.register("doc", handler)
+    jobs = [queue.submit(f"u{i}", "doc", {"n": i}) for i in range(4)]
+
+    queue.start()
+    other.start()
+    try:
+        release.set()
+        for job in jobs:
+            wait_for(job.id, [JobStatus.COMPLETED])
+    finally:
+        other.stop()
+
+    assert sorted(payload["n"] for payload in calls) == [0, 1, 2, 3]
+
+
+def test_start_leaves_jobs_of_live_workers_alone(queue):
+    calls = []
+    queue.register("doc", lambda payload, on_progress: calls.append(payload) or {})
+
+    live = Jobs.insert_new_job("u1", "doc", {"n": 1}, 5)
+    dead = Jobs.insert_new_job("u2", "doc", {"n": 2}, 5)
+    now = int(time.time())
+    Jobs.update_job_by_id(
+        live.id,
+        {"status": JobStatus.RUNNING, "worker_id": "other", "heartbeat_at": now},
+    )
+    Jobs.update_job_by_id(
+        dead.id,
+        {
+            "status": JobStatus.RUNNING,
+            "worker_id": "dead",
+            "heartbeat_at": now - queue.lease - 1,
+        },
+    )
+
+    queue.start()
+    wait_for(dead.id, [JobStatus.COMPLETED])
+    assert calls == [{"n": 2}]
+    assert Jobs.get_job_by_id(live.id).status == JobStatus.RUNNING
+
+
+def test_job_is_claimed_once(queue):
+    calls = []
+    queue.register("doc", lambda payload, on_progress: calls.append(payload) or {})
+    job = queue.submit("u1", "doc", {})
+
+    claim = {"status": JobStatus.RUNNING, "worker_id": "other"}
+    assert Jobs.update_job_if(job.id, claim, status=JobStatus.PENDING)
+    assert not Jobs.update_job_if(job.id, claim, status=JobStatus.PENDING)
+
+    queue._run(job.id)
+    assert calls == []
+    assert Jobs.get_job_by_id(job.id).worker_id == "other"
+
+
+def test_stop_joins_the_workers(queue):
+    started, release = threading.Event(), threading.Event()
+
+    def handler(payload, on_progress):
+        started.set()
+        release.wait(5)
+        return {}
+
+    queue.register("doc", handler)
+    queue.start()
+    threads = list(queue.threads)
+    job = queue.submit("u1", "doc", {})
+    assert started.wait(5)
+
+    threading.Timer(0.1, release.set).start()
+    queue.stop()
+    assert not any(thread.is_alive() for thread in threads)
+    assert Jobs.get_job_by_id(job.id).status == JobStatus.COMPLETED
@@ -0,0 +1,106 @@
+import time
+
+import pypdf
+import pytest
+
+from apps.rag import loaders
+from apps.rag.extraction_cache import ExtractionCache
+from apps.rag.loaders import ParallelPDFLoader, PDFWorkerPool, get_loader
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    writer = pypdf.PdfWriter()
+    for _ in range(5):
+        writer.add_blank_page(width=72, height=72)
+    path = tmp_path / "blank.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ExtractionCache(str(tmp_path / "cache"), 1024 * 1024)
+    monkeypatch.setattr(loaders, "EXTRACTION_CACHE", cache)
+    return cache
+
+
+@pytest.fixture
+def pool():
+    pool = PDFWorkerPool(2)
+    yield pool
+    pool.close()
+
+
+@pytest.mark.parametrize("use_pool", [False, True])
+def test_pages_in_order(pdf, pool, use_pool):
+    documents = list(
+        ParallelPDFLoader(
+            pdf, pool=pool if use_pool else None, pages_per_task=2
+        ).lazy_load()
+    )
+    assert [doc.metadata for doc in documents] == [
+        {"source": pdf, "page": page} for page in range(5)
+    ]
+
+
+def test_pool_is_reused(pdf, pool):
+    ParallelPDFLoader(pdf, pool=pool).load()
+    workers = pool.pool
+    assert len(ParallelPDFLoader(pdf, pool=pool).load()) == 5
+    assert pool.pool is workers
+
+
+def wait_for(pool, workers, result):
+    while not result.ready():
+        if not pool.check(workers):
+            return False
+        result.wait(0.1)
+    return True
+
+
+def test_timeout_starts_when_the_task_runs():
+    pool = PDFWorkerPool(1)
+    try:
+        # Neither starting the worker nor waiting for the first task counts
+        first = pool.submit(time.sleep, (0.5,), 1)
+        second = pool.submit(time.sleep, (0.5,), 0.8)
+        assert wait_for(pool, *first)
+        assert wait_for(pool, *second)
+    finally:
+        pool.close()
+
+
+def test_hung_task_terminates_the_pool(pdf, pool):
+    workers, result = pool.submit(time.sleep, (30,), 0.1)
+    assert not wait_for(pool, workers, result)
+    assert pool.pool is None
+
+    # The next extraction starts a new pool
+    assert len(ParallelPDFLoader(pdf, pool=pool).load()) == 5
+    assert pool.pool is not workers
+
+
+def test_finished_pages_are_cached(pdf, cache, pool, monkeypatch):
+    loader = ParallelPDFLoader(pdf, pool=None, file_hash="h")
+    assert len(loader.load()) == 5
+    assert cache.get_stats()["size"] > 0
+
+    def extract(*args):
+        raise AssertionError("extracted a cached page")
+
+    monkeypatch.setattr(loaders, "_extract_pdf_pages", extract)
+    assert len(ParallelPDFLoader(pdf, pool=pool, file_hash="h").load()) == 5
+
+
+def test_pages_are_not_cached_without_hash(pdf, cache):
+    ParallelPDFLoader(pdf, pool=None).load()
+    assert cache.get_stats()["size"] == 0
+
+
+def test_get_loader_passes_the_hash(pdf):
+    loader, known_type = get_loader("blank.pdf", "application/pdf", pdf, file_hash="h")
+    assert isinstance(loader, ParallelPDFLoader)
+    assert loader.file_hash == "h"
+    assert known_type
@@ -0,0 +1,39 @@
+from langchain_core.documents import Document
+
+from apps.rag.qa import is_qa_file_name, parse_qa_documents
+
+
+def test_is_qa_file_name():
+    assert is_qa_file_name("门诊常见问题.docx")
+    assert is_qa_file_name("QA.txt")
+    assert is_qa_file_name("Q&A list.pdf")
+    assert not is_qa_file_name("report.pdf")
+
+
+def test_parse_numbered_pairs():
+    text = "常见问题\n1) Q: 如何重置密码？\nA: 点击忘记密码。\n\n2） Q：如何挂号？\nA：在线挂号。"
+    assert parse_qa_documents([Document(page_content=text)]) == [
+        ("如何重置密码？", "点击忘记密码。"),
+        ("如何挂号？", "在线挂号。"),
+    ]
+
+
+def test_whitespace_and_zero_width_characters():
+    text = "FAQ\nQ: 营业‌时间？\nA:  周一至‍周五   9点"
+    # Runs of whitespace become a single newline
+    assert parse_qa_documents([Document(page_content=text)]) == [
+        ("营业时间？", "周一至周五\n9点")
+    ]
+
+
+def test_pairs_of_every_document():
+    documents = [
+        Document(page_content="page 1\nQ: 第一？\nA: 一"),
+        Document(page_content="page 2\nQ: 第二？\nA: 二\nQ: 没有答案？"),
+        Document(page_content="no questions here"),
+    ]
+    assert parse_qa_documents(documents) == [
+        ("第一？", "一"),
+        ("第二？", "二"),
+        ("没有答案？", ""),
+    ]
@@ -0,0 +1,96 @@
+import time
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from apps.rag.rerank_batcher import RerankBatcher
+
+
+class FakeCrossEncoder:
+    def __init__(self, block: threading.Event = None):
+        self.calls = []
+        self.block = block
+        self.entered = threading.Event()
+
+    def predict(self, pairs, batch_size):
+        self.entered.set()
+        if self.block is not None:
+            self.block.wait(5)
+        self.calls.append(list(pairs))
+        return np.array([float(len(passage)) for _, passage in pairs])
+
+
+def test_batches_concurrent_requests():
+    model = FakeCrossEncoder()
+    batcher = RerankBatcher(model, "fake", max_wait_ms=200, max_batch_size=64)
+    try:
+        requests = [[("q", "a" * i), ("q", "b" * (i + 1))] for i in range(1, 5)]
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(batcher.predict, requests))
+
+        for request, scores in zip(requests, results):
+            assert scores.tolist() == [float(len(p)) for _, p in request]
+        assert sum(len(call) for call in model.calls) == 8
+        assert len(model.calls) < 4
+        assert batcher.predict([]).tolist() == []
+    finally:
+        batcher.close()
+
+
+def test_model_errors_reach_every_request():
+    class FailingCrossEncoder:
+        def predict(self, pairs, batch_size):
+            raise ValueError("boom")
+
+    batcher = RerankBatcher(FailingCrossEncoder(), "fake", 0, 64)
+    try:
+        with pytest.raises(ValueError):
+            batcher.predict([("q", "a")])
+    finally:
+        batcher.close()
+
+
+def test_close_rejects_new_requests():
+    batcher = RerankBatcher(FakeCrossEncoder(), "fake", 0, 64)
+    assert batcher.predict([("q", "ab")]).tolist() == [2.0]
+
+    batcher.close()
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.predict([("q", "a")])
+    batcher.thread.join(5)
+    assert not batcher.thread.is_alive()
+
+
+def test_close_fails_queued_requests():
+    block = threading.Event()
+    model = FakeCrossEncoder(block)
+    batcher = RerankBatcher(model, "fake", 0, 1)
+
+    with ThreadPoolExecutor(2) as executor:
+        running = executor.submit(batcher.predict, [("q", "a")])
+        # Queue a second request behind the one being scored, then close
+        assert model.entered.wait(5)
+        queued = executor.submit(batcher.predict, [("q", "bb")])
+        while batcher.queue.qsize() == 0:
+            time.sleep(0.001)
+        batcher.close()
+        block.set()
+
+        assert running.result(5).tolist() == [1.0]
+        with pytest.raises(RuntimeError):
+            queued.result(5)
+
+
+def test_timeout():
+    block = threading.Event()
+    batcher = RerankBatcher(FakeCrossEncoder(block), "fake", 0, 64, timeout=0.05)
+    try:
+        with pytest.raises(TimeoutError):
+            batcher.predict([("q", "a")])
+    finally:
+        block.set()
+        batcher.close()
@@ -0,0 +1,103 @@
+import time
+
+from apps.rag.retrieval_cache import RetrievalCache
+
+
+class FakeEmbeddingFunction:
+    engine = "openai"
+    model = "text-embedding-3-small"
+
+
+def get_key(cache, collection_names, query="what is rag", **kwargs):
+    return cache.get_key(
+        collection_names, query, 4, None, False, FakeEmbeddingFunction(), **kwargs
+    )
+
+
+def store(cache, collection_names, result, **kwargs):
+    key = get_key(cache, collection_names, **kwargs)
+    cache.set(key, cache.get_versions(collection_names), result)
+    return key
+
+
+def test_hit_returns_a_copy():
+    cache = RetrievalCache(10, 60)
+    key = store(cache, ["a", "b"], {"documents": [["x"]]})
+
+    # Collection order and whitespace do not matter
+    result = cache.get(get_key(cache, ["b", "a"], query="what  is\nrag"))
+    assert result == {"documents": [["x"]]}
+    result["documents"][0].append("y")
+    assert cache.get(key) == {"documents": [["x"]]}
+    assert cache.get_stats()["hits"] == 2
+
+
+def test_key_includes_the_filter():
+    cache = RetrievalCache(10, 60)
+    store(cache, ["a"], {"documents": [["x"]]}, where={"file_id": "1"})
+
+    assert cache.get(get_key(cache, ["a"])) is None
+    assert cache.get(get_key(cache, ["a"], where={"file_id": "2"})) is None
+    assert cache.get(get_key(cache, ["a"], where={"file_id": "1"})) is not None
+
+
+def test_bump_invalidates_the_collection():
+    cache = RetrievalCache(10, 60)
+    key_a = store(cache, ["a"], {"documents": [["x"]]})
+    key_ab = store(cache, ["a", "b"], {"documents": [["y"]]})
+    key_b = store(cache, ["b"], {"documents": [["z"]]})
+
+    cache.bump("a")
+    assert cache.get(key_a) is None
+    assert cache.get(key_ab) is None
+    assert cache.get(key_b) is not None
+    assert cache.get_stats()["stale"] == 2
+
+    cache.bump_all()
+    assert cache.get(key_b) is None
+
+
+def test_write_during_query_is_not_cached():
+    cache = RetrievalCache(10, 60)
+    key = get_key(cache, ["a"])
+    versions = cache.get_versions(["a"])
+
+    # The collection changed while the query was running
+    cache.bump("a")
+    cache.set(key, versions, {"documents": [["old"]]})
+    assert cache.get(key) is None
+
+    versions = cache.get_versions(["a"])
+    cache.bump_all()
+    cache.set(key, versions, {"documents": [["old"]]})
+    assert cache.get_stats()["size"] == 0
+
+
+def test_ttl_and_eviction():
+    cache = RetrievalCache(2, 0.05)
+    key_a = store(cache, ["a"], {"documents": [["a"]]})
+    store(cache, ["b"], {"documents": [["b"]]})
+    store(cache, ["c"], {"documents": [["c"]]})
+    assert cache.get(key_a) is None
+    assert cache.get_stats()["evictions"] == 1
+
+    key_d = store(cache, ["d"], {"documents": [["d"]]})
+    time.sleep(0.1)
+    assert cache.get(key_d) is None
+
+
+def test_disabled():
+    cache = RetrievalCache(0, 60)
+    key = store(cache, ["a"], {"documents": [["x"]]})
+    assert cache.get(key) is None
+
+
+def test_contains_does_not_count_lookups():
+    cache = RetrievalCache(10, 60)
+    key = store(cache, ["a"], {"documents": [["x"]]})
+
+    assert cache.contains(key)
+    assert not cache.contains(get_key(cache, ["b"]))
+    cache.bump("a")
+    assert not cache.contains(key)
+    assert cache.get_stats()["hits"] == cache.get_stats()["misses"] == 0
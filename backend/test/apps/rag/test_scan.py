@@ -0,0 +1,104 @@
+import os
+from types import SimpleNamespace
+
+from apps.rag.scan import (
+    SCAN_COLLECTION_PREFIX,
+    get_scan_collection_name,
+    get_scan_executor,
+    hash_file,
+    list_files,
+    map_files,
+    plan_scan,
+)
+
+
+def entry(size, mtime_ns):
+    return SimpleNamespace(size=size, mtime_ns=mtime_ns)
+
+
+def test_plan_scan():
+    files = {"same": (1, 10), "touched": (1, 20), "resized": (2, 10), "new": (3, 30)}
+    manifest = {
+        "same": entry(1, 10),
+        "touched": entry(1, 10),
+        "resized": entry(1, 10),
+        "gone": entry(4, 40),
+    }
+
+    plan = plan_scan(files, manifest)
+    assert plan.added == {"new": (3, 30)}
+    assert plan.changed == {"touched": (1, 20), "resized": (2, 10)}
+    assert plan.deleted == ["gone"]
+    assert plan.unchanged == 1
+    assert plan.to_dict() == {
+        "added": ["new"],
+        "changed": ["resized", "touched"],
+        "deleted": ["gone"],
+        "unchanged": 1,
+    }
+
+
+def test_plan_scan_empty_manifest():
+    plan = plan_scan({"a": (1, 1), "b": (2, 2)}, {})
+    assert sorted(plan.added) == ["a", "b"]
+    assert not plan.changed and not plan.deleted and plan.unchanged == 0
+
+
+def test_list_files(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.txt").write_text("hello")
+    (tmp_path / "b.md").write_text("hi")
+    (tmp_path / ".hidden").write_text("secret")
+
+    files = list_files(str(tmp_path))
+    assert sorted(files) == [str(tmp_path / "b.md"), str(tmp_path / "sub" / "a.txt")]
+
+    path = str(tmp_path / "sub" / "a.txt")
+    assert files[path] == (5, os.stat(path).st_mtime_ns)
+
+
+def test_scan_collection_name():
+    name = get_scan_collection_name("a" * 64)
+    assert name.startswith(SCAN_COLLECTION_PREFIX)
+    assert len(name) == 63
+
+
+def test_map_files(tmp_path):
+    (tmp_path / "a").write_text("a")
+    paths = [str(tmp_path / "a"), str(tmp_path / "missing")]
+
+    results = {
+        path: (result, error)
+        for path, result, error in map_files(None, hash_file, paths)
+    }
+    assert results[paths[0]][0] == (
+        "ca978112ca1bbdcafac231b39a23dc4da786eff8147c4e72b9807785afee48bb"
+    )
+    assert isinstance(results[paths[1]][1], FileNotFoundError)
+
+    seen = list(
+        map_files(
+            None,
+            lambda path, suffix, hash: path + suffix + hash,
+            paths[:1],
+            "-",
+            file_hashes={paths[0]: "h"},
+        )
+    )
+    assert seen == [(paths[0], paths[0] + "-h", None)]
+
+
+def test_map_files_in_worker_processes(tmp_path):
+    paths = []
+    for name in "abc":
+        (tmp_path / name).write_text(name)
+        paths.append(str(tmp_path / name))
+
+    executor = get_scan_executor(2)
+    try:
+        results = {
+            path: result for path, result, _ in map_files(executor, hash_file, paths)
+        }
+    finally:
+        executor.shutdown()
+    assert results == {path: hash_file(path) for path in paths}
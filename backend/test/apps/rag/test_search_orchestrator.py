@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+
+from apps.rag.search.main import SearchResult
+from apps.rag.search.orchestrator import (
+    SearchOrchestrator,
+    merge_results,
+    normalize_url,
+)
+
+
+def result(link):
+    return SearchResult(link=link, title=link, snippet=None)
+
+
+def links(results):
+    return [r.link for r in results]
+
+
+class FakeEngines:
+    def __init__(self, delays=None, failing=()):
+        self.delays = delays or {}
+        self.failing = set(failing)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, engine, query):
+        with self.lock:
+            self.calls.append(engine)
+        time.sleep(self.delays.get(engine, 0))
+        if engine in self.failing:
+            raise ConnectionError(f"{engine} is down")
+        return [result(f"https://{engine}.example/{query}")]
+
+
+def test_normalize_url():
+    assert normalize_url(" HTTPS://Example.COM/a/#top") == "https://example.com/a"
+    assert normalize_url("https://example.com") == "https://example.com/"
+    assert normalize_url("https://example.com/?q=1") == "https://example.com/?q=1"
+
+
+def test_merge_results():
+    merged = merge_results(
+        [
+            [result("https://a.com"), result("https://b.com"), result("https://c.com")],
+            [
+                result("https://c.com/"),
+                result("https://d.com"),
+                result("https://B.com"),
+            ],
+        ]
+    )
+    # c is ranked 3rd and 1st, b 2nd and 3rd, ties keep the first seen order
+    assert links(merged) == [
+        "https://c.com",
+        "https://b.com",
+        "https://a.com",
+        "https://d.com",
+    ]
+    assert links(merge_results([[result("https://a.com")], []], 0)) == []
+    assert len(merge_results([[result(f"https://{i}.com") for i in range(5)]], 2)) == 2
+
+
+def test_parallel_merges_engines():
+    engines = FakeEngines(failing={"b"})
+    orchestrator = SearchOrchestrator(mode="parallel", timeout=1)
+
+    results = orchestrator.search(["a", "b", "c"], "q", engines, count=5)
+    assert links(results) == ["https://a.example/q", "https://c.example/q"]
+    assert orchestrator.get_stats()["engines"]["b"]["failures"] == 1
+
+
+def test_parallel_raises_when_every_engine_fails():
+    orchestrator = SearchOrchestrator(mode="parallel", timeout=1)
+    with pytest.raises(ConnectionError):
+        orchestrator.search(["a", "b"], "q", FakeEngines(failing={"a", "b"}))
+
+
+def test_hedge_starts_the_next_engine_after_the_delay():
+    engines = FakeEngines(delays={"a": 1.0})
+    orchestrator = SearchOrchestrator(mode="hedge", hedge_delay=0.05, timeout=2)
+
+    start = time.monotonic()
+    results = orchestrator.search(["a", "b"], "q", engines)
+    assert time.monotonic() - start < 0.5
+    assert links(results) == ["https://b.example/q"]
+
+
+def test_hedge_prefers_the_first_engine():
+    engines = FakeEngines()
+    orchestrator = SearchOrchestrator(mode="hedge", hedge_delay=0.5, timeout=2)
+
+    assert links(orchestrator.search(["a", "b"], "q", engines)) == [
+        "https://a.example/q"
+    ]
+    assert engines.calls == ["a"]
+
+
+def test_circuit_breaker():
+    engines = FakeEngines(failing={"a"})
+    orchestrator = SearchOrchestrator(
+        mode="hedge",
+        hedge_delay=0.5,
+        timeout=2,
+        breaker_threshold=2,
+        breaker_cooldown=0.2,
+    )
+
+    for _ in range(2):
+        orchestrator.search(["a", "b"], "q", engines)
+    assert engines.calls == ["a", "b", "a", "b"]
+    assert orchestrator.get_stats()["engines"]["a"]["breaker"] == "open"
+
+    # a is skipped while its breaker is open
+    orchestrator.search(["a", "b"], "q", engines)
+    assert engines.calls[4:] == ["b"]
+
+    # but is still used when it is the only engine
+    with pytest.raises(ConnectionError):
+        orchestrator.search(["a"], "q", engines)
+
+    time.sleep(0.25)
+    engines.failing.clear()
+    orchestrator.search(["a", "b"], "q", engines)
+    assert engines.calls[-1] == "a"
+    assert orchestrator.get_stats()["engines"]["a"]["breaker"] == "closed"
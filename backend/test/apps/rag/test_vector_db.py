@@ -0,0 +1,315 @@
+import numpy as np
+import pytest
+
+from apps.rag.vector.main import CollectionExistsError
+
+
+BACKENDS = ["chroma", "flat", "flat-float16", "flat-hnsw"]
+
+
+def make_client(backend: str, path: str):
+    if backend == "chroma":
+        chromadb = pytest.importorskip("chromadb")
+        from apps.rag.vector.chroma import ChromaClient
+
+        return ChromaClient(
+            chromadb.PersistentClient(
+                path=path,
+                settings=chromadb.Settings(
+                    allow_reset=True, anonymized_telemetry=False
+                ),
+            )
+        )
+
+    from apps.rag.vector.flat import FlatClient, hnswlib
+
+    if backend == "flat-hnsw":
+        if hnswlib is None:
+            pytest.skip("hnswlib is not installed")
+        return FlatClient(path, hnsw=True, hnsw_min_size=0)
+    if backend == "flat-float16":
+        return FlatClient(path, dtype="float16")
+    return FlatClient(path)
+
+
+@pytest.fixture(params=BACKENDS)
+def open_client(request, tmp_path):
+    """Open a client of the backend on the same directory, e.g. to reopen it."""
+    return lambda: make_client(request.param, str(tmp_path))
+
+
+@pytest.fixture
+def client(open_client):
+    return open_client()
+
+
+def add_points(collection):
+    collection.add(
+        ids=["a", "b", "c", "d"],
+        embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0], [-1.0, 0.0]],
+        documents=["A", "B", "C", "D"],
+        metadatas=[
+            {"file_id": "f1", "page": 1},
+            {"file_id": "f1", "page": 2},
+            {"file_id": "f2", "page": 1},
+            {"file_id": "f3", "page": 3},
+        ],
+    )
+
+
+class TestVectorDB:
+    def test_collections(self, client):
+        with pytest.raises(ValueError):
+            client.get_collection("missing")
+
+        client.create_collection("docs")
+        with pytest.raises(CollectionExistsError):
+            client.create_collection("docs")
+        assert client.get_or_create_collection("docs").name == "docs"
+        client.get_or_create_collection("memories")
+        assert sorted(c.name for c in client.list_collections()) == [
+            "docs",
+            "memories",
+        ]
+
+        client.delete_collection("docs")
+        with pytest.raises(ValueError):
+            client.get_collection("docs")
+        with pytest.raises(ValueError):
+            client.delete_collection("docs")
+
+        client.reset()
+        assert client.list_collections() == []
+
+    def test_add_and_get(self, client):
+        collection = client.create_collection("docs")
+        add_points(collection)
+        # Adding an existing id leaves the record unchanged
+        collection.add(ids=["a"], embeddings=[[9.0, 9.0]], documents=["A2"])
+        assert collection.count() == 4
+
+        result = collection.get(ids=["c", "a", "missing"])
+        records = sorted(zip(result["ids"], result["documents"], result["metadatas"]))
+        assert records == [
+            ("a", "A", {"file_id": "f1", "page": 1}),
+            ("c", "C", {"file_id": "f2", "page": 1}),
+        ]
+        assert result["embeddings"] is None
+
+        result = collection.get(ids=["c"], include=["embeddings"])
+        assert np.allclose(result["embeddings"][0], [1.0, 1.0])
+        assert result["documents"] is None
+
+        assert sorted(collection.get()["ids"]) == ["a", "b", "c", "d"]
+        assert sorted(collection.get(where={"file_id": "f1"})["ids"]) == ["a", "b"]
+        assert sorted(
+            collection.get(
+                where={"$and": [{"page": {"$gte": 1}}, {"file_id": {"$ne": "f1"}}]}
+            )["ids"]
+        ) == ["c", "d"]
+        assert sorted(
+            collection.get(where={"file_id": {"$in": ["f2", "f3"]}})["ids"]
+        ) == ["c", "d"]
+        assert len(collection.get(limit=2)["ids"]) == 2
+
+    def test_upsert(self, client):
+        collection = client.create_collection("docs")
+        add_points(collection)
+        collection.upsert(
+            ids=["a", "e"],
+            embeddings=[[0.0, -1.0], [2.0, 2.0]],
+            documents=["A2", "E"],
+        )
+
+        assert collection.count() == 5
+        result = collection.get(
+            ids=["a"], include=["embeddings", "documents", "metadatas"]
+        )
+        assert np.allclose(result["embeddings"][0], [0.0, -1.0])
+        assert result["documents"] == ["A2"]
+        # Metadatas that were not given are kept
+        assert result["metadatas"] == [{"file_id": "f1", "page": 1}]
+
+    def test_query(self, client):
+        collection = client.create_collection("docs")
+        add_points(collection)
+
+        result = collection.query(query_embeddings=[[2.0, 0.0]], n_results=2)
+        assert result["ids"] == [["a", "c"]]
+        # Squared L2 distances
+        assert np.allclose(result["distances"][0], [1.0, 2.0], atol=1e-2)
+        assert result["documents"] == [["A", "C"]]
+        assert result["metadatas"][0][0] == {"file_id": "f1", "page": 1}
+
+        result = collection.query(
+            query_embeddings=[[2.0, 0.0], [0.0, 2.0]],
+            n_results=1,
+            include=["distances"],
+        )
+        assert result["ids"] == [["a"], ["b"]]
+        assert result["documents"] is None
+
+        result = collection.query(
+            query_embeddings=[[2.0, 0.0]], n_results=10, where={"file_id": "f1"}
+        )
+        assert result["ids"] == [["a", "b"]]
+
+        result = collection.query(
+            query_embeddings=[[2.0, 0.0]], n_results=10, where={"file_id": "none"}
+        )
+        assert result["ids"] == [[]]
+
+    def test_delete(self, client):
+        collection = client.create_collection("docs")
+        add_points(collection)
+
+        collection.delete(ids=["a", "missing"])
+        collection.delete(where={"file_id": "f3"})
+        assert collection.count() == 2
+        assert sorted(collection.get()["ids"]) == ["b", "c"]
+
+        result = collection.query(query_embeddings=[[2.0, 0.0]], n_results=10)
+        assert result["ids"] == [["c", "b"]]
+
+    def test_dimension_mismatch(self, client):
+        collection = client.create_collection("docs")
+        add_points(collection)
+        with pytest.raises(Exception):
+            collection.add(ids=["x"], embeddings=[[1.0, 2.0, 3.0]], documents=["X"])
+        assert collection.count() == 4
+
+    def test_persistence(self, open_client):
+        collection = open_client().create_collection("docs")
+        add_points(collection)
+        collection.delete(ids=["b"])
+
+        collection = open_client().get_collection("docs")
+        assert collection.count() == 3
+        result = collection.query(query_embeddings=[[0.0, 2.0]], n_results=1)
+        assert result["ids"] == [["c"]]
+
+    def test_nearest_neighbours(self, client):
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((500, 8)).astype(np.float32)
+        collection = client.create_collection("docs")
+        collection.add(
+            ids=[str(i) for i in range(len(embeddings))],
+            embeddings=embeddings.tolist(),
+            documents=[f"doc {i}" for i in range(len(embeddings))],
+            metadatas=[{"parity": i % 2} for i in range(len(embeddings))],
+        )
+
+        # HNSW search is approximate, the nearest neighbour only has to be found
+        # among the top 5
+        odd = np.arange(1, len(embeddings), 2)
+        for query in rng.standard_normal((10, 8)).astype(np.float32):
+            distances = ((embeddings - query) ** 2).sum(axis=1)
+            result = collection.query(query_embeddings=[query.tolist()], n_results=5)
+            assert str(int(np.argmin(distances))) in result["ids"][0]
+            assert result["distances"][0] == sorted(result["distances"][0])
+
+            result = collection.query(
+                query_embeddings=[query.tolist()], n_results=5, where={"parity": 1}
+            )
+            assert str(int(odd[np.argmin(distances[odd])])) in result["ids"][0]
+            assert all(int(id) % 2 == 1 for id in result["ids"][0])
+
+    def test_filtered_hybrid_search(self, client):
+        from apps.rag.bm25 import BM25Index
+        from apps.rag.fusion import hybrid_search
+
+        collection = client.create_collection("docs")
+        add_points(collection)
+        index = BM25Index()
+        index.add(["a", "b", "c", "d"], ["apple", "apple pie", "apple tart", "pear"])
+
+        result = hybrid_search(
+            collection,
+            index,
+            "apple",
+            [1.0, 0.0],
+            4,
+            None,
+            0.0,
+            where={"file_id": "f1"},
+        )
+        assert sorted(m["file_id"] for m in result["metadatas"][0]) == ["f1", "f1"]
+
+        result = hybrid_search(
+            collection, index, "apple", [1.0, 0.0], 4, None, 0.0, where={"file_id": "x"}
+        )
+        assert result["documents"] == [[]]
+
+
+class TestFlatVectorDB:
+    def test_compaction(self, tmp_path):
+        from apps.rag.vector.flat import COMPACT_MIN_DEAD_ROWS, FlatClient
+
+        collection = FlatClient(str(tmp_path)).create_collection("docs")
+        add_points(collection)
+        for i in range(COMPACT_MIN_DEAD_ROWS + 10):
+            collection.upsert(ids=["a"], embeddings=[[1.0, float(i)]])
+
+        assert collection.meta["generation"] >= 1
+        assert len(collection.ids) < COMPACT_MIN_DEAD_ROWS
+        result = collection.get(ids=["a"], include=["embeddings", "documents"])
+        assert np.allclose(result["embeddings"][0], [1.0, COMPACT_MIN_DEAD_ROWS + 9])
+        assert result["documents"] == ["A"]
+
+        collection = FlatClient(str(tmp_path)).get_collection("docs")
+        assert collection.count() == 4
+
+    def test_other_process_writes(self, tmp_path):
+        from apps.rag.vector.flat import FlatClient
+
+        reader = FlatClient(str(tmp_path)).create_collection("docs")
+        writer = FlatClient(str(tmp_path)).get_collection("docs")
+        add_points(writer)
+        assert reader.count() == 4
+        writer.delete(ids=["a"])
+        assert reader.query(query_embeddings=[[2.0, 0.0]], n_results=1)["ids"] == [
+            ["c"]
+        ]
+
+    def test_invalid_names(self, tmp_path):
+        from apps.rag.vector.flat import FlatClient
+
+        client = FlatClient(str(tmp_path))
+        for name in ["../docs", "a", "docs/x", "a..b"]:
+            with pytest.raises(ValueError):
+                client.create_collection(name)
+
+
+class TestCachedVectorDB:
+    def test_handles(self, tmp_path):
+        from apps.rag.vector.cache import CachedVectorDBClient
+        from apps.rag.vector.flat import FlatClient
+
+        client = CachedVectorDBClient(FlatClient(str(tmp_path)), ttl=60)
+        with pytest.raises(ValueError):
+            client.get_collection("docs")
+
+        created = client.create_collection("docs")
+        assert client.get_collection("docs") is created
+        assert client.get_or_create_collection("docs") is created
+        assert client.get_stats()["hits"] == 2
+
+        client.delete_collection("docs")
+        assert client.get_stats()["size"] == 0
+        with pytest.raises(ValueError):
+            client.get_collection("docs")
+
+        client.create_collection("docs")
+        client.get_collection("docs")
+        client.reset()
+        with pytest.raises(ValueError):
+            client.get_collection("docs")
+
+    def test_disabled(self, tmp_path):
+        from apps.rag.vector.cache import CachedVectorDBClient
+        from apps.rag.vector.flat import FlatClient
+
+        client = CachedVectorDBClient(FlatClient(str(tmp_path)), ttl=0)
+        client.create_collection("docs")
+        client.get_collection("docs")
+        assert client.get_stats()["size"] == 0
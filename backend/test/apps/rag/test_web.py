@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from aiohttp import web
+
+from apps.rag.disk_cache import DiskCache
+from apps.rag.web import HTMLTextParser, WebFetcher
+
+PAGE = """<html lang="en"><head><title>Hello</title>
+<meta name="description" content="A page"><style>p { color: red }</style></head>
+<body><h1>Heading</h1><p>First &amp; second</p><script>var x = 1;</script>
+<ul><li>one</li><li>two</li></ul></body></html>"""
+
+
+def test_html_text_parser_in_chunks():
+    parser = HTMLTextParser()
+    for i in range(0, len(PAGE), 7):
+        parser.feed(PAGE[i : i + 7])
+    parser.close()
+
+    assert parser.get_text() == "Heading\nFirst & second\none\ntwo"
+    assert parser.get_metadata() == {
+        "title": "Hello",
+        "description": "A page",
+        "language": "en",
+    }
+
+
+def test_html_text_parser_without_metadata():
+    parser = HTMLTextParser()
+    parser.feed("<div>text</div>")
+    assert parser.get_metadata() == {"language": "No language found."}
+
+
+@pytest.fixture(scope="module")
+def server():
+    requests = []
+
+    async def page(request):
+        requests.append(request.path)
+        return web.Response(text=PAGE, content_type="text/html")
+
+    async def slow(request):
+        await asyncio.sleep(5)
+        return web.Response(text="late", content_type="text/plain")
+
+    async def etag(request):
+        requests.append(request.path)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(
+            text="<p>cached</p>", content_type="text/html", headers={"ETag": '"v1"'}
+        )
+
+    async def big(request):
+        return web.Response(text="a" * 100_000, content_type="text/plain")
+
+    async def binary(request):
+        return web.Response(body=b"\x89PNG", content_type="image/png")
+
+    async def missing(request):
+        raise web.HTTPNotFound()
+
+    app = web.Application()
+    app.router.add_get("/page", page)
+    app.router.add_get("/slow", slow)
+    app.router.add_get("/etag", etag)
+    app.router.add_get("/big", big)
+    app.router.add_get("/binary", binary)
+    app.router.add_get("/missing", missing)
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = runner.addresses[0][1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{port}", requests
+
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+@pytest.fixture
+def fetcher():
+    fetcher = WebFetcher(timeout=1.0, url_timeout=0.5, max_size=1000, per_host=2)
+    yield fetcher
+    fetcher.close()
+
+
+def test_fetch_in_order_and_skip_failures(server, fetcher):
+    url, _ = server
+    urls = [f"{url}/missing", f"{url}/binary", f"{url}/big", f"{url}/page"]
+
+    documents = fetcher.fetch(urls + [f"{url}/page"])
+    assert [doc.metadata["source"] for doc in documents] == [
+        f"{url}/big",
+        f"{url}/page",
+    ]
+    assert documents[0].page_content == "a" * 1000
+    assert documents[1].page_content.startswith("Heading")
+    assert documents[1].metadata["title"] == "Hello"
+
+
+def test_slow_pages_are_dropped(server, fetcher):
+    url, _ = server
+    fetcher.url_timeout = 5.0
+
+    start = time.monotonic()
+    documents = fetcher.fetch([f"{url}/slow", f"{url}/page"])
+    assert time.monotonic() - start < 3
+    assert [doc.metadata["source"] for doc in documents] == [f"{url}/page"]
+
+
+def test_url_timeout(server, fetcher):
+    url, _ = server
+    fetcher.timeout = 5.0
+
+    start = time.monotonic()
+    assert fetcher.fetch([f"{url}/slow"]) == []
+    assert time.monotonic() - start < 3
+
+
+def test_not_modified_pages_come_from_the_cache(server, tmp_path):
+    url, requests = server
+    fetcher = WebFetcher(page_cache=DiskCache(str(tmp_path), 1024 * 1024))
+    try:
+        first = fetcher.fetch([f"{url}/etag"])
+        second = fetcher.fetch([f"{url}/etag"])
+    finally:
+        fetcher.close()
+
+    assert requests.count("/etag") == 2
+    assert [doc.page_content for doc in first + second] == ["cached", "cached"]
+    assert fetcher.page_cache.get_stats()["hits"] == 1
@@ -0,0 +1,67 @@
+import hashlib
+import os
+from unittest.mock import patch
+
+from test.util.abstract_integration_test import AbstractPostgresTest
+from test.util.mock_user import mock_webui_user
+
+
+class TestFiles(AbstractPostgresTest):
+
+    BASE_PATH = "/api/v1/files"
+
+    def setup_class(cls):
+        super().setup_class()
+        from apps.webui.models.files import Files
+
+        cls.files = Files
+
+    def upload(self, content: bytes, name: str = "notes.txt"):
+        with mock_webui_user(id="2"):
+            return self.fast_api_client.post(
+                self.create_url("/"), files={"file": (name, content, "text/plain")}
+            )
+
+    def delete(self, id: str):
+        with mock_webui_user(id="2"):
+            response = self.fast_api_client.delete(self.create_url(f"/{id}"))
+        assert response.status_code == 200
+
+    def test_identical_uploads_share_a_blob(self):
+        first = self.upload(b"same content").json()
+        second = self.upload(b"same content", "copy.txt").json()
+        assert first["id"] != second["id"]
+        assert first["hash"] == second["hash"]
+        assert first["meta"]["path"] == second["meta"]["path"]
+        assert os.path.exists(first["meta"]["path"])
+        assert self.files.get_file_count_by_hash(first["hash"]) == 2
+
+        # The blob stays while another file references it
+        self.delete(first["id"])
+        assert self.files.get_file_count_by_hash(first["hash"]) == 1
+        assert os.path.exists(first["meta"]["path"])
+
+        # and is removed with the last one
+        self.delete(second["id"])
+        assert self.files.get_file_count_by_hash(first["hash"]) == 0
+        assert not os.path.exists(first["meta"]["path"])
+
+    def test_different_uploads_have_their_own_blobs(self):
+        first = self.upload(b"first content").json()
+        second = self.upload(b"second content").json()
+        assert first["meta"]["path"] != second["meta"]["path"]
+
+        self.delete(first["id"])
+        assert not os.path.exists(first["meta"]["path"])
+        assert os.path.exists(second["meta"]["path"])
+        self.delete(second["id"])
+
+    def test_failed_insert_removes_the_new_blob(self):
+        from apps.webui.routers.files import get_blob_path
+
+        with patch.object(self.files, "insert_new_file", return_value=None):
+            response = self.upload(b"never stored")
+        assert response.status_code == 400
+
+        file_hash = hashlib.sha256(b"never stored").hexdigest()
+        assert not os.path.exists(get_blob_path(file_hash, "notes.txt"))
@@ -0,0 +1,224 @@
+"""Micro-benchmark: native id/score fusion vs the LangChain ensemble stack.
+
+Compares per-query CPU time and peak Python allocations of apps.rag.fusion.hybrid_search
+against the EnsembleRetriever -> ContextualCompressionRetriever -> compressor chain it
+replaced, on an in-memory collection (no Chroma round-trips are measured).
+
+Run from the backend directory:
+
+    python -m test.benchmark.hybrid_fusion_bench --chunks 20000 --k 5 --queries 50
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+from langchain.retrievers import ContextualCompressionRetriever, EnsembleRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun, Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from langchain_core.retrievers import BaseRetriever
+
+from apps.rag.bm25 import BM25Index
+from apps.rag.fusion import cosine_similarity, hybrid_search
+
+
+class InMemoryCollection:
+    """The subset of the Chroma collection API used by hybrid search."""
+
+    def __init__(self, ids, documents, metadatas, embeddings):
+        self.ids = ids
+        self.positions = {id: idx for idx, id in enumerate(ids)}
+        self.documents = documents
+        self.metadatas = metadatas
+        self.embeddings = embeddings
+        self.normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    def query(
+        self,
+        query_embeddings,
+        n_results,
+        where=None,
+        include=("documents", "metadatas"),
+    ):
+        query = np.asarray(query_embeddings[0], dtype=np.float32)
+        distances = 1 - self.normalized @ (query / np.linalg.norm(query))
+        top = np.argsort(distances)[:n_results]
+        result = {"ids": [[self.ids[i] for i in top]]}
+        if "distances" in include:
+            result["distances"] = [distances[top].tolist()]
+        if "documents" in include:
+            result["documents"] = [[self.documents[i] for i in top]]
+        if "metadatas" in include:
+            result["metadatas"] = [[self.metadatas[i] for i in top]]
+        return result
+
+    def get(self, ids, include=("documents", "metadatas")):
+        idx = [self.positions[id] for id in ids]
+        result = {"ids": list(ids)}
+        if "documents" in include:
+            result["documents"] = [self.documents[i] for i in idx]
+        if "metadatas" in include:
+            result["metadatas"] = [self.metadatas[i] for i in idx]
+        if "embeddings" in include:
+            result["embeddings"] = self.embeddings[idx]
+        return result
+
+
+class LegacyBM25Retriever(BaseRetriever):
+    collection: Any
+    index: Any
+    top_n: int
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        ids = [id for id, _ in self.index.search(query, self.top_n)]
+        result = self.collection.get(ids=ids)
+        return [
+            Document(page_content=document, metadata={**metadata, "id": id})
+            for id, document, metadata in zip(
+                result["ids"], result["documents"], result["metadatas"]
+            )
+        ]
+
+
+class LegacyChromaRetriever(BaseRetriever):
+    collection: Any
+    query_embedding: Any
+    top_n: int
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        result = self.collection.query(
+            query_embeddings=[self.query_embedding], n_results=self.top_n
+        )
+        return [
+            Document(page_content=document, metadata={**metadata, "id": id})
+            for id, document, metadata in zip(
+                result["ids"][0], result["documents"][0], result["metadatas"][0]
+            )
+        ]
+
+
+class LegacyCompressor(BaseDocumentCompressor):
+    collection: Any
+    query_embedding: Any
+    top_n: int
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        embeddings = self.collection.get(
+            ids=[doc.metadata["id"] for doc in documents], include=["embeddings"]
+        )["embeddings"]
+        scores = cosine_similarity(self.query_embedding, embeddings).tolist()
+        result = sorted(zip(documents, scores), key=lambda x: x[1], reverse=True)
+        return [
+            Document(
+                page_content=doc.page_content, metadata={**doc.metadata, "score": s}
+            )
+            for doc, s in result[: self.top_n]
+        ]
+
+
+def legacy_hybrid_search(collection, index, query, query_embedding, k):
+    ensemble = EnsembleRetriever(
+        retrievers=[
+            LegacyBM25Retriever(collection=collection, index=index, top_n=k),
+            LegacyChromaRetriever(
+                collection=collection, query_embedding=query_embedding, top_n=k
+            ),
+        ],
+        weights=[0.5, 0.5],
+    )
+    retriever = ContextualCompressionRetriever(
+        base_compressor=LegacyCompressor(
+            collection=collection, query_embedding=query_embedding, top_n=k
+        ),
+        base_retriever=ensemble,
+    )
+    result = retriever.invoke(query)
+    return {
+        "distances": [[d.metadata["score"] for d in result]],
+        "documents": [[d.page_content for d in result]],
+        "metadatas": [[d.metadata for d in result]],
+    }
+
+
+def build_collection(chunks: int, dim: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    ids = [f"chunk-{i}" for i in range(chunks)]
+    documents = [" ".join(rng.choices(vocabulary, k=200)) for _ in range(chunks)]
+    metadatas = [
+        {"source": f"file-{i // 50}.pdf", "start_index": (i % 50) * 1400}
+        for i in range(chunks)
+    ]
+    embeddings = np.random.default_rng(seed).standard_normal(
+        (chunks, dim), dtype=np.float32
+    )
+
+    index = BM25Index()
+    index.add(ids, documents)
+    return InMemoryCollection(ids, documents, metadatas, embeddings), index, vocabulary
+
+
+def measure(fn, queries):
+    tracemalloc.start()
+    start = time.process_time()
+    for query, query_embedding in queries:
+        fn(query, query_embedding)
+    elapsed = time.process_time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / len(queries) * 1000, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    collection, index, vocabulary = build_collection(args.chunks, args.dim)
+    rng = random.Random(1)
+    queries = [
+        (
+            " ".join(rng.choices(vocabulary, k=6)),
+            np.random.default_rng(i).standard_normal(args.dim).tolist(),
+        )
+        for i in range(args.queries)
+    ]
+
+    for name, fn in [
+        (
+            "langchain ensemble",
+            lambda q, e: legacy_hybrid_search(collection, index, q, e, args.k),
+        ),
+        (
+            "native fusion",
+            lambda q, e: hybrid_search(collection, index, q, e, args.k, None, 0.0),
+        ),
+    ]:
+        cpu_ms, peak_kib = measure(fn, queries)
+        print(
+            f"{name:>20}: {cpu_ms:8.2f} ms cpu/query, {peak_kib:10.1f} KiB peak alloc"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Throughput benchmark: streaming ingestion pipeline vs load-all/embed-all/add-all.
+
+A synthetic loader yields pages with a fixed parse cost, the embedding function and
+the vector store add() sleep proportionally to their batch size (they release the
+GIL like real network / native calls do). Reports wall time, chunks per second and
+peak Python allocations for both paths.
+
+Run from the backend directory:
+
+    python -m test.benchmark.ingest_bench --pages 600 --page-chars 3000
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+from apps.rag.ingest import IngestPipeline
+
+
+def load_pages(pages: int, page_chars: int, parse_ms: float, seed: int = 0):
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(2000)]
+    for page in range(pages):
+        time.sleep(parse_ms / 1000)
+        text = ""
+        while len(text) < page_chars:
+            text += " ".join(rng.choices(words, k=20)) + "\n"
+        yield Document(
+            page_content=text, metadata={"source": "bench.pdf", "page": page}
+        )
+
+
+def make_embedding_function(dim: int, ms_per_chunk: float):
+    def embed(texts):
+        time.sleep(len(texts) * ms_per_chunk / 1000)
+        return [[float(len(text) % 7)] * dim for text in texts]
+
+    return embed
+
+
+def make_store(ms_per_chunk: float):
+    stored = []
+
+    def add(ids, texts, metadatas, embeddings):
+        time.sleep(len(ids) * ms_per_chunk / 1000)
+        stored.extend(ids)
+
+    return add, stored
+
+
+def legacy_ingest(documents, text_splitter, embed, add):
+    data = list(documents)
+    docs = text_splitter.split_documents(data)
+    texts = [doc.page_content for doc in docs]
+    metadatas = [doc.metadata for doc in docs]
+    embeddings = embed([text.replace("\n", " ") for text in texts])
+    ids = [str(i) for i in range(len(texts))]
+    add(ids, texts, metadatas, embeddings)
+    return ids
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    ids = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(ids), elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=600)
+    parser.add_argument("--page-chars", type=int, default=3000)
+    parser.add_argument("--chunk-size", type=int, default=1500)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--parse-ms", type=float, default=2.0)
+    parser.add_argument("--embed-ms", type=float, default=1.0)
+    parser.add_argument("--store-ms", type=float, default=0.5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--queue-size", type=int, default=2)
+    args = parser.parse_args()
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        add_start_index=True,
+    )
+    embed = make_embedding_function(args.dim, args.embed_ms)
+
+    def run_legacy():
+        add, _ = make_store(args.store_ms)
+        documents = load_pages(args.pages, args.page_chars, args.parse_ms)
+        return legacy_ingest(documents, text_splitter, embed, add)
+
+    def run_pipeline():
+        add, _ = make_store(args.store_ms)
+        documents = load_pages(args.pages, args.page_chars, args.parse_ms)
+        return IngestPipeline(
+            embed,
+            add,
+            text_splitter=text_splitter,
+            batch_size=args.batch_size,
+            queue_size=args.queue_size,
+        ).run(documents)
+
+    for name, fn in [("load-all", run_legacy), ("pipeline", run_pipeline)]:
+        chunks, elapsed, peak_mib = measure(fn)
+        print(
+            f"{name:>10}: {chunks} chunks in {elapsed:6.2f}s "
+            f"({chunks / elapsed:8.1f} chunks/s), {peak_mib:8.1f} MiB peak alloc"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Micro-benchmark: query latency and memory of the vector store backends.
+
+Loads the same random collection into embedded Chroma and into the flat backend
+(float32, float16 and with the HNSW graph), then measures wall time per query and
+the process RSS growth while loading and querying. Each backend runs in a fresh
+temporary directory.
+
+Run from the backend directory:
+
+    python -m test.benchmark.vector_db_bench --chunks 20000 --dim 384 --k 5 --queries 200
+"""
+
+import argparse
+import gc
+import tempfile
+import time
+
+import numpy as np
+import psutil
+
+
+def open_client(backend: str, path: str):
+    if backend == "chroma":
+        import chromadb
+
+        from apps.rag.vector.chroma import ChromaClient
+
+        return ChromaClient(
+            chromadb.PersistentClient(
+                path=path,
+                settings=chromadb.Settings(
+                    allow_reset=True, anonymized_telemetry=False
+                ),
+            )
+        )
+
+    from apps.rag.vector.flat import FlatClient
+
+    if backend == "flat-hnsw":
+        return FlatClient(path, hnsw=True, hnsw_min_size=0)
+    if backend == "flat-float16":
+        return FlatClient(path, dtype="float16")
+    return FlatClient(path)
+
+
+def rss_mib() -> float:
+    gc.collect()
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+def run(backend: str, embeddings, queries, k: int, batch_size: int = 1000):
+    with tempfile.TemporaryDirectory() as path:
+        before = rss_mib()
+
+        start = time.perf_counter()
+        collection = open_client(backend, path).create_collection("bench")
+        for offset in range(0, len(embeddings), batch_size):
+            batch = embeddings[offset : offset + batch_size]
+            collection.add(
+                ids=[f"chunk-{offset + i}" for i in range(len(batch))],
+                embeddings=batch.tolist(),
+                documents=[f"document {offset + i}" for i in range(len(batch))],
+                metadatas=[
+                    {"source": f"file-{(offset + i) // 50}.pdf"}
+                    for i in range(len(batch))
+                ],
+            )
+        load_s = time.perf_counter() - start
+
+        # Reopen, so that the query numbers include loading the collection
+        collection = open_client(backend, path).get_collection("bench")
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            collection.query(query_embeddings=[query], n_results=k)
+            latencies.append(time.perf_counter() - start)
+
+        return load_s, np.array(latencies) * 1000, rss_mib() - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--backends", nargs="+", default=["chroma", "flat", "flat-float16", "flat-hnsw"]
+    )
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.chunks, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32).tolist()
+
+    for backend in args.backends:
+        load_s, latencies, rss = run(backend, embeddings, queries, args.k)
+        print(
+            f"{backend:>14}: load {load_s:7.2f} s, "
+            f"query p50 {np.percentile(latencies, 50):7.2f} ms "
+            f"p95 {np.percentile(latencies, 95):7.2f} ms, "
+            f"rss +{rss:8.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -218,6 +218,21 @@ def calculate_sha256(file):
     return sha256.hexdigest()
 
 
+def save_file_with_sha256(file, file_path: str, chunk_size: int = 1024 * 1024):
+    """Copy a file object to file_path in chunks, hashing it on the way.
+
+    Returns (sha256 hex digest, size in bytes).
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(file_path, "wb") as f:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha256.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size
+
+
 def calculate_sha256_string(string):
     # Create a new SHA-256 hash object
     sha256_hash = hashlib.sha256()